@@ -0,0 +1,92 @@
+"""initial schema
+
+Tables as created by Base.metadata.create_all before migrations were added,
+later tables come with their own revisions. Databases created that way are
+marked as migrated with `alembic stamp 0001` and upgraded from there.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 14:18:54.249092
+
+"""
+from typing import Sequence
+from typing import Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# sqlalchemy_utils.ChoiceType stores the choice code as Unicode(255)
+CHOICE = sa.Unicode(length=255)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("role", CHOICE, nullable=False),
+        sa.Column(
+            "created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("name"),
+    )
+    op.create_index(op.f("ix_users_id"), "users", ["id"])
+
+    op.create_table(
+        "devices",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("group", sa.String(), nullable=False),
+        sa.Column(
+            "created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_devices_id"), "devices", ["id"])
+
+    op.create_table(
+        "records",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("text", sa.String(), nullable=True),
+        sa.Column("kind", CHOICE, nullable=True),
+        sa.Column(
+            "created_at", sa.DateTime(), server_default=sa.func.now(), nullable=False
+        ),
+        sa.Column("reporter_id", sa.String(), nullable=False),
+        sa.Column("device_id", sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["device_id"], ["devices.id"], onupdate="CASCADE", ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(
+            ["reporter_id"], ["users.id"], onupdate="CASCADE", ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_records_id"), "records", ["id"])
+    op.create_index(op.f("ix_records_created_at"), "records", ["created_at"])
+    op.create_index(op.f("ix_records_device_id"), "records", ["device_id"])
+    op.create_index(op.f("ix_records_reporter_id"), "records", ["reporter_id"])
+
+    op.create_table(
+        "predefined_messages",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("text", sa.String(), nullable=False),
+        sa.Column("kind", CHOICE, nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("text"),
+    )
+    op.create_index(op.f("ix_predefined_messages_id"), "predefined_messages", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("predefined_messages")
+    op.drop_table("records")
+    op.drop_table("devices")
+    op.drop_table("users")
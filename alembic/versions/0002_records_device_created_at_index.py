@@ -0,0 +1,45 @@
+"""records (device_id, created_at DESC, id DESC) index
+
+Status pages and open problems read the latest records of one device,
+the index returns them in order without sorting. On Postgres it is built
+CONCURRENTLY outside of the migration transaction, so writes to records
+are not blocked meanwhile. A failed concurrent build leaves an INVALID
+index behind, drop it before running the migration again.
+
+Databases created by Base.metadata.create_all after the index was declared
+on the model already have it, so it is only created when missing.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 14:30:12.518240
+
+"""
+from typing import Sequence
+from typing import Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX_NAME = "ix_records_device_id_created_at"
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            INDEX_NAME,
+            "records",
+            ["device_id", sa.text("created_at DESC"), sa.text("id DESC")],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(INDEX_NAME, table_name="records", postgresql_concurrently=True)
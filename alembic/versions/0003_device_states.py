@@ -0,0 +1,51 @@
+"""device_states table
+
+Latest record of every device, the app fills it for existing records on
+start (operations.ensure_device_states). Databases created by
+Base.metadata.create_all after the table was declared already have it, so
+it is only created when missing.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 16:05:41.730112
+
+"""
+from typing import Sequence
+from typing import Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# sqlalchemy_utils.ChoiceType stores the choice code as Unicode(255)
+CHOICE = sa.Unicode(length=255)
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table("device_states"):
+        return
+
+    op.create_table(
+        "device_states",
+        sa.Column("device_id", sa.String(), nullable=False),
+        sa.Column("last_record_id", sa.Integer(), nullable=False),
+        sa.Column("last_record_kind", CHOICE, nullable=False),
+        sa.Column("last_record_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["device_id"], ["devices.id"], onupdate="CASCADE", ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(["last_record_id"], ["records.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("device_id"),
+    )
+    op.create_index(
+        op.f("ix_device_states_last_record_kind"), "device_states", ["last_record_kind"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("device_states")
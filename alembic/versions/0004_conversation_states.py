@@ -0,0 +1,42 @@
+"""conversation_states table
+
+State of multi-step report flows for CONVERSATION_STATE_BACKEND=sql.
+Databases created by Base.metadata.create_all after the table was declared
+already have it, so it is only created when missing.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 16:06:12.402955
+
+"""
+from typing import Sequence
+from typing import Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table("conversation_states"):
+        return
+
+    op.create_table(
+        "conversation_states",
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("payload", sa.Text(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("key"),
+    )
+    op.create_index(
+        op.f("ix_conversation_states_expires_at"), "conversation_states", ["expires_at"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("conversation_states")
@@ -0,0 +1,40 @@
+"""export_watermarks table
+
+Last record exported to every target of the incremental export.
+Databases created by Base.metadata.create_all after the table was declared
+already have it, so it is only created when missing.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 16:06:40.118374
+
+"""
+from typing import Sequence
+from typing import Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table("export_watermarks"):
+        return
+
+    op.create_table(
+        "export_watermarks",
+        sa.Column("target", sa.String(), nullable=False),
+        sa.Column("last_record_id", sa.Integer(), nullable=False),
+        sa.Column("last_record_at", sa.DateTime(), nullable=False),
+        sa.Column("exported_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("target"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("export_watermarks")
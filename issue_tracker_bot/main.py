@@ -1,15 +1,56 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi import HTTPException
 from fastapi import Request
 from telegram import Update
 
+from issue_tracker_bot import settings
+from issue_tracker_bot.repository import async_database
 from issue_tracker_bot.repository import database
+from issue_tracker_bot.repository import replica
+from issue_tracker_bot.services.gcloud import write_batcher
+from issue_tracker_bot.services.gcloud.async_service import run_blocking
+from issue_tracker_bot.services.gcloud.async_service import shutdown_executor
+from issue_tracker_bot.services.telegram import app_context_helpers
 from issue_tracker_bot.services.telegram.bot_app_initializer import create_application
+from issue_tracker_bot.services.telegram.lifecycle import ApplicationNotRunning
+from issue_tracker_bot.services.telegram.lifecycle import create_lifecycle
+from issue_tracker_bot.services.telegram.lifecycle import WarmLifecycle
+from issue_tracker_bot.services.telegram.update_queue import UpdateQueue
+from issue_tracker_bot.services.telegram.update_queue import UpdateQueueClosed
+from issue_tracker_bot.services.telegram.update_queue import UpdateQueueFull
+
+ta = create_application()
+lifecycle = create_lifecycle(ta)
+update_queue = None
 
-database.Base.metadata.create_all(bind=database.engine)
+if settings.WEBHOOK_INGESTION == "queue":
+    if not isinstance(lifecycle, WarmLifecycle):
+        raise RuntimeError("Queue ingestion requires the 'lifespan' app lifecycle")
+    update_queue = UpdateQueue(lifecycle)
 
-app = FastAPI()
 
-ta = create_application()
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Schema upgrade and catalog loads run once before the first update,
+    # importing the app stays free of database work
+    app_context_helpers.enrich_app_context()
+    await lifecycle.start()
+    if update_queue:
+        await update_queue.start()
+    try:
+        yield
+    finally:
+        if update_queue:
+            await update_queue.stop()
+        await lifecycle.stop()
+        # Rows waiting for the next scheduled flush would be lost otherwise
+        await run_blocking(write_batcher.close_all)
+        shutdown_executor()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 @app.get("/")
@@ -17,10 +58,54 @@ async def health():
     return {"message": "ok"}
 
 
+def replica_metrics():
+    if database.replica_engine is None:
+        return None
+
+    return {
+        **replica.router.stats(),
+        "pool": database.replica_pool_metrics.snapshot(),
+        "async_pool": async_database.replica_pool_metrics.snapshot(),
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "update_queue": update_queue.stats() if update_queue else None,
+        "db_pool": database.pool_metrics.snapshot(),
+        "async_db_pool": async_database.pool_metrics.snapshot(),
+        "db_replica": replica_metrics(),
+    }
+
+
 @app.post("/")
 async def root(req: Request):
-    async with ta:
+    try:
         update = Update.de_json(await req.json(), ta.bot)
-        await ta.process_update(update)
+    except (ValueError, KeyError, TypeError):
+        update = None
+
+    if update is None:
+        raise HTTPException(status_code=400, detail="Invalid update")
+
+    if update_queue:
+        try:
+            update_queue.put(update)
+        except UpdateQueueFull:
+            raise HTTPException(
+                status_code=503,
+                detail="Too many pending updates",
+                headers={"Retry-After": str(settings.UPDATE_QUEUE_RETRY_AFTER)},
+            )
+        except UpdateQueueClosed:
+            raise HTTPException(status_code=503, detail="Shutting down")
+
+        return {"message": "accepted"}
+
+    try:
+        await lifecycle.process_update(update)
+    except ApplicationNotRunning:
+        raise HTTPException(status_code=503, detail="Shutting down")
 
     return {"message": "accepted"}
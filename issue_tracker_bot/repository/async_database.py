@@ -0,0 +1,193 @@
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from issue_tracker_bot import settings
+from issue_tracker_bot.repository import replica
+from issue_tracker_bot.repository.database import engine_options
+from issue_tracker_bot.repository.pool_metrics import PoolMetrics
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str):
+    url = make_url(url)
+
+    try:
+        drivername = ASYNC_DRIVERS[url.get_backend_name()]
+    except KeyError:
+        raise RuntimeError(f"No async driver configured for '{url.drivername}'")
+
+    return url.set(drivername=drivername)
+
+
+engine = create_async_engine(
+    to_async_url(settings.DATABASE_URL), **engine_options(settings.DATABASE_URL)
+)
+pool_metrics = PoolMetrics(engine.sync_engine, settings.DB_LEAK_THRESHOLD)
+replica.track_writes(engine.sync_engine)
+
+# Objects are returned from closed sessions, so they must not expire on commit
+AsyncSessionLocal = async_sessionmaker(
+    bind=engine, autoflush=False, expire_on_commit=False
+)
+
+# Without a replica every read goes to the primary
+replica_engine = replica_pool_metrics = AsyncReplicaSessionLocal = None
+
+if settings.DATABASE_REPLICA_URL:
+    replica_engine = create_async_engine(
+        to_async_url(settings.DATABASE_REPLICA_URL),
+        **engine_options(settings.DATABASE_REPLICA_URL),
+    )
+    replica_pool_metrics = PoolMetrics(
+        replica_engine.sync_engine, settings.DB_LEAK_THRESHOLD
+    )
+    AsyncReplicaSessionLocal = async_sessionmaker(
+        bind=replica_engine, autoflush=False, expire_on_commit=False
+    )
+
+
+class AsyncUnitOfWork:
+    """
+    AsyncSession opened on first use and shared by every operation in the scope,
+    reads routed to the replica share a second one
+    """
+
+    def __init__(self, session_factory, replica_session_factory=None):
+        self.session_factory = session_factory
+        self.replica_session_factory = replica_session_factory
+        self._session = None
+        self._replica_session = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = self.session_factory()
+        return self._session
+
+    @property
+    def has_session(self):
+        return self._session is not None
+
+    @property
+    def replica_session(self):
+        if self._replica_session is None:
+            self._replica_session = self.replica_session_factory()
+        return self._replica_session
+
+    async def rollback(self):
+        if self._session is not None:
+            await self._session.rollback()
+
+    async def close_replica(self):
+        if self._replica_session is not None:
+            await self._replica_session.close()
+            self._replica_session = None
+
+    async def close(self):
+        await self.close_replica()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+_unit_of_work: ContextVar = ContextVar("async_unit_of_work", default=None)
+
+
+@asynccontextmanager
+async def session_scope():
+    """
+    All async operations awaited inside share one session, which is closed
+    (returning its connection to the pool) when the scope exits
+    """
+    if _unit_of_work.get() is not None:
+        yield _unit_of_work.get()
+        return
+
+    uow = AsyncUnitOfWork(AsyncSessionLocal, AsyncReplicaSessionLocal)
+    token = _unit_of_work.set(uow)
+
+    try:
+        yield uow
+    except BaseException:
+        await uow.rollback()
+        raise
+    finally:
+        _unit_of_work.reset(token)
+        await uow.close()
+
+
+def inject_db_session(f):
+    async def wrapper(*args, **kwargs):
+        """
+        This injects an AsyncSession object in function args
+        """
+        uow = _unit_of_work.get()
+        if uow is not None:
+            return await f(uow.session, *args, **kwargs)
+
+        async with AsyncSessionLocal() as db:
+            return await f(db, *args, **kwargs)
+
+    return wrapper
+
+
+def inject_read_session(f):
+    primary = inject_db_session(f)
+
+    async def wrapper(*args, **kwargs):
+        """
+        This injects a replica AsyncSession in function args when the read may
+        go to the replica (see `replica`), a primary one otherwise
+        """
+        uow = _unit_of_work.get()
+        # Once the scope used the primary its reads must see its writes
+        if (
+            AsyncReplicaSessionLocal is None
+            or (uow is not None and uow.has_session)
+            or not replica.router.use_replica()
+        ):
+            return await primary(*args, **kwargs)
+
+        try:
+            if uow is not None:
+                return await f(uow.replica_session, *args, **kwargs)
+
+            async with AsyncReplicaSessionLocal() as db:
+                return await f(db, *args, **kwargs)
+        except replica.REPLICA_DOWN_ERRORS as exc:
+            replica.router.mark_down(exc)
+            if uow is not None:
+                await uow.close_replica()
+
+        return await primary(*args, **kwargs)
+
+    return wrapper
+
+
+def create_commit_refresh(f):
+    async def wrapper(db, *args, **kwargs):
+        """
+        This does all post creation actions for the object in database
+        """
+        db_object = f(*args, **kwargs)
+
+        db.add(db_object)
+        try:
+            await db.commit()
+        except Exception:
+            # Keep a shared unit-of-work session usable after a failed insert
+            await db.rollback()
+            raise
+        await db.refresh(db_object)
+
+        return db_object
+
+    return wrapper
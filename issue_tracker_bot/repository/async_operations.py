@@ -0,0 +1,317 @@
+"""
+Async twin of `operations`, built on AsyncSession. Functions keep the same
+names and arguments, but have to be awaited.
+"""
+from datetime import datetime
+from enum import Enum
+from typing import Union
+
+from sqlalchemy import delete
+from sqlalchemy import insert
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy_utils.types import Choice
+
+from issue_tracker_bot.repository import async_database
+from issue_tracker_bot.repository import commons
+from issue_tracker_bot.repository import database
+from issue_tracker_bot.repository import models_db as md
+from issue_tracker_bot.repository import pagination
+from issue_tracker_bot.repository import queries
+from issue_tracker_bot.repository import replica
+
+
+@database.pydantic_or_dict
+@async_database.inject_db_session
+@async_database.create_commit_refresh
+def create_user(data_obj: dict):
+    return md.User(**data_obj)
+
+
+@database.pydantic_or_dict
+async def get_or_create_user(data_obj: dict):
+    try:
+        user = await create_user(data_obj)
+    except IntegrityError as err:
+        if database.is_unique_violation(err):
+            # The user may not have reached the replica yet
+            with replica.primary_reads():
+                user = await get_user(obj_id=data_obj["id"])
+        else:
+            raise err
+    return user
+
+
+@database.pydantic_or_dict
+@async_database.inject_db_session
+@async_database.create_commit_refresh
+def create_device(data_obj: dict):
+    return md.Device(**data_obj)
+
+
+@async_database.inject_db_session
+async def update_devices_in_batch(db, devices):
+    if not devices:
+        return
+    await db.execute(update(md.Device), devices)
+    await db.commit()
+
+
+@async_database.inject_db_session
+async def create_devices_in_batch(db, devices):
+    if not devices:
+        return
+    await db.execute(insert(md.Device), devices)
+    await db.commit()
+
+
+@async_database.inject_db_session
+async def delete_devices_in_batch(db, devices):
+    if not devices:
+        return
+
+    cmd = delete(md.Device).where(md.Device.id.in_(devices))
+    await db.execute(cmd)
+    await db.commit()
+
+
+@database.pydantic_or_dict
+@async_database.inject_db_session
+@async_database.create_commit_refresh
+def create_predefined_message(data_obj: dict):
+    return md.PredefinedMessage(**data_obj)
+
+
+@async_database.inject_db_session
+async def create_predefined_messages_in_batch(db, messages):
+    if not messages:
+        return
+    await db.execute(insert(md.PredefinedMessage), messages)
+    await db.commit()
+
+
+@async_database.inject_db_session
+async def delete_predefined_messages_in_batch(db, messages):
+    if not messages:
+        return
+
+    cmd = delete(md.PredefinedMessage).where(md.PredefinedMessage.id.in_(messages))
+    await db.execute(cmd)
+    await db.commit()
+
+
+@async_database.inject_db_session
+async def update_predefined_messages_in_batch(db, messages):
+    if not messages:
+        return
+    await db.execute(update(md.PredefinedMessage), messages)
+    await db.commit()
+
+
+@database.pydantic_or_dict
+@async_database.inject_db_session
+async def create_record(db: AsyncSession, data_obj: dict):
+    record = md.Record(**data_obj)
+    db.add(record)
+
+    try:
+        await db.flush()
+        await db.execute(
+            queries.upsert_device_states(
+                db.bind.dialect.name, [queries.device_state_row(record)]
+            )
+        )
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    await db.refresh(record)
+    return record
+
+
+@async_database.inject_db_session
+async def create_records_in_batch(db: AsyncSession, records):
+    rows = queries.record_insert_rows(records)
+    if not rows:
+        return []
+
+    try:
+        created = (await db.execute(queries.insert_records(), rows)).all()
+        await db.execute(
+            queries.upsert_device_states(
+                db.bind.dialect.name, queries.latest_device_state_rows(created)
+            )
+        )
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    return [record.id for record in created]
+
+
+@async_database.inject_read_session
+async def get_device(
+    db: AsyncSession,
+    obj_id: int = None,
+    name: str = None,
+    group: str = None,
+    serial_number: str = None,
+):
+    query = queries.device(obj_id, name, group, serial_number)
+    if query is not None:
+        return (await db.scalars(query)).first()
+
+
+@async_database.inject_read_session
+async def get_devices(db: AsyncSession):
+    return (await db.scalars(queries.devices())).all()
+
+
+@async_database.inject_read_session
+async def get_reported_device_ids(db: AsyncSession):
+    return set((await db.scalars(queries.reported_device_ids())).all())
+
+
+@async_database.inject_read_session
+async def get_records_for_device(
+    db: AsyncSession, obj_id: int, limit: int = 10, offset: int = 0
+):
+    return (await db.scalars(queries.records_for_device(obj_id, limit, offset))).all()
+
+
+@async_database.inject_read_session
+async def get_records(db: AsyncSession, limit: int = 1000):
+    return (await db.scalars(queries.records(limit))).all()
+
+
+@async_database.inject_read_session
+async def get_records_page(
+    db: AsyncSession,
+    cursor: str = None,
+    limit: int = 1000,
+    device_id: str = None,
+    newest_first: bool = True,
+):
+    records = (
+        await db.scalars(queries.records_page(cursor, limit, device_id, newest_first))
+    ).all()
+    return pagination.make_page(records, queries.record_key, cursor, limit)
+
+
+@async_database.inject_read_session
+async def get_devices_with_open_problems(db: AsyncSession):
+    return (await db.scalars(queries.devices_with_open_problems())).unique().all()
+
+
+@async_database.inject_read_session
+async def get_user(db: AsyncSession, obj_id: int = None, name: str = None):
+    query = queries.user(obj_id, name)
+    if query is not None:
+        return (await db.scalars(query)).first()
+
+
+@async_database.inject_read_session
+async def get_users(db: AsyncSession, skip: int = 0, limit: int = 1000):
+    return (await db.scalars(queries.users(skip, limit))).all()
+
+
+@async_database.inject_read_session
+async def get_users_page(db: AsyncSession, cursor: str = None, limit: int = 1000):
+    users = (await db.scalars(queries.users_page(cursor, limit))).all()
+    return pagination.make_page(users, lambda u: (u.id,), cursor, limit)
+
+
+@async_database.inject_read_session
+async def get_predefined_message(db: AsyncSession, obj_id: int = None):
+    return (await db.scalars(queries.predefined_message(obj_id))).first()
+
+
+@async_database.inject_read_session
+async def get_predefined_messages(
+    db: AsyncSession,
+    kind: Union[str, Choice, Enum] = None,
+    skip: int = 0,
+    limit: int = 10000,
+):
+    return (await db.scalars(queries.predefined_messages(kind, skip, limit))).all()
+
+
+@async_database.inject_read_session
+async def get_predefined_messages_page(
+    db: AsyncSession,
+    kind: Union[str, Choice, Enum] = None,
+    cursor: str = None,
+    limit: int = 1000,
+):
+    messages = (
+        await db.scalars(queries.predefined_messages_page(kind, cursor, limit))
+    ).all()
+    return pagination.make_page(messages, lambda m: (m.id,), cursor, limit)
+
+
+async def get_predefined_problems():
+    return await get_predefined_messages(commons.ReportKinds.problem)
+
+
+async def get_predefined_solutions():
+    return await get_predefined_messages(commons.ReportKinds.solution)
+
+
+# Read from the primary, conversation states are rewritten on every step
+@async_database.inject_db_session
+async def get_conversation_state(db: AsyncSession, key: str, now: datetime):
+    return (await db.scalars(queries.conversation_state(key, now))).first()
+
+
+@async_database.inject_db_session
+async def save_conversation_state(
+    db: AsyncSession, key: str, payload: str, expires_at: datetime
+):
+    await db.execute(
+        queries.upsert_conversation_state(
+            db.bind.dialect.name, key, payload, expires_at
+        )
+    )
+    await db.commit()
+
+
+@async_database.inject_db_session
+async def replace_conversation_state(
+    db: AsyncSession,
+    key: str,
+    payload: str,
+    new_payload: str,
+    expires_at: datetime,
+    now: datetime,
+):
+    """
+    Replaces the state `payload` with `new_payload`, returns False when the
+    state has changed or expired meanwhile
+    """
+    result = await db.execute(
+        queries.replace_conversation_state(key, payload, new_payload, expires_at, now)
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+
+@async_database.inject_db_session
+async def delete_conversation_state(db: AsyncSession, key: str, now: datetime):
+    """
+    Deletes the state and returns its payload unless it has expired
+    """
+    row = (await db.execute(queries.delete_conversation_state(key))).first()
+    await db.commit()
+
+    if row is not None and row.expires_at > now:
+        return row.payload
+
+
+@async_database.inject_db_session
+async def delete_expired_conversation_states(db: AsyncSession, now: datetime):
+    result = await db.execute(queries.delete_expired_conversation_states(now))
+    await db.commit()
+    return result.rowcount
@@ -1,19 +1,123 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
 from typing import Union
 
 from pydantic import BaseModel
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from issue_tracker_bot import settings
+from issue_tracker_bot.repository import replica
+from issue_tracker_bot.repository.pool_metrics import PoolMetrics
 
-engine = create_engine(settings.DATABASE_URL)
+
+def engine_options(url: str):
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+engine = create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
+pool_metrics = PoolMetrics(engine, settings.DB_LEAK_THRESHOLD)
+replica.track_writes(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Without a replica every read goes to the primary
+replica_engine = replica_pool_metrics = ReplicaSessionLocal = None
+
+if settings.DATABASE_REPLICA_URL:
+    replica_engine = create_engine(
+        settings.DATABASE_REPLICA_URL, **engine_options(settings.DATABASE_REPLICA_URL)
+    )
+    replica_pool_metrics = PoolMetrics(replica_engine, settings.DB_LEAK_THRESHOLD)
+    ReplicaSessionLocal = sessionmaker(
+        autocommit=False, autoflush=False, bind=replica_engine
+    )
+
 Base = declarative_base()
 
 
+class UnitOfWork:
+    """
+    Session opened on first use and shared by every operation in the scope,
+    reads routed to the replica share a second one
+    """
+
+    def __init__(self, session_factory, replica_session_factory=None):
+        self.session_factory = session_factory
+        self.replica_session_factory = replica_session_factory
+        self._session = None
+        self._replica_session = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = self.session_factory()
+        return self._session
+
+    @property
+    def has_session(self):
+        return self._session is not None
+
+    @property
+    def replica_session(self):
+        if self._replica_session is None:
+            self._replica_session = self.replica_session_factory()
+        return self._replica_session
+
+    def rollback(self):
+        if self._session is not None:
+            self._session.rollback()
+
+    def close_replica(self):
+        if self._replica_session is not None:
+            self._replica_session.close()
+            self._replica_session = None
+
+    def close(self):
+        self.close_replica()
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+_unit_of_work: ContextVar = ContextVar("unit_of_work", default=None)
+
+
+@contextmanager
+def session_scope():
+    """
+    All operations called inside share one session, which is closed
+    (returning its connection to the pool) when the scope exits
+    """
+    if _unit_of_work.get() is not None:
+        yield _unit_of_work.get()
+        return
+
+    uow = UnitOfWork(SessionLocal, ReplicaSessionLocal)
+    token = _unit_of_work.set(uow)
+
+    try:
+        yield uow
+    except BaseException:
+        uow.rollback()
+        raise
+    finally:
+        _unit_of_work.reset(token)
+        uow.close()
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -27,7 +131,45 @@ def inject_db_session(f):
         """
         This injects a database Session object in function args
         """
-        return f(next(get_db()), *args, **kwargs)
+        uow = _unit_of_work.get()
+        if uow is not None:
+            return f(uow.session, *args, **kwargs)
+
+        with SessionLocal() as db:
+            return f(db, *args, **kwargs)
+
+    return wrapper
+
+
+def inject_read_session(f):
+    primary = inject_db_session(f)
+
+    def wrapper(*args, **kwargs):
+        """
+        This injects a replica Session in function args when the read may go
+        to the replica (see `replica`), a primary one otherwise
+        """
+        uow = _unit_of_work.get()
+        # Once the scope used the primary its reads must see its writes
+        if (
+            ReplicaSessionLocal is None
+            or (uow is not None and uow.has_session)
+            or not replica.router.use_replica()
+        ):
+            return primary(*args, **kwargs)
+
+        try:
+            if uow is not None:
+                return f(uow.replica_session, *args, **kwargs)
+
+            with ReplicaSessionLocal() as db:
+                return f(db, *args, **kwargs)
+        except replica.REPLICA_DOWN_ERRORS as exc:
+            replica.router.mark_down(exc)
+            if uow is not None:
+                uow.close_replica()
+
+        return primary(*args, **kwargs)
 
     return wrapper
 
@@ -40,7 +182,12 @@ def create_commit_refresh(f):
         db_object = f(*args, **kwargs)
 
         db.add(db_object)
-        db.commit()
+        try:
+            db.commit()
+        except Exception:
+            # Keep a shared unit-of-work session usable after a failed insert
+            db.rollback()
+            raise
         db.refresh(db_object)
 
         return db_object
@@ -48,6 +195,29 @@ def create_commit_refresh(f):
     return wrapper
 
 
+# SQLSTATE of duplicate keys on Postgres
+UNIQUE_VIOLATION = "23505"
+SQLITE_UNIQUE_ERRORS = {"SQLITE_CONSTRAINT_UNIQUE", "SQLITE_CONSTRAINT_PRIMARYKEY"}
+
+
+def is_unique_violation(err: IntegrityError) -> bool:
+    """
+    Whether the IntegrityError was raised by a duplicate key, with either the
+    sync or the async driver
+    """
+    orig = err.orig
+    # psycopg2 reports pgcode, the asyncpg adapter both pgcode and sqlstate
+    code = getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)
+    if code is not None:
+        return code == UNIQUE_VIOLATION
+
+    # sqlite3 names its errors from Python 3.11 on
+    name = getattr(orig, "sqlite_errorname", None)
+    if name is not None:
+        return name in SQLITE_UNIQUE_ERRORS
+    return "UNIQUE constraint failed" in str(orig)
+
+
 def pydantic_or_dict(f):
     def wrapper(data_obj: Union[BaseModel, dict], *args, **kwargs):
         """
@@ -0,0 +1,59 @@
+"""
+Runs the alembic migrations of `alembic/` from the app, the same as
+`alembic upgrade head` does.
+"""
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+from sqlalchemy import text
+
+from issue_tracker_bot import settings
+from issue_tracker_bot.repository import database
+
+# Schema that Base.metadata.create_all made before migrations were added
+INITIAL_REVISION = "0001"
+# Postgres advisory lock held while migrating, workers starting together wait
+MIGRATION_LOCK_KEY = 7_391_104
+
+
+def alembic_config(connection=None) -> Config:
+    config = Config(str(settings.ROOT_PATH / "alembic.ini"))
+    config.set_main_option("script_location", str(settings.ROOT_PATH / "alembic"))
+    config.attributes["connection"] = connection
+    return config
+
+
+def upgrade_schema(engine=None):
+    """
+    Upgrades the database to the latest revision. Databases with tables but
+    no alembic revision were created by the app before migrations existed,
+    they are stamped with the initial revision first.
+    """
+    engine = engine or database.engine
+
+    with engine.connect() as connection:
+        postgres = connection.dialect.name == "postgresql"
+        if postgres:
+            connection.execute(
+                text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY}
+            )
+            connection.commit()
+
+        try:
+            config = alembic_config(connection)
+            tables = set(inspect(connection).get_table_names())
+            connection.commit()
+
+            if "alembic_version" not in tables and "records" in tables:
+                command.stamp(config, INITIAL_REVISION)
+                connection.commit()
+
+            command.upgrade(config, "head")
+            connection.commit()
+        finally:
+            if postgres:
+                connection.execute(
+                    text("SELECT pg_advisory_unlock(:key)"),
+                    {"key": MIGRATION_LOCK_KEY},
+                )
+                connection.commit()
@@ -1,8 +1,10 @@
 from sqlalchemy import Column
 from sqlalchemy import DateTime
 from sqlalchemy import ForeignKey
+from sqlalchemy import Index
 from sqlalchemy import Integer
 from sqlalchemy import String
+from sqlalchemy import Text
 from sqlalchemy.orm import relationship
 from sqlalchemy.schema import UniqueConstraint
 from sqlalchemy.sql import func
@@ -36,6 +38,7 @@ class Device(db.Base):
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
 
     records = relationship("Record", back_populates="device")
+    state = relationship("DeviceState", back_populates="device", uselist=False)
     # __table_args__ = (UniqueConstraint("name", "group", name="name_in_group"),)
 
 
@@ -63,6 +66,43 @@ class Record(db.Base):
     )
     device = relationship("Device", back_populates="records")
 
+    # Fetch server generated created_at with the INSERT, it feeds device state
+    __mapper_args__ = {"eager_defaults": True}
+    # Serves the latest records of a device in the order they are shown,
+    # built by the alembic migration 0002 on existing databases
+    __table_args__ = (
+        Index(
+            "ix_records_device_id_created_at",
+            device_id,
+            created_at.desc(),
+            id.desc(),
+        ),
+    )
+
+
+class DeviceState(db.Base):
+    """
+    Latest record of every device, maintained by record creation,
+    so open problems are a single indexed lookup
+    """
+
+    __tablename__ = "device_states"
+
+    device_id = Column(
+        String,
+        ForeignKey("devices.id", ondelete="CASCADE", onupdate="CASCADE"),
+        primary_key=True,
+    )
+    device = relationship("Device", back_populates="state")
+
+    last_record_id = Column(
+        Integer,
+        ForeignKey("records.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    last_record_kind = Column(ChoiceType(KINDS_CHOICES), nullable=False, index=True)
+    last_record_at = Column(DateTime, nullable=False)
+
 
 class PredefinedMessage(db.Base):
     __tablename__ = "predefined_messages"
@@ -70,3 +110,25 @@ class PredefinedMessage(db.Base):
     id = Column(String, primary_key=True, index=True)
     text = Column(String, nullable=False, unique=True)
     kind = Column(ChoiceType(KINDS_CHOICES), nullable=False)
+
+
+class ConversationState(db.Base):
+    __tablename__ = "conversation_states"
+
+    key = Column(String, primary_key=True)
+    payload = Column(Text, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class ExportWatermark(db.Base):
+    """
+    Record with the highest id exported to a target, incremental exports
+    continue with the ids above it
+    """
+
+    __tablename__ = "export_watermarks"
+
+    target = Column(String, primary_key=True)
+    last_record_id = Column(Integer, nullable=False)
+    last_record_at = Column(DateTime, nullable=False)
+    exported_at = Column(DateTime, nullable=False)
@@ -1,3 +1,5 @@
+from collections import namedtuple
+from datetime import datetime
 from enum import Enum
 from typing import Union
 
@@ -5,13 +7,21 @@ from sqlalchemy import delete
 from sqlalchemy import insert
 from sqlalchemy import update
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import contains_eager
 from sqlalchemy.orm import Session
 from sqlalchemy_utils.types import Choice
 
 from issue_tracker_bot.repository import commons
 from issue_tracker_bot.repository import database
 from issue_tracker_bot.repository import models_db as md
+from issue_tracker_bot.repository import pagination
+from issue_tracker_bot.repository import queries
+from issue_tracker_bot.repository import replica
+
+# Row counts reported by the context syncs
+SyncResult = namedtuple("SyncResult", ["created", "updated", "deleted", "unchanged"])
+
+# Rows per multi-row statement, keeps bound parameters under driver limits
+SYNC_CHUNK_SIZE = 1000
 
 
 @database.pydantic_or_dict
@@ -26,8 +36,10 @@ def get_or_create_user(data_obj: dict):
     try:
         user = create_user(data_obj)
     except IntegrityError as err:
-        if "already exists" in str(err):
-            user = get_user(obj_id=data_obj["id"])
+        if database.is_unique_violation(err):
+            # The user may not have reached the replica yet
+            with replica.primary_reads():
+                user = get_user(obj_id=data_obj["id"])
         else:
             raise err
     return user
@@ -99,14 +111,177 @@ def update_predefined_messages_in_batch(db, messages):
     db.commit()
 
 
+@database.inject_db_session
+def sync_devices(db: Session, devices, dry_run: bool = False):
+    """
+    Makes the stored devices exactly `devices` (dicts with id, group and
+    name) in one transaction using a dialect native upsert. With `dry_run`
+    only the counts of what would change are computed.
+    """
+    existing = {d.id: (d.group, d.name) for d in db.execute(queries.device_contents())}
+    wanted = {d["id"]: d for d in devices}
+
+    to_delete = [did for did in existing if did not in wanted]
+    to_upsert = [
+        d for did, d in wanted.items() if existing.get(did) != (d["group"], d["name"])
+    ]
+    created = sum(1 for d in to_upsert if d["id"] not in existing)
+
+    result = SyncResult(
+        created=created,
+        updated=len(to_upsert) - created,
+        deleted=len(to_delete),
+        unchanged=len(wanted) - len(to_upsert),
+    )
+
+    if dry_run:
+        return result
+
+    dialect_name = db.bind.dialect.name
+
+    try:
+        for start in range(0, len(to_upsert), SYNC_CHUNK_SIZE):
+            db.execute(
+                queries.upsert_devices(
+                    dialect_name, to_upsert[start : start + SYNC_CHUNK_SIZE]
+                )
+            )
+        for start in range(0, len(to_delete), SYNC_CHUNK_SIZE):
+            db.execute(
+                delete(md.Device).where(
+                    md.Device.id.in_(to_delete[start : start + SYNC_CHUNK_SIZE])
+                )
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return result
+
+
+@database.inject_db_session
+def sync_predefined_messages(db: Session, messages):
+    """
+    Makes the stored predefined messages exactly `messages` in one
+    transaction, only rows that differ are written
+    """
+    existing = {
+        m.id: (m.text, queries.choice_to_str(m.kind))
+        for m in db.execute(queries.predefined_message_contents())
+    }
+    wanted = {m["id"]: m for m in messages}
+
+    to_delete = [mid for mid in existing if mid not in wanted]
+    to_create = [m for mid, m in wanted.items() if mid not in existing]
+    to_update = [
+        m
+        for mid, m in wanted.items()
+        if mid in existing and existing[mid] != (m["text"], m["kind"])
+    ]
+    # Texts are unique, rows whose text moves to another id (e.g. swapped or
+    # shifted rows of the sheet) would collide one at a time when updated,
+    # so they are deleted and inserted again
+    to_replace = [m for m in to_update if existing[m["id"]][0] != m["text"]]
+    to_update = [m for m in to_update if existing[m["id"]][0] == m["text"]]
+
+    try:
+        if to_delete or to_replace:
+            db.execute(
+                delete(md.PredefinedMessage).where(
+                    md.PredefinedMessage.id.in_(
+                        to_delete + [m["id"] for m in to_replace]
+                    )
+                )
+            )
+        if to_update:
+            db.execute(update(md.PredefinedMessage), to_update)
+        if to_create or to_replace:
+            db.execute(insert(md.PredefinedMessage), to_create + to_replace)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return SyncResult(
+        created=len(to_create),
+        updated=len(to_update) + len(to_replace),
+        deleted=len(to_delete),
+        unchanged=len(wanted) - len(to_create) - len(to_update) - len(to_replace),
+    )
+
+
 @database.pydantic_or_dict
 @database.inject_db_session
-@database.create_commit_refresh
-def create_record(data_obj: dict):
-    return md.Record(**data_obj)
+def create_record(db: Session, data_obj: dict):
+    record = md.Record(**data_obj)
+    db.add(record)
+
+    try:
+        db.flush()
+        db.execute(
+            queries.upsert_device_states(
+                db.bind.dialect.name, [queries.device_state_row(record)]
+            )
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    db.refresh(record)
+    return record
+
+
+@database.inject_db_session
+def create_records_in_batch(db: Session, records):
+    """
+    Inserts RecordCreate objects (or dicts) with multi-row INSERT ... RETURNING
+    statements and moves device states to the newest of them, all in one
+    transaction. Returns the ids of the records in the given order.
+    """
+    rows = queries.record_insert_rows(records)
+    if not rows:
+        return []
+
+    try:
+        created = db.execute(queries.insert_records(), rows).all()
+        db.execute(
+            queries.upsert_device_states(
+                db.bind.dialect.name, queries.latest_device_state_rows(created)
+            )
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return [record.id for record in created]
 
 
 @database.inject_db_session
+def rebuild_device_states(db: Session):
+    """
+    Recomputes the state of every device from its latest record
+    """
+    db.execute(delete(md.DeviceState))
+    db.execute(queries.backfill_device_states())
+    db.commit()
+
+
+def ensure_device_states():
+    with replica.primary_reads():
+        missing = get_device_states_missing()
+    if missing:
+        rebuild_device_states()
+
+
+@database.inject_read_session
+def get_device_states_missing(db: Session):
+    return db.scalar(queries.device_states_missing())
+
+
+@database.inject_read_session
 def get_device(
     db: Session,
     obj_id: int = None,
@@ -114,100 +289,128 @@ def get_device(
     group: str = None,
     serial_number: str = None,
 ):
-    if obj_id:
-        return db.query(md.Device).filter(md.Device.id == obj_id).first()
-    if name and group:
-        return (
-            db.query(md.Device)
-            .filter(md.Device.name == name, md.Device.group == group)
-            .first()
-        )
-    if serial_number:
-        return (
-            db.query(md.Device).filter(md.Device.serial_number == serial_number).first()
-        )
+    query = queries.device(obj_id, name, group, serial_number)
+    if query is not None:
+        return db.scalars(query).first()
 
 
-@database.inject_db_session
+@database.inject_read_session
 def get_devices(db: Session):
-    return (
-        db.query(md.Device).order_by(md.Device.group.asc(), md.Device.name.asc()).all()
-    )
+    return db.scalars(queries.devices()).all()
 
 
-@database.inject_db_session
-def get_records_for_device(db: Session, obj_id: int, limit: int = 10):
-    return (
-        db.query(md.Record)
-        .where(md.Record.device_id == obj_id)
-        .order_by(md.Record.created_at.desc())
-        .limit(limit)
-        .all()
-    )
+@database.inject_read_session
+def get_device_names(db: Session, ids) -> dict:
+    """
+    Returns (group, name) of the devices with `ids` by device id
+    """
+    return {
+        device_id: (group, name)
+        for device_id, group, name in db.execute(queries.device_names(ids))
+    }
 
 
-@database.inject_db_session
-def get_records(db: Session, limit: int = 1000):
-    return db.query(md.Record).order_by(md.Record.created_at.desc()).limit(limit).all()
+@database.inject_read_session
+def get_reported_device_ids(db: Session):
+    return set(db.scalars(queries.reported_device_ids()).all())
 
 
-@database.inject_db_session
-def get_devices_with_open_problems(db: Session):
-    sub = (
-        db.query(md.Record)
-        .filter(md.Record.device_id == md.Device.id)
-        .order_by(md.Record.created_at.desc())
-        .limit(1)
-        .subquery()
-        .lateral()
-    )
+@database.inject_read_session
+def get_records_for_device(db: Session, obj_id: int, limit: int = 10, offset: int = 0):
+    return db.scalars(queries.records_for_device(obj_id, limit, offset)).all()
+
+
+@database.inject_read_session
+def get_records(db: Session, limit: int = 1000):
+    return db.scalars(queries.records(limit)).all()
 
-    return (
-        db.query(md.Device)
-        .outerjoin(sub)
-        .filter_by(kind="problem")
-        .options(contains_eager(md.Device.records, alias=sub))
+
+@database.inject_read_session
+def get_records_page(
+    db: Session,
+    cursor: str = None,
+    limit: int = 1000,
+    device_id: str = None,
+    newest_first: bool = True,
+):
+    records = db.scalars(
+        queries.records_page(cursor, limit, device_id, newest_first)
     ).all()
+    return pagination.make_page(records, queries.record_key, cursor, limit)
 
 
+# Read from the primary, the import deduplicates on rows it has just written
 @database.inject_db_session
+def get_record_contents_for_device(db: Session, device_id: str):
+    """
+    (created_at, reporter_id, text) of every record of the device
+    """
+    return [
+        tuple(row) for row in db.execute(queries.record_contents_for_device(device_id))
+    ]
+
+
+@database.inject_read_session
+def get_record_export_rows_page(
+    db: Session, cursor: str = None, limit: int = 1000, by_id: bool = False
+):
+    rows = db.execute(queries.record_export_rows_page(cursor, limit, by_id)).all()
+    key = (lambda r: (r.id,)) if by_id else queries.record_key
+    return pagination.make_page(rows, key, cursor, limit)
+
+
+@database.inject_read_session
+def get_devices_with_open_problems(db: Session):
+    return db.scalars(queries.devices_with_open_problems()).unique().all()
+
+
+@database.inject_read_session
 def get_user(db: Session, obj_id: int = None, name: str = None):
-    if obj_id:
-        return db.query(md.User).filter(md.User.id == obj_id).first()
-    if name:
-        return db.query(md.User).filter(md.User.name == name).first()
+    query = queries.user(obj_id, name)
+    if query is not None:
+        return db.scalars(query).first()
 
 
-@database.inject_db_session
+@database.inject_read_session
 def get_users(db: Session, skip: int = 0, limit: int = 1000):
-    return db.query(md.User).offset(skip).limit(limit).all()
+    return db.scalars(queries.users(skip, limit)).all()
 
 
-@database.inject_db_session
+@database.inject_read_session
+def get_user_names(db: Session, ids) -> dict:
+    return dict(db.execute(queries.user_names(ids)).all())
+
+
+@database.inject_read_session
+def get_users_page(db: Session, cursor: str = None, limit: int = 1000):
+    users = db.scalars(queries.users_page(cursor, limit)).all()
+    return pagination.make_page(users, lambda u: (u.id,), cursor, limit)
+
+
+@database.inject_read_session
 def get_predefined_message(db: Session, obj_id: int = None):
-    return (
-        db.query(md.PredefinedMessage).filter(md.PredefinedMessage.id == obj_id).first()
-    )
+    return db.scalars(queries.predefined_message(obj_id)).first()
 
 
-@database.inject_db_session
+@database.inject_read_session
 def get_predefined_messages(
     db: Session,
     kind: Union[str, Choice, Enum] = None,
     skip: int = 0,
     limit: int = 10000,
 ):
-    query = db.query(md.PredefinedMessage)
+    return db.scalars(queries.predefined_messages(kind, skip, limit)).all()
 
-    if kind:
-        if isinstance(kind, str):
-            kind = Choice(kind, kind)
-        elif isinstance(kind, Enum):
-            kind = Choice(kind.value, kind.value)
 
-        query = query.where(md.PredefinedMessage.kind == kind)
-
-    return query.offset(skip).limit(limit).all()
+@database.inject_read_session
+def get_predefined_messages_page(
+    db: Session,
+    kind: Union[str, Choice, Enum] = None,
+    cursor: str = None,
+    limit: int = 1000,
+):
+    messages = db.scalars(queries.predefined_messages_page(kind, cursor, limit)).all()
+    return pagination.make_page(messages, lambda m: (m.id,), cursor, limit)
 
 
 def get_predefined_problems():
@@ -216,3 +419,82 @@ def get_predefined_problems():
 
 def get_predefined_solutions():
     return get_predefined_messages(commons.ReportKinds.solution)
+
+
+# Read from the primary, conversation states are rewritten on every step
+@database.inject_db_session
+def get_conversation_state(db: Session, key: str, now: datetime):
+    return db.scalars(queries.conversation_state(key, now)).first()
+
+
+@database.inject_db_session
+def save_conversation_state(db: Session, key: str, payload: str, expires_at: datetime):
+    db.execute(
+        queries.upsert_conversation_state(
+            db.bind.dialect.name, key, payload, expires_at
+        )
+    )
+    db.commit()
+
+
+@database.inject_db_session
+def replace_conversation_state(
+    db: Session,
+    key: str,
+    payload: str,
+    new_payload: str,
+    expires_at: datetime,
+    now: datetime,
+):
+    """
+    Replaces the state `payload` with `new_payload`, returns False when the
+    state has changed or expired meanwhile
+    """
+    result = db.execute(
+        queries.replace_conversation_state(key, payload, new_payload, expires_at, now)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+@database.inject_db_session
+def delete_conversation_state(db: Session, key: str, now: datetime):
+    """
+    Deletes the state and returns its payload unless it has expired
+    """
+    row = db.execute(queries.delete_conversation_state(key)).first()
+    db.commit()
+
+    if row is not None and row.expires_at > now:
+        return row.payload
+
+
+@database.inject_db_session
+def delete_expired_conversation_states(db: Session, now: datetime):
+    result = db.execute(queries.delete_expired_conversation_states(now))
+    db.commit()
+    return result.rowcount
+
+
+# Read from the primary, a stale watermark would export records twice
+@database.inject_db_session
+def get_export_watermark(db: Session, target: str):
+    return db.scalars(queries.export_watermark(target)).first()
+
+
+@database.inject_db_session
+def save_export_watermark(
+    db: Session, target: str, last_record_id: int, last_record_at: datetime
+):
+    db.execute(
+        queries.upsert_export_watermark(
+            db.bind.dialect.name, target, last_record_id, last_record_at
+        )
+    )
+    db.commit()
+
+
+@database.inject_db_session
+def delete_export_watermark(db: Session, target: str):
+    db.execute(queries.delete_export_watermark(target))
+    db.commit()
@@ -0,0 +1,128 @@
+"""
+Keyset (cursor) pagination. A cursor is an opaque string holding the sort key
+of the item a page ends at and the direction to continue in, so reading a
+page is an index range scan however deep it is, unlike OFFSET.
+
+Cursors are short enough to fit Telegram callback data (64 bytes), e.g.
+"n.tgw902a3ym8.iya" for a (created_at, id) key.
+"""
+import base64
+import binascii
+from collections import namedtuple
+from datetime import datetime
+from datetime import timedelta
+
+from sqlalchemy import tuple_
+
+# `items` in the requested order, cursors are None when there is no such page
+Page = namedtuple("Page", ["items", "next_cursor", "prev_cursor"])
+
+NEXT = "n"
+PREV = "p"
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def to_base36(number: int) -> str:
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    sign, number = ("-", -number) if number < 0 else ("", number)
+    encoded = ""
+    while True:
+        number, digit = divmod(number, 36)
+        encoded = digits[digit] + encoded
+        if not number:
+            return sign + encoded
+
+
+def encode_value(value) -> str:
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            raise ValueError("Only naive datetimes are stored, got an aware one")
+        return "t" + to_base36((value - EPOCH) // MICROSECOND)
+    if isinstance(value, int):
+        return "i" + to_base36(value)
+    if isinstance(value, str):
+        return "s" + base64.urlsafe_b64encode(value.encode()).decode().rstrip("=")
+    raise ValueError(f"Values of type '{type(value).__name__}' can't be in a cursor")
+
+
+def decode_value(token: str):
+    kind, value = token[:1], token[1:]
+    if kind == "t":
+        return EPOCH + int(value, 36) * MICROSECOND
+    if kind == "i":
+        return int(value, 36)
+    if kind == "s":
+        padded = value + "=" * (-len(value) % 4)
+        return base64.b64decode(padded, altchars=b"-_", validate=True).decode()
+    raise ValueError(f"Unknown cursor token '{token}'")
+
+
+def encode_cursor(direction: str, values: tuple) -> str:
+    return ".".join([direction] + [encode_value(v) for v in values])
+
+
+def decode_cursor(cursor: str):
+    """
+    Returns the (direction, values) of a cursor, raises InvalidCursor for
+    anything that was not made by encode_cursor
+    """
+    direction, _, tokens = cursor.partition(".")
+    if direction not in (NEXT, PREV) or not tokens:
+        raise InvalidCursor(f"Invalid cursor '{cursor}'")
+
+    try:
+        return direction, tuple(decode_value(t) for t in tokens.split("."))
+    except (ValueError, OverflowError, binascii.Error) as exc:
+        raise InvalidCursor(f"Invalid cursor '{cursor}'") from exc
+
+
+def paginate(query, columns, cursor: str = None, limit: int = 100, descending=False):
+    """
+    Orders `query` by `columns` and limits it to the page after (or before)
+    `cursor`. One extra row is selected to tell whether another page follows,
+    pass the rows to `make_page`.
+    """
+    direction, values = decode_cursor(cursor) if cursor else (NEXT, None)
+    # Pages before the cursor are read in reverse order and flipped back
+    reverse = descending != (direction == PREV)
+
+    if values is not None:
+        if len(values) != len(columns):
+            raise InvalidCursor(f"Invalid cursor '{cursor}'")
+        key, bound = tuple_(*columns), tuple_(*values)
+        query = query.where(key < bound if reverse else key > bound)
+
+    return query.order_by(
+        *[column.desc() if reverse else column.asc() for column in columns]
+    ).limit(limit + 1)
+
+
+def make_page(rows, key, cursor: str = None, limit: int = 100) -> Page:
+    """
+    Builds the page of `rows` selected by `paginate`, `key` returns the
+    values of the paginated columns of an item
+    """
+    direction = decode_cursor(cursor)[0] if cursor else NEXT
+    has_more = len(rows) > limit
+    items = list(rows[:limit])
+
+    if not items:
+        return Page(items, None, None)
+
+    if direction == PREV:
+        items.reverse()
+
+    first = encode_cursor(PREV, key(items[0]))
+    last = encode_cursor(NEXT, key(items[-1]))
+
+    if direction == NEXT:
+        # Any cursor means the page was reached from an earlier one
+        return Page(items, last if has_more else None, first if cursor else None)
+
+    return Page(items, last, first if has_more else None)
@@ -0,0 +1,59 @@
+import time
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+
+class PoolMetrics:
+    """
+    Counts connection checkouts of an engine's pool. A connection held longer
+    than `leak_threshold` seconds is reported as a leak suspect.
+    """
+
+    def __init__(self, engine, leak_threshold: float):
+        self.pool = engine.pool
+        self.leak_threshold = leak_threshold
+
+        self.checkouts = 0
+        self.max_checked_out = 0
+        self.leaks_total = 0
+        self._checked_out = {}
+
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self.checkouts += 1
+        self._checked_out[id(connection_record)] = time.monotonic()
+        self.max_checked_out = max(self.max_checked_out, len(self._checked_out))
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        checked_out_at = self._checked_out.pop(id(connection_record), None)
+
+        if checked_out_at is not None:
+            if time.monotonic() - checked_out_at > self.leak_threshold:
+                self.leaks_total += 1
+
+    def snapshot(self):
+        now = time.monotonic()
+
+        result = {
+            "checked_out": len(self._checked_out),
+            "max_checked_out": self.max_checked_out,
+            "checkouts": self.checkouts,
+            "leak_suspects": sum(
+                1 for t in self._checked_out.values() if now - t > self.leak_threshold
+            ),
+            "leaks_total": self.leaks_total,
+        }
+
+        if isinstance(self.pool, QueuePool):
+            result.update(
+                {
+                    "size": self.pool.size(),
+                    "overflow": max(0, self.pool.overflow()),
+                    "checked_in": self.pool.checkedin(),
+                }
+            )
+
+        return result
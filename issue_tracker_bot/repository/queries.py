@@ -0,0 +1,414 @@
+"""
+Statements shared by the sync and the async operations modules,
+so both expose exactly the same queries.
+"""
+from datetime import datetime
+from enum import Enum
+from typing import Union
+
+from pydantic import BaseModel
+from sqlalchemy import delete
+from sqlalchemy import exists
+from sqlalchemy import func
+from sqlalchemy import insert
+from sqlalchemy import select
+from sqlalchemy import String
+from sqlalchemy import type_coerce
+from sqlalchemy import update
+from sqlalchemy.orm import aliased
+from sqlalchemy.orm import contains_eager
+from sqlalchemy.orm import joinedload
+from sqlalchemy_utils.types import Choice
+
+from issue_tracker_bot.repository import commons
+from issue_tracker_bot.repository import models_db as md
+from issue_tracker_bot.repository import pagination
+
+
+def choice_to_str(value: Union[str, Choice, Enum]) -> str:
+    if isinstance(value, Choice):
+        return value.code
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def device(
+    obj_id: int = None,
+    name: str = None,
+    group: str = None,
+    serial_number: str = None,
+):
+    if obj_id:
+        return select(md.Device).where(md.Device.id == obj_id)
+    if name and group:
+        return select(md.Device).where(md.Device.name == name, md.Device.group == group)
+    if serial_number:
+        return select(md.Device).where(md.Device.serial_number == serial_number)
+
+
+def devices():
+    return select(md.Device).order_by(md.Device.group.asc(), md.Device.name.asc())
+
+
+def device_contents():
+    return select(md.Device.id, md.Device.group, md.Device.name)
+
+
+def upsert_devices(dialect_name: str, rows):
+    """
+    Creates missing devices and renames or regroups existing ones, rows
+    already holding the same group and name are not touched
+    """
+    return upsert(
+        dialect_name,
+        md.Device,
+        rows,
+        index_elements=["id"],
+        where=lambda excluded: (md.Device.group != excluded.group)
+        | (md.Device.name != excluded.name),
+    )
+
+
+def device_names(ids):
+    return select(md.Device.id, md.Device.group, md.Device.name).where(
+        md.Device.id.in_(ids)
+    )
+
+
+def reported_device_ids():
+    return select(md.Record.device_id).distinct()
+
+
+def records_for_device(obj_id: int, limit: int = 10, offset: int = 0):
+    return (
+        select(md.Record)
+        .where(md.Record.device_id == obj_id)
+        .options(joinedload(md.Record.reporter), joinedload(md.Record.device))
+        .order_by(md.Record.created_at.desc(), md.Record.id.desc())
+        .limit(limit)
+        .offset(offset)
+    )
+
+
+def record_contents_for_device(device_id: str):
+    return select(md.Record.created_at, md.Record.reporter_id, md.Record.text).where(
+        md.Record.device_id == device_id
+    )
+
+
+def record_key(record):
+    return (record.created_at, record.id)
+
+
+def record_insert_rows(records):
+    """
+    Insert parameters of RecordCreate objects or dicts, a missing id or
+    created_at is left out so the database generates it
+    """
+    rows = []
+    for record in records:
+        data = record.model_dump() if isinstance(record, BaseModel) else record
+        rows.append(
+            {
+                key: value
+                for key, value in data.items()
+                if value is not None or key not in ("id", "created_at")
+            }
+        )
+    return rows
+
+
+def insert_records():
+    """
+    Multi-row INSERT of records returning what device states are built from,
+    in the order the rows were given
+    """
+    return insert(md.Record).returning(
+        md.Record.id,
+        md.Record.device_id,
+        md.Record.kind,
+        md.Record.created_at,
+        sort_by_parameter_order=True,
+    )
+
+
+def records(limit: int = 1000):
+    return (
+        select(md.Record)
+        .options(joinedload(md.Record.reporter), joinedload(md.Record.device))
+        .order_by(md.Record.created_at.desc())
+        .limit(limit)
+    )
+
+
+def records_page(
+    cursor: str = None, limit: int = 1000, device_id=None, newest_first=True
+):
+    """
+    Records in (created_at, id) order, a page of `limit` after `cursor`
+    """
+    query = select(md.Record).options(
+        joinedload(md.Record.reporter), joinedload(md.Record.device)
+    )
+
+    if device_id is not None:
+        query = query.where(md.Record.device_id == device_id)
+
+    return pagination.paginate(
+        query, [md.Record.created_at, md.Record.id], cursor, limit, newest_first
+    )
+
+
+def record_export_rows_page(cursor: str = None, limit: int = 1000, by_id=False):
+    """
+    Plain (id, text, kind, created_at, reporter_id, device_id) rows of records
+    in (created_at, id) order, or id order with `by_id`, without ORM entities
+    or joins. The kind is read as its stored code rather than a Choice.
+    """
+    query = select(
+        md.Record.id,
+        md.Record.text,
+        type_coerce(md.Record.kind, String).label("kind"),
+        md.Record.created_at,
+        md.Record.reporter_id,
+        md.Record.device_id,
+    )
+    columns = [md.Record.id] if by_id else [md.Record.created_at, md.Record.id]
+    return pagination.paginate(query, columns, cursor, limit)
+
+
+def devices_with_open_problems():
+    last_record = aliased(md.Record)
+
+    return (
+        select(md.Device)
+        .join(md.DeviceState, md.DeviceState.device_id == md.Device.id)
+        .join(last_record, last_record.id == md.DeviceState.last_record_id)
+        .where(md.DeviceState.last_record_kind == commons.ReportKinds.problem.value)
+        .options(contains_eager(md.Device.records.of_type(last_record)))
+        .order_by(md.Device.group.asc(), md.Device.name.asc())
+    )
+
+
+def upsert(dialect_name: str, model, rows, index_elements, where=None):
+    """
+    Dialect native INSERT ... ON CONFLICT DO UPDATE of all non-key columns.
+    `where` receives the `excluded` row and limits which conflicts update.
+    """
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise RuntimeError(f"Upsert is not supported for '{dialect_name}'")
+
+    query = dialect_insert(model).values(rows)
+    update_columns = [c for c in rows[0] if c not in index_elements]
+
+    return query.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={c: query.excluded[c] for c in update_columns},
+        where=where(query.excluded) if where is not None else None,
+    )
+
+
+def device_state_row(record: md.Record):
+    return {
+        "device_id": record.device_id,
+        "last_record_id": record.id,
+        "last_record_kind": choice_to_str(record.kind),
+        "last_record_at": record.created_at,
+    }
+
+
+def latest_device_state_rows(records):
+    """
+    Device state rows of the latest of `records` of every device
+    """
+    latest = {}
+    for record in records:
+        current = latest.get(record.device_id)
+        if current is None or record_key(record) > record_key(current):
+            latest[record.device_id] = record
+
+    return [device_state_row(record) for record in latest.values()]
+
+
+def upsert_device_states(dialect_name: str, rows):
+    """
+    Moves device state to the given records unless it already points
+    to a newer one
+    """
+    return upsert(
+        dialect_name,
+        md.DeviceState,
+        rows,
+        index_elements=["device_id"],
+        where=lambda excluded: md.DeviceState.last_record_at <= excluded.last_record_at,
+    )
+
+
+def latest_records_per_device():
+    ranked = select(
+        md.Record.device_id,
+        md.Record.id,
+        md.Record.kind,
+        md.Record.created_at,
+        func.row_number()
+        .over(
+            partition_by=md.Record.device_id,
+            order_by=(md.Record.created_at.desc(), md.Record.id.desc()),
+        )
+        .label("position"),
+    ).subquery()
+
+    return select(
+        ranked.c.device_id, ranked.c.id, ranked.c.kind, ranked.c.created_at
+    ).where(ranked.c.position == 1)
+
+
+def backfill_device_states():
+    return insert(md.DeviceState).from_select(
+        ["device_id", "last_record_id", "last_record_kind", "last_record_at"],
+        latest_records_per_device(),
+    )
+
+
+def device_states_missing():
+    """
+    True when there are records but no device state at all,
+    i.e. the device_states table was just created
+    """
+    return select(
+        exists(select(md.Record.id)) & ~exists(select(md.DeviceState.device_id))
+    )
+
+
+def user(obj_id: int = None, name: str = None):
+    if obj_id:
+        return select(md.User).where(md.User.id == obj_id)
+    if name:
+        return select(md.User).where(md.User.name == name)
+
+
+def users(skip: int = 0, limit: int = 1000):
+    return select(md.User).offset(skip).limit(limit)
+
+
+def user_names(ids):
+    return select(md.User.id, md.User.name).where(md.User.id.in_(ids))
+
+
+def users_page(cursor: str = None, limit: int = 1000):
+    return pagination.paginate(select(md.User), [md.User.id], cursor, limit)
+
+
+def predefined_message(obj_id: int = None):
+    return select(md.PredefinedMessage).where(md.PredefinedMessage.id == obj_id)
+
+
+def predefined_messages(
+    kind: Union[str, Choice, Enum] = None,
+    skip: int = 0,
+    limit: int = 10000,
+):
+    query = select(md.PredefinedMessage)
+
+    if kind:
+        if isinstance(kind, str):
+            kind = Choice(kind, kind)
+        elif isinstance(kind, Enum):
+            kind = Choice(kind.value, kind.value)
+
+        query = query.where(md.PredefinedMessage.kind == kind)
+
+    return query.offset(skip).limit(limit)
+
+
+def predefined_messages_page(
+    kind: Union[str, Choice, Enum] = None, cursor: str = None, limit: int = 1000
+):
+    query = predefined_messages(kind, limit=None)
+    return pagination.paginate(query, [md.PredefinedMessage.id], cursor, limit)
+
+
+def predefined_message_contents():
+    return select(
+        md.PredefinedMessage.id, md.PredefinedMessage.text, md.PredefinedMessage.kind
+    )
+
+
+def conversation_state(key: str, now: datetime):
+    # States are changed with bulk statements that leave an object already
+    # loaded in a shared session as it was, it is refreshed on every read
+    return (
+        select(md.ConversationState)
+        .where(md.ConversationState.key == key, md.ConversationState.expires_at > now)
+        .execution_options(populate_existing=True)
+    )
+
+
+def upsert_conversation_state(dialect_name: str, key, payload, expires_at):
+    return upsert(
+        dialect_name,
+        md.ConversationState,
+        [{"key": key, "payload": payload, "expires_at": expires_at}],
+        index_elements=["key"],
+    )
+
+
+def replace_conversation_state(key: str, payload, new_payload, expires_at, now):
+    """
+    Updates the state of `key` unless it has expired or changed from `payload`.
+    A loaded state object is not synchronized, it would get `new_payload`
+    even when no row matched.
+    """
+    return (
+        update(md.ConversationState)
+        .where(
+            md.ConversationState.key == key,
+            md.ConversationState.payload == payload,
+            md.ConversationState.expires_at > now,
+        )
+        .values(payload=new_payload, expires_at=expires_at)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def delete_conversation_state(key: str):
+    return (
+        delete(md.ConversationState)
+        .where(md.ConversationState.key == key)
+        .returning(md.ConversationState.payload, md.ConversationState.expires_at)
+    )
+
+
+def delete_expired_conversation_states(now: datetime):
+    return delete(md.ConversationState).where(md.ConversationState.expires_at <= now)
+
+
+def export_watermark(target: str):
+    return select(md.ExportWatermark).where(md.ExportWatermark.target == target)
+
+
+def upsert_export_watermark(
+    dialect_name: str, target: str, last_record_id: int, last_record_at: datetime
+):
+    return upsert(
+        dialect_name,
+        md.ExportWatermark,
+        [
+            {
+                "target": target,
+                "last_record_id": last_record_id,
+                "last_record_at": last_record_at,
+                "exported_at": datetime.utcnow(),
+            }
+        ],
+        index_elements=["target"],
+    )
+
+
+def delete_export_watermark(target: str):
+    return delete(md.ExportWatermark).where(md.ExportWatermark.target == target)
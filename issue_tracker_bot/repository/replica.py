@@ -0,0 +1,143 @@
+"""
+Routing of repository reads to the optional read replica (DATABASE_REPLICA_URL).
+Reads go to the replica unless
+
+- the writer reading committed to the primary less than
+  DB_REPLICA_STICKY_SECONDS ago, so users read back what they have just
+  written however far the replica lags behind
+- a replica read failed less than DB_REPLICA_RETRY_SECONDS ago
+- they are made inside `primary_reads`
+
+Writers are told apart by `writer_scope`, every update is handled in the scope
+of its Telegram user. Commits made outside of any scope share one writer.
+Stickiness is tracked per process.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.exc import InterfaceError
+from sqlalchemy.exc import OperationalError
+
+from issue_tracker_bot import settings
+
+logger = logging.getLogger(__name__)
+
+# Errors meaning the replica can't be reached, such reads are retried on primary
+REPLICA_DOWN_ERRORS = (OperationalError, InterfaceError)
+
+# Expired writers are dropped once more than this many are remembered
+MAX_TRACKED_WRITERS = 1000
+
+_writer: ContextVar = ContextVar("writer", default=None)
+_primary_reads: ContextVar = ContextVar("primary_reads", default=False)
+
+
+@contextmanager
+def writer_scope(writer):
+    """
+    Commits made inside are attributed to `writer`, reads inside see them
+    """
+    token = _writer.set(writer)
+    try:
+        yield
+    finally:
+        _writer.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """
+    Reads made inside go to the primary, for reads that writes depend on
+    """
+    token = _primary_reads.set(True)
+    try:
+        yield
+    finally:
+        _primary_reads.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Shared by the event loop and the executor threads running sync
+    operations, the state is only touched under `_lock`
+    """
+
+    def __init__(self, sticky_seconds: float, retry_seconds: float):
+        self.sticky_seconds = sticky_seconds
+        self.retry_seconds = retry_seconds
+
+        self.fallbacks = 0
+        self._down_until = 0.0
+        self._last_writes = {}
+        self._lock = threading.Lock()
+
+    def mark_written(self, writer):
+        now = time.monotonic()
+
+        with self._lock:
+            self._last_writes[writer] = now
+
+            if len(self._last_writes) > MAX_TRACKED_WRITERS:
+                self._last_writes = {
+                    w: t
+                    for w, t in self._last_writes.items()
+                    if now - t < self.sticky_seconds
+                }
+
+    def is_sticky(self, writer) -> bool:
+        with self._lock:
+            written_at = self._last_writes.get(writer)
+        return (
+            written_at is not None
+            and time.monotonic() - written_at < self.sticky_seconds
+        )
+
+    def is_down(self) -> bool:
+        return time.monotonic() < self._down_until
+
+    def mark_down(self, exc: Exception):
+        with self._lock:
+            self.fallbacks += 1
+            self._down_until = time.monotonic() + self.retry_seconds
+        logger.warning(
+            f"Replica read failed, reading from the primary "
+            f"for {self.retry_seconds}s: {exc}"
+        )
+
+    def use_replica(self) -> bool:
+        return not (
+            _primary_reads.get() or self.is_down() or self.is_sticky(_writer.get())
+        )
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            written_at = list(self._last_writes.values())
+
+        return {
+            "down": self.is_down(),
+            "fallbacks": self.fallbacks,
+            "sticky_writers": sum(
+                1 for t in written_at if now - t < self.sticky_seconds
+            ),
+        }
+
+
+router = ReplicaRouter(
+    settings.DB_REPLICA_STICKY_SECONDS, settings.DB_REPLICA_RETRY_SECONDS
+)
+
+
+def _on_commit(connection):
+    router.mark_written(_writer.get())
+
+
+def track_writes(engine):
+    """
+    Every commit on `engine` makes the current writer sticky to the primary
+    """
+    event.listen(engine, "commit", _on_commit)
@@ -13,3 +13,4 @@ class MenuCommandStates(Enum):
     DEVICE_SELECTED_FOR_ACTION = "ds"
     DEVICE_GROUP_SELECTED_FOR_ACTION = "dgs"
     OPTION_SELECTED_FOR_ACTION = "os"
+    STATUS_PAGE_SELECTED = "sp"
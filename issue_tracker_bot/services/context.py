@@ -1,6 +1,100 @@
+import time
+from collections import defaultdict
+
+
+class DeviceCatalog:
+    """
+    In-memory snapshot of all devices, indexed by id and by group.
+    A catalog is never rebuilt in place: a new one with a bumped version
+    replaces it, so readers always see a complete catalog.
+    """
+
+    def __init__(self, devices=(), reported_ids=(), version=0):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.by_id = {}
+        self.by_group = {}
+        self.reported_ids = set(reported_ids)
+
+        for device in devices:
+            self.by_id[device.id] = device
+            self.by_group.setdefault(device.group, []).append(device)
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def is_stale(self, ttl):
+        return time.monotonic() - self.loaded_at > ttl
+
+    def get_device(self, obj_id):
+        return self.by_id.get(obj_id)
+
+    def get_devices(self):
+        return list(self.by_id.values())
+
+    def get_grouped_devices(self):
+        return defaultdict(list, {g: list(ds) for g, ds in self.by_group.items()})
+
+    def get_grouped_reported_devices(self):
+        result = defaultdict(list)
+
+        for group, devices in self.by_group.items():
+            reported = [d for d in devices if d.id in self.reported_ids]
+            if reported:
+                result[group] = reported
+
+        return result
+
+    def mark_reported(self, device_id):
+        self.reported_ids.add(device_id)
+
+
+class PredefinedMessagesCatalog:
+    """
+    In-memory snapshot of predefined messages grouped by kind. Keyboard
+    layouts (rows of messages) are computed once per kind and reused.
+    """
+
+    def __init__(self, messages=(), version=0):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.by_id = {}
+        self.by_kind = {}
+        self._layouts = {}
+
+        for message in messages:
+            self.by_id[message.id] = message
+            self.by_kind.setdefault(message.kind, []).append(message)
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def is_stale(self, ttl):
+        return time.monotonic() - self.loaded_at > ttl
+
+    def get_message(self, obj_id):
+        return self.by_id.get(obj_id)
+
+    def get_messages(self, kind):
+        return list(self.by_kind.get(kind, []))
+
+    def get_layout(self, kind, per_row):
+        key = (kind, per_row)
+
+        if key not in self._layouts:
+            messages = self.by_kind.get(kind, [])
+            self._layouts[key] = tuple(
+                tuple(messages[i : i + per_row])
+                for i in range(0, len(messages), per_row)
+            )
+
+        return self._layouts[key]
+
+
 class AppContext:
     _instance = None
-    devices = None
+    devices: DeviceCatalog = None
+    predefined_messages: PredefinedMessagesCatalog = None
     problems_kinds = None
     solutions_kinds = None
     open_problems: dict = None
@@ -10,8 +104,15 @@ class AppContext:
             cls._instance = super().__new__(cls, *args, **kwargs)
         return cls._instance
 
-    def set_devices(self, devices):
-        self.devices = devices
+    def set_devices(self, devices, reported_ids=()):
+        previous = self.devices
+        version = previous.version + 1 if previous is not None else 1
+        self.devices = DeviceCatalog(devices, reported_ids, version)
+
+    def set_predefined_messages(self, messages):
+        previous = self.predefined_messages
+        version = previous.version + 1 if previous is not None else 1
+        self.predefined_messages = PredefinedMessagesCatalog(messages, version)
 
     def set_problems_kinds(self, problems_kinds):
         self.problems_kinds = problems_kinds or []
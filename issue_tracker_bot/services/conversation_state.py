@@ -0,0 +1,184 @@
+import abc
+import copy
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from datetime import timedelta
+
+from issue_tracker_bot import settings
+from issue_tracker_bot.repository import async_operations as aops
+
+# Compare and set attempts of SQLStateStore.update before giving up
+MAX_UPDATE_ATTEMPTS = 10
+
+
+class ConversationStateConflict(RuntimeError):
+    ...
+
+
+class ConversationStateStore(abc.ABC):
+    """
+    Keeps the state of multi-step flows per user. States are plain
+    JSON-serializable dicts; a state changed after `get` must be `set` again,
+    the last `set` wins. Changes depending on the current state go through
+    `update` so concurrent changes of one state are not lost.
+    """
+
+    @abc.abstractmethod
+    async def get(self, key: str):
+        pass
+
+    @abc.abstractmethod
+    async def set(self, key: str, state: dict):
+        pass
+
+    @abc.abstractmethod
+    async def update(self, key: str, change):
+        """
+        Applies `change`, a function mutating the state in place, to the
+        current state and returns the changed state, or None without a state
+        """
+
+    @abc.abstractmethod
+    async def pop(self, key: str):
+        pass
+
+
+class InMemoryStateStore(ConversationStateStore):
+    """
+    Process local store, evicts expired states and the least recently used
+    ones above `maxsize`
+    """
+
+    def __init__(self, ttl: int = None, maxsize: int = None, clock=time.monotonic):
+        self.ttl = ttl or settings.CONVERSATION_STATE_TTL
+        self.maxsize = maxsize or settings.CONVERSATION_STATE_MAXSIZE
+        self.clock = clock
+        self._states = OrderedDict()
+
+    def __len__(self):
+        return len(self._states)
+
+    async def get(self, key: str):
+        item = self._states.get(key)
+
+        if item is None:
+            return None
+
+        expires_at, state = item
+        if expires_at <= self.clock():
+            del self._states[key]
+            return None
+
+        self._states.move_to_end(key)
+        return copy.deepcopy(state)
+
+    async def set(self, key: str, state: dict):
+        self._states[key] = (self.clock() + self.ttl, copy.deepcopy(state))
+        self._states.move_to_end(key)
+        self._evict()
+
+    async def update(self, key: str, change):
+        # Nothing is awaited between reading and writing the state
+        state = await self.get(key)
+        if state is None:
+            return None
+
+        change(state)
+        await self.set(key, state)
+        return copy.deepcopy(state)
+
+    async def pop(self, key: str):
+        state = await self.get(key)
+        self._states.pop(key, None)
+        return state
+
+    def _evict(self):
+        # Expired states are dropped lazily on read, the full scan only runs
+        # once the store grows over its limit
+        if len(self._states) <= self.maxsize:
+            return
+
+        now = self.clock()
+
+        for key in [
+            k for k, (expires_at, _) in self._states.items() if expires_at <= now
+        ]:
+            del self._states[key]
+
+        while len(self._states) > self.maxsize:
+            self._states.popitem(last=False)
+
+
+class SQLStateStore(ConversationStateStore):
+    """
+    Database backed store shared by all workers. Expired states are ignored
+    on read and purged every `purge_every` writes.
+    """
+
+    def __init__(self, ttl: int = None, purge_every: int = 100, clock=datetime.utcnow):
+        self.ttl = ttl or settings.CONVERSATION_STATE_TTL
+        self.purge_every = purge_every
+        self.clock = clock
+        self._writes = 0
+
+    async def get(self, key: str):
+        state = await aops.get_conversation_state(key, self.clock())
+        return json.loads(state.payload) if state else None
+
+    async def set(self, key: str, state: dict):
+        now = self.clock()
+        await aops.save_conversation_state(
+            key, json.dumps(state), now + timedelta(seconds=self.ttl)
+        )
+
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            await aops.delete_expired_conversation_states(now)
+
+    async def update(self, key: str, change):
+        # Compare and set, retried when another worker changed the state
+        # between reading and writing it
+        for _ in range(MAX_UPDATE_ATTEMPTS):
+            current = await aops.get_conversation_state(key, self.clock())
+            if current is None:
+                return None
+
+            state = json.loads(current.payload)
+            change(state)
+
+            now = self.clock()
+            if await aops.replace_conversation_state(
+                key,
+                current.payload,
+                json.dumps(state),
+                now + timedelta(seconds=self.ttl),
+                now,
+            ):
+                return state
+
+        raise ConversationStateConflict(
+            f"State '{key}' kept changing over {MAX_UPDATE_ATTEMPTS} update attempts"
+        )
+
+    async def pop(self, key: str):
+        payload = await aops.delete_conversation_state(key, self.clock())
+        return json.loads(payload) if payload else None
+
+
+STATE_STORES = {
+    "memory": InMemoryStateStore,
+    "sql": SQLStateStore,
+}
+
+
+def create_state_store(backend: str = None):
+    backend = backend or settings.CONVERSATION_STATE_BACKEND
+
+    try:
+        store_cls = STATE_STORES[backend]
+    except KeyError:
+        raise RuntimeError(f"Unexpected conversation state backend: '{backend}'")
+
+    return store_cls()
@@ -1,32 +1,173 @@
-import json
+import logging
 from datetime import datetime
 
-from issue_tracker_bot.repository import database
-from issue_tracker_bot.repository.models_pyd import RecordExport
-from issue_tracker_bot.repository.operations import get_records
+from issue_tracker_bot import settings
+from issue_tracker_bot.repository import migrations
+from issue_tracker_bot.repository import operations as rops
+from issue_tracker_bot.repository import pagination
 from issue_tracker_bot.services import Snapshotter
 
 gc = Snapshotter()
 
+logger = logging.getLogger(__name__)
 
-def export_reports_to_gdoc():
-    data = get_records(limit=1000)
-    data = [
-        json.loads(
-            RecordExport.model_validate(d).model_dump_json(
-                exclude=("device_id", "reporter_id")
+# Same columns as RecordExport dumped without device_id and reporter_id
+EXPORT_HEADER = ["id", "text", "kind", "created_at", "reporter", "device"]
+
+
+class RecordRowFormatter:
+    """
+    Converts plain record rows (see queries.record_export_rows_page) to
+    EXPORT_HEADER rows. Reporter and device columns are formatted once per
+    distinct user or device, which are looked up a batch at a time, and
+    created_at is formatted once per distinct value of a batch. A
+    `date_format` of None keeps created_at a datetime.
+    """
+
+    def __init__(self, date_format: str = settings.REPORT_DT_FORMAT):
+        self.date_format = date_format
+        self.reporters = {}
+        self.devices = {}
+
+    def load(self, rows):
+        reporter_ids = {row.reporter_id for row in rows} - self.reporters.keys()
+        device_ids = {row.device_id for row in rows} - self.devices.keys()
+
+        if reporter_ids:
+            names = rops.get_user_names(reporter_ids)
+            for reporter_id in reporter_ids:
+                self.reporters[reporter_id] = (
+                    str(names[reporter_id] or reporter_id)
+                    if reporter_id in names
+                    else None
+                )
+
+        if device_ids:
+            names = rops.get_device_names(device_ids)
+            for device_id in device_ids:
+                group, name = names.get(device_id, (None, None))
+                self.devices[device_id] = (
+                    f"{device_id} :: {group}-{name}" if device_id in names else None
+                )
+
+    def __call__(self, rows):
+        self.load(rows)
+        reporters = self.reporters
+        devices = self.devices
+
+        if self.date_format is None:
+            return [
+                [id_, text, kind, created_at, reporters[reporter], devices[device]]
+                for id_, text, kind, created_at, reporter, device in rows
+            ]
+
+        dates = {}
+        date_format = self.date_format
+        result = []
+
+        for id_, text, kind, created_at, reporter, device in rows:
+            date = dates.get(created_at)
+            if date is None:
+                date = dates[created_at] = created_at.strftime(date_format)
+            result.append([id_, text, kind, date, reporters[reporter], devices[device]])
+
+        return result
+
+
+class RecordBatches:
+    """
+    Walks all records in (created_at, id) cursor pages, or the records with
+    ids above `after_id` in id order, yielding every page converted to rows
+    by `formatter` (sheet rows by default). `last` is the (id, created_at) of
+    the record with the highest id yielded so far.
+
+    Records are continued after an id rather than a created_at, which can be
+    set by the caller (e.g. the tracker import) or is the start of a
+    transaction that committed after newer records were exported.
+    """
+
+    def __init__(self, after_id: int = None, batch_size: int = None, formatter=None):
+        self.after_id = after_id
+        self.last = None
+        self.batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+        self.formatter = formatter or RecordRowFormatter()
+
+    def __iter__(self):
+        by_id = self.after_id is not None
+        cursor = None
+        if by_id:
+            cursor = pagination.encode_cursor(pagination.NEXT, (self.after_id,))
+
+        while True:
+            page = rops.get_record_export_rows_page(
+                cursor=cursor, limit=self.batch_size, by_id=by_id
             )
-        )
-        for d in data
-    ]
+            if not page.items:
+                return
+
+            rows = self.formatter(page.items)
+            newest = max(page.items, key=lambda r: r.id)
+            if self.last is None or newest.id > self.last[0]:
+                self.last = (newest.id, newest.created_at)
+            yield rows
+
+            cursor = page.next_cursor
+            if cursor is None:
+                return
+
 
-    header = list(data[0].keys())
+def export_target(sheet_name):
+    return f"{gc.spreadsheet_id}:{sheet_name}"
 
-    data = [header, *[list(d.values()) for d in data]]
 
-    gc.export_records(str(datetime.now().date()), data)
+def export_reports_to_gdoc(full: bool = False):
+    """
+    Appends records added after the watermark of today's snapshot sheet,
+    the sheet is rebuilt from scratch when `full` is set or it has no
+    watermark yet. Returns the number of exported records.
+
+    The watermark is the highest exported record id. Ids are taken at insert,
+    so a record committed after one with a higher id was exported is only
+    picked up by the next full rebuild.
+    """
+    sheet_name = str(datetime.now().date())
+    target = export_target(sheet_name)
+    watermark = None if full else rops.get_export_watermark(target)
+
+    if watermark is None:
+        # The sheet is cleared first, a rebuild that fails or finds no records
+        # must not leave the previous watermark next to it
+        rops.delete_export_watermark(target)
+        batches = RecordBatches()
+        count = gc.export_records_in_batches(sheet_name, EXPORT_HEADER, batches)
+    else:
+        batches = RecordBatches(after_id=watermark.last_record_id)
+        try:
+            count = gc.append_records_in_batches(sheet_name, batches)
+        except Exception:
+            # Some rows may have been written, only a rebuild is exact now
+            rops.delete_export_watermark(target)
+            raise
+
+    if batches.last is not None:
+        last_record_id, last_record_at = batches.last
+        rops.save_export_watermark(target, last_record_id, last_record_at)
+
+    logger.info(
+        f"Exported {count} records to '{sheet_name}' "
+        f"({'full' if watermark is None else 'incremental'})"
+    )
+    return count
 
 
 if __name__ == "__main__":
-    database.Base.metadata.create_all(bind=database.engine)
-    export_reports_to_gdoc()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Exports records to the snapshot")
+    parser.add_argument(
+        "--full", action="store_true", help="rebuild today's snapshot sheet"
+    )
+    args = parser.parse_args()
+
+    migrations.upgrade_schema()
+    export_reports_to_gdoc(full=args.full)
@@ -0,0 +1,273 @@
+"""
+Streams records from the database into files on disk, for analysts who need
+the full history rather than the daily snapshot sheet.
+
+    python -m issue_tracker_bot.services.file_export records.parquet
+    python -m issue_tracker_bot.services.file_export records.csv.gz --compression gzip
+
+Records are read in keyset batches and every batch is written right away,
+so memory stays flat however many records are exported. Parquet needs the
+optional `pyarrow` package.
+"""
+import abc
+import bz2
+import csv
+import gzip
+import importlib.util
+import io
+import json
+import logging
+import lzma
+import os
+from datetime import datetime
+from pathlib import Path
+
+from issue_tracker_bot import settings
+from issue_tracker_bot.repository import migrations
+from issue_tracker_bot.services.data_export import EXPORT_HEADER
+from issue_tracker_bot.services.data_export import RecordBatches
+from issue_tracker_bot.services.data_export import RecordRowFormatter
+
+logger = logging.getLogger(__name__)
+
+TEXT_COMPRESSIONS = {
+    "gzip": (gzip.open, ".gz"),
+    "bz2": (bz2.open, ".bz2"),
+    "xz": (lzma.open, ".xz"),
+}
+PARQUET_COMPRESSIONS = {"snappy", "gzip", "brotli", "zstd", "lz4"}
+# Used for files sent by the bot, Telegram limits documents to 50 MB
+DEFAULT_COMPRESSIONS = {"csv": "gzip", "jsonl": "gzip", "parquet": "snappy"}
+
+
+class RecordExporter(abc.ABC):
+    """
+    Writes rows of `header` columns to `path`. Subclasses register
+    themselves in EXPORTERS under `format_name`.
+    """
+
+    format_name = None
+    compressions = set()
+
+    def __init__(self, path, header, compression=None):
+        self.check_compression(compression)
+        self.path = Path(path)
+        self.header = header
+        self.compression = compression
+
+    @classmethod
+    def check_available(cls):
+        """
+        Raises ValueError when a package the format needs is not installed
+        """
+
+    @classmethod
+    def check_compression(cls, compression):
+        if compression and compression not in cls.compressions:
+            raise ValueError(
+                f"Compression '{compression}' is not supported for "
+                f"'{cls.format_name}', use one of {sorted(cls.compressions)}"
+            )
+
+    @abc.abstractmethod
+    def write_batch(self, rows):
+        pass
+
+    @abc.abstractmethod
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TextRecordExporter(RecordExporter):
+    compressions = set(TEXT_COMPRESSIONS)
+
+    def __init__(self, path, header, compression=None):
+        super().__init__(path, header, compression)
+        if self.compression:
+            open_, _ = TEXT_COMPRESSIONS[self.compression]
+            self.file = open_(self.path, "wt", encoding="utf-8", newline="")
+        else:
+            self.file = open(self.path, "w", encoding="utf-8", newline="")
+
+    def close(self):
+        self.file.close()
+
+
+class CsvExporter(TextRecordExporter):
+    format_name = "csv"
+
+    def __init__(self, path, header, compression=None):
+        super().__init__(path, header, compression)
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(header)
+
+    def write_batch(self, rows):
+        self.writer.writerows(
+            [
+                [v.isoformat() if isinstance(v, datetime) else v for v in row]
+                for row in rows
+            ]
+        )
+
+
+class JsonlExporter(TextRecordExporter):
+    format_name = "jsonl"
+
+    def write_batch(self, rows):
+        # One write per batch, compressing file objects are slow on small writes
+        buffer = io.StringIO()
+        for row in rows:
+            json.dump(
+                dict(zip(self.header, row)),
+                buffer,
+                ensure_ascii=False,
+                default=datetime.isoformat,
+            )
+            buffer.write("\n")
+        self.file.write(buffer.getvalue())
+
+
+class ParquetExporter(RecordExporter):
+    format_name = "parquet"
+    compressions = PARQUET_COMPRESSIONS
+
+    @classmethod
+    def check_available(cls):
+        if importlib.util.find_spec("pyarrow") is None:
+            raise ValueError(
+                "Parquet export requires the 'pyarrow' package, "
+                "install the 'parquet' extra"
+            )
+
+    def __init__(self, path, header, compression=None):
+        self.check_available()
+        super().__init__(path, header, compression)
+        import pyarrow
+        from pyarrow import parquet
+
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema(
+            [
+                ("id", pyarrow.int64()),
+                ("text", pyarrow.string()),
+                ("kind", pyarrow.string()),
+                ("created_at", pyarrow.timestamp("us")),
+                ("reporter", pyarrow.string()),
+                ("device", pyarrow.string()),
+            ]
+        )
+        if self.schema.names != list(header):
+            raise ValueError(f"Parquet schema does not match columns {header}")
+
+        # Every batch becomes a row group, the footer is written on close
+        self.writer = parquet.ParquetWriter(
+            str(self.path), self.schema, compression=compression or "none"
+        )
+
+    def write_batch(self, rows):
+        columns = list(zip(*rows))
+        self.writer.write_table(
+            self.pyarrow.Table.from_arrays(
+                [
+                    self.pyarrow.array(column, type=field.type)
+                    for column, field in zip(columns, self.schema)
+                ],
+                schema=self.schema,
+            )
+        )
+
+    def close(self):
+        self.writer.close()
+
+
+EXPORTERS = {
+    exporter.format_name: exporter
+    for exporter in (CsvExporter, JsonlExporter, ParquetExporter)
+}
+
+
+def get_exporter(format_name):
+    if format_name not in EXPORTERS:
+        raise ValueError(
+            f"Unknown export format '{format_name}', use one of {sorted(EXPORTERS)}"
+        )
+    exporter = EXPORTERS[format_name]
+    exporter.check_available()
+    return exporter
+
+
+def format_from_path(path):
+    suffixes = Path(path).suffixes
+    for suffix in reversed(suffixes):
+        if suffix[1:] in EXPORTERS:
+            return suffix[1:]
+    raise ValueError(
+        f"Can't tell the export format of '{path}', use one of {sorted(EXPORTERS)}"
+    )
+
+
+def default_file_name(format_name, compression=None):
+    exporter = get_exporter(format_name)
+    exporter.check_compression(compression)
+
+    name = f"records-{datetime.now().strftime(settings.GDOC_NAME_DT_FORMAT)}"
+    name = f"{name}.{format_name}"
+    if compression and issubclass(exporter, TextRecordExporter):
+        name += TEXT_COMPRESSIONS[compression][1]
+    return name
+
+
+def export_records_to_file(
+    path, format_name=None, compression=None, batch_size=None, after_id=None
+):
+    """
+    Writes all records with ids above `after_id` (all when None) to
+    `path`, the format defaults to the one of the file extension. A partially
+    written file is removed on failure. Returns the number of exported records.
+    """
+    format_name = format_name or format_from_path(path)
+    exporter = get_exporter(format_name)
+
+    # Every format stores created_at natively
+    batches = RecordBatches(
+        after_id=after_id,
+        batch_size=batch_size,
+        formatter=RecordRowFormatter(None),
+    )
+    count = 0
+
+    try:
+        with exporter(path, EXPORT_HEADER, compression) as writer:
+            for rows in batches:
+                writer.write_batch(rows)
+                count += len(rows)
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+    logger.info(f"Exported {count} records to '{path}' ({format_name})")
+    return count
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Exports records to a file")
+    parser.add_argument("path", help="target file, e.g. records.csv.gz")
+    parser.add_argument("--format", choices=sorted(EXPORTERS))
+    parser.add_argument(
+        "--compression",
+        choices=sorted(set(TEXT_COMPRESSIONS) | PARQUET_COMPRESSIONS),
+    )
+    parser.add_argument("--batch-size", type=int)
+    args = parser.parse_args()
+
+    migrations.upgrade_schema()
+    export_records_to_file(args.path, args.format, args.compression, args.batch_size)
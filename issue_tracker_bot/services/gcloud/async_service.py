@@ -0,0 +1,75 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from issue_tracker_bot import settings
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Bounded pool shared by every blocking Google API call, so a slow sync
+    or export never occupies more than GCLOUD_MAX_WORKERS threads
+    """
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.GCLOUD_MAX_WORKERS,
+                thread_name_prefix="gcloud",
+            )
+
+    return _executor
+
+
+def shutdown_executor(wait: bool = True):
+    global _executor
+
+    with _executor_lock:
+        executor, _executor = _executor, None
+
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Awaits a blocking call on the shared pool, the event loop keeps serving
+    other chats meanwhile. The call runs outside of the caller's database
+    session scope and opens its own sessions.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_executor(), functools.partial(func, *args, **kwargs)
+    )
+
+
+class AsyncGCloudService:
+    """
+    Awaitable facade over a GCloudService, every request is executed
+    on the shared pool
+    """
+
+    def __init__(self, service):
+        self.service = service
+
+    async def run(self, func, *args, **kwargs):
+        return await run_blocking(func, *args, **kwargs)
+
+    async def load_range(self, spreadsheet_id, range_):
+        return await self.run(self.service.load_range, spreadsheet_id, range_)
+
+    async def load_many_ranges(self, spreadsheet_id, ranges):
+        return await self.run(self.service.load_many_ranges, spreadsheet_id, ranges)
+
+    async def patch_sheet_list(self, spreadsheet_id, range_, records):
+        return await self.run(
+            self.service.patch_sheet_list, spreadsheet_id, range_, records
+        )
+
+    async def create_page(self, spreadsheet_id, page_name):
+        return await self.run(self.service.create_page, spreadsheet_id, page_name)
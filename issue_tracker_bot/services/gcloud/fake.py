@@ -0,0 +1,435 @@
+"""
+In-memory stand-in for the part of the Sheets v4 and Drive v3 APIs used by
+GCloudService, for tests and offline benchmarks:
+
+    backend = FakeGoogleBackend(latency=0.05, quota_error_rate=0.01)
+    backend.add_spreadsheet(settings.CONTEXT_SHEET_ID, {"devices": rows})
+    loader = ContextLoader(**backend.service_kwargs())
+
+Every request sleeps `latency` seconds and fails with a 429 quota error
+with probability `quota_error_rate`.
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import httplib2
+from google.auth.credentials import AnonymousCredentials
+from googleapiclient.errors import HttpError
+
+A1_CELL = re.compile(r"^([A-Z]*)(\d*)$")
+SPREADSHEET_MIME_TYPE = "application/vnd.google-apps.spreadsheet"
+
+
+def http_error(status, message, uri="fake://google"):
+    content = json.dumps({"error": {"code": status, "message": message}})
+    return HttpError(httplib2.Response({"status": status}), content.encode(), uri=uri)
+
+
+def column_index(letters):
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index - 1
+
+
+def parse_cell(cell):
+    match = A1_CELL.match(cell.upper())
+    if match is None:
+        return None
+
+    letters, digits = match.groups()
+    column = column_index(letters) if letters else None
+    row = int(digits) - 1 if digits else None
+
+    return column, row
+
+
+class FakeRequest:
+    def __init__(self, backend, method, func):
+        self.backend = backend
+        self.method = method
+        self.func = func
+
+    def execute(self, http=None, num_retries=0):
+        return self.backend.execute(self.method, self.func)
+
+
+class FakeSheet:
+    def __init__(self, sheet_id, title, rows=None):
+        self.sheet_id = sheet_id
+        self.title = title
+        self.rows = [list(r) for r in rows or []]
+
+    def read(self, c0, r0, c1, r1):
+        rows = self.rows[r0 : None if r1 is None else r1 + 1]
+        values = [
+            [
+                str(v) if v is not None else ""
+                for v in r[c0 : None if c1 is None else c1 + 1]
+            ]
+            for r in rows
+        ]
+        # The API omits trailing empty cells and rows
+        values = [self.trim(r) for r in values]
+        while values and not values[-1]:
+            values.pop()
+
+        return values
+
+    def write(self, c0, r0, values):
+        for offset, row in enumerate(values):
+            target = r0 + offset
+            while len(self.rows) <= target:
+                self.rows.append([])
+
+            cells = self.rows[target]
+            while len(cells) < c0 + len(row):
+                cells.append(None)
+            cells[c0 : c0 + len(row)] = row
+
+    def clear(self, c0, r0, c1, r1):
+        for row in self.rows[r0 : None if r1 is None else r1 + 1]:
+            end = len(row) if c1 is None else min(len(row), c1 + 1)
+            for column in range(c0, end):
+                row[column] = None
+
+    def last_row(self):
+        for index in range(len(self.rows) - 1, -1, -1):
+            if any(v not in (None, "") for v in self.rows[index]):
+                return index + 1
+        return 0
+
+    @staticmethod
+    def trim(row):
+        while row and row[-1] == "":
+            row.pop()
+        return row
+
+
+class FakeSpreadsheet:
+    def __init__(self, spreadsheet_id, name, parents):
+        self.spreadsheet_id = spreadsheet_id
+        self.name = name
+        self.parents = list(parents)
+        self.sheets = {}
+        self.version = 1
+        self.modified_time = datetime.utcnow()
+        self._next_sheet_id = 0
+
+    def add_sheet(self, title, rows=None):
+        if title in self.sheets:
+            raise http_error(
+                400,
+                f'Invalid requests[0].addSheet: A sheet with the name "{title}" '
+                f"already exists. Please enter another name.",
+            )
+
+        self.sheets[title] = FakeSheet(self._next_sheet_id, title, rows)
+        self._next_sheet_id += 1
+        return self.sheets[title]
+
+    def touch(self):
+        self.version += 1
+        self.modified_time = datetime.utcnow()
+
+    def resolve(self, range_):
+        """
+        Returns the sheet and (c0, r0, c1, r1) bounds of an A1 range,
+        open ends are None
+        """
+        title, _, cells = range_.rpartition("!")
+        if not title:
+            title, cells = cells, ""
+        title = title.strip("'")
+
+        sheet = self.sheets.get(title)
+        start, _, end = cells.partition(":")
+        first = parse_cell(start) if start else (None, None)
+        last = parse_cell(end) if end else first
+
+        if sheet is None or first is None or last is None:
+            raise http_error(400, f"Unable to parse range: {range_}")
+
+        c0, r0 = first
+        c1, r1 = last
+        if not end:
+            c1, r1 = (c0, r0) if cells else (None, None)
+
+        return sheet, (c0 or 0, r0 or 0, c1, r1)
+
+
+class FakeGoogleBackend:
+    def __init__(self, latency=0.0, quota_error_rate=0.0, seed=None, sleep=time.sleep):
+        self.latency = latency
+        self.quota_error_rate = quota_error_rate
+        self.sleep = sleep
+        self.random = random.Random(seed)
+
+        self.spreadsheets = {}
+        self.requests = Counter()
+        self.quota_errors = 0
+        self._lock = threading.RLock()
+
+    def add_spreadsheet(self, spreadsheet_id, pages=None, name=None, parents=()):
+        spreadsheet = FakeSpreadsheet(spreadsheet_id, name or spreadsheet_id, parents)
+        for title, rows in (pages or {}).items():
+            spreadsheet.add_sheet(title, rows)
+
+        self.spreadsheets[spreadsheet_id] = spreadsheet
+        return spreadsheet
+
+    def get_spreadsheet(self, spreadsheet_id):
+        spreadsheet = self.spreadsheets.get(spreadsheet_id)
+        if spreadsheet is None:
+            raise http_error(404, f"Requested entity was not found: {spreadsheet_id}")
+        return spreadsheet
+
+    def read_page(self, spreadsheet_id, title):
+        """
+        Page contents as the Sheets API would return them
+        """
+        sheet = self.get_spreadsheet(spreadsheet_id).sheets[title]
+        return sheet.read(0, 0, None, None)
+
+    def execute(self, method, func):
+        if self.latency:
+            self.sleep(self.latency)
+
+        with self._lock:
+            self.requests[method] += 1
+
+            if self.quota_error_rate and self.random.random() < self.quota_error_rate:
+                self.quota_errors += 1
+                raise http_error(
+                    429, "Quota exceeded for quota metric 'Write requests'"
+                )
+
+            return func()
+
+    def request(self, method, func):
+        return FakeRequest(self, method, func)
+
+    def sheets(self):
+        return FakeSheetsService(self)
+
+    def drive(self):
+        return FakeDriveService(self)
+
+    def service_kwargs(self):
+        return {
+            "credentials": AnonymousCredentials(),
+            "drive_service": self.drive(),
+            "sheet_service": self.sheets(),
+        }
+
+
+class FakeSheetsService:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def spreadsheets(self):
+        return FakeSpreadsheetsResource(self.backend)
+
+
+class FakeSpreadsheetsResource:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def values(self):
+        return FakeValuesResource(self.backend)
+
+    def get(self, spreadsheetId):
+        def get():
+            spreadsheet = self.backend.get_spreadsheet(spreadsheetId)
+            return {
+                "spreadsheetId": spreadsheetId,
+                "sheets": [
+                    {"properties": {"title": s.title, "sheetId": s.sheet_id}}
+                    for s in spreadsheet.sheets.values()
+                ],
+            }
+
+        return self.backend.request("spreadsheets.get", get)
+
+    def batchUpdate(self, spreadsheetId, body):
+        def batch_update():
+            spreadsheet = self.backend.get_spreadsheet(spreadsheetId)
+            replies = []
+
+            for request in body["requests"]:
+                if "addSheet" in request:
+                    title = request["addSheet"]["properties"]["title"]
+                    sheet = spreadsheet.add_sheet(title)
+                    replies.append(
+                        {
+                            "addSheet": {
+                                "properties": {
+                                    "title": title,
+                                    "sheetId": sheet.sheet_id,
+                                }
+                            }
+                        }
+                    )
+                elif "deleteSheet" in request:
+                    sheet_id = request["deleteSheet"]["sheetId"]
+                    spreadsheet.sheets = {
+                        t: s
+                        for t, s in spreadsheet.sheets.items()
+                        if s.sheet_id != sheet_id
+                    }
+                    replies.append({})
+                else:
+                    raise http_error(400, f"Unsupported request: {list(request)}")
+
+            spreadsheet.touch()
+            return {"spreadsheetId": spreadsheetId, "replies": replies}
+
+        return self.backend.request("spreadsheets.batchUpdate", batch_update)
+
+
+class FakeValuesResource:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def _get(self, spreadsheet_id, range_):
+        spreadsheet = self.backend.get_spreadsheet(spreadsheet_id)
+        sheet, bounds = spreadsheet.resolve(range_)
+        result = {"range": range_, "majorDimension": "ROWS"}
+
+        values = sheet.read(*bounds)
+        if values:
+            result["values"] = values
+
+        return result
+
+    def get(self, spreadsheetId, range):
+        return self.backend.request(
+            "values.get", lambda: self._get(spreadsheetId, range)
+        )
+
+    def batchGet(self, spreadsheetId, ranges):
+        def batch_get():
+            return {
+                "spreadsheetId": spreadsheetId,
+                "valueRanges": [self._get(spreadsheetId, r) for r in ranges],
+            }
+
+        return self.backend.request("values.batchGet", batch_get)
+
+    def append(self, spreadsheetId, range, body, **kwargs):
+        def append():
+            spreadsheet = self.backend.get_spreadsheet(spreadsheetId)
+            sheet, (c0, _, _, _) = spreadsheet.resolve(range)
+            start = sheet.last_row()
+            sheet.write(c0, start, body["values"])
+            spreadsheet.touch()
+
+            return {
+                "spreadsheetId": spreadsheetId,
+                "updates": {
+                    "updatedRange": f"'{sheet.title}'!A{start + 1}",
+                    "updatedRows": len(body["values"]),
+                },
+            }
+
+        return self.backend.request("values.append", append)
+
+    def batchUpdate(self, spreadsheetId, body):
+        def batch_update():
+            spreadsheet = self.backend.get_spreadsheet(spreadsheetId)
+            # Ranges are validated before anything is written
+            targets = [
+                (spreadsheet.resolve(d["range"]), d["values"]) for d in body["data"]
+            ]
+
+            for (sheet, (c0, r0, _, _)), values in targets:
+                sheet.write(c0, r0, values)
+            spreadsheet.touch()
+
+            return {
+                "spreadsheetId": spreadsheetId,
+                "totalUpdatedRows": sum(len(values) for _, values in targets),
+            }
+
+        return self.backend.request("values.batchUpdate", batch_update)
+
+    def clear(self, spreadsheetId, range, body=None):
+        def clear():
+            spreadsheet = self.backend.get_spreadsheet(spreadsheetId)
+            sheet, bounds = spreadsheet.resolve(range)
+            sheet.clear(*bounds)
+            spreadsheet.touch()
+            return {"spreadsheetId": spreadsheetId, "clearedRange": range}
+
+        return self.backend.request("values.clear", clear)
+
+
+class FakeDriveService:
+    PAGE_SIZE = 100
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def files(self):
+        return FakeFilesResource(self.backend, self.PAGE_SIZE)
+
+
+class FakeFilesResource:
+    PARENT_QUERY = re.compile(r"""^["'](.+)["'] in parents$""")
+
+    def __init__(self, backend, page_size):
+        self.backend = backend
+        self.page_size = page_size
+
+    @staticmethod
+    def metadata(spreadsheet):
+        return {
+            "id": spreadsheet.spreadsheet_id,
+            "name": spreadsheet.name,
+            "mimeType": SPREADSHEET_MIME_TYPE,
+            "modifiedTime": spreadsheet.modified_time.isoformat() + "Z",
+            "version": str(spreadsheet.version),
+        }
+
+    def list(self, q=None, pageToken=None, spaces=None, **kwargs):
+        def list_():
+            spreadsheets = list(self.backend.spreadsheets.values())
+
+            if q:
+                match = self.PARENT_QUERY.match(q)
+                if match is None:
+                    raise http_error(400, f"Invalid Value: {q}")
+                spreadsheets = [s for s in spreadsheets if match.group(1) in s.parents]
+
+            start = int(pageToken or 0)
+            page = spreadsheets[start : start + self.page_size]
+            result = {"files": [self.metadata(s) for s in page]}
+
+            if start + self.page_size < len(spreadsheets):
+                result["nextPageToken"] = str(start + self.page_size)
+
+            return result
+
+        return self.backend.request("files.list", list_)
+
+    def get(self, fileId, fields=None):
+        def get():
+            metadata = self.metadata(self.backend.get_spreadsheet(fileId))
+            if fields:
+                metadata = {f: metadata[f] for f in fields.split(",")}
+            return metadata
+
+        return self.backend.request("files.get", get)
+
+    def delete(self, fileId):
+        def delete():
+            self.backend.get_spreadsheet(fileId)
+            del self.backend.spreadsheets[fileId]
+            return ""
+
+        return self.backend.request("files.delete", delete)
@@ -0,0 +1,74 @@
+import logging
+import random
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+from issue_tracker_bot import settings
+
+logger = logging.getLogger(__name__)
+
+# Sheets answers 429 once the per-minute request quota is used up
+QUOTA_STATUSES = {429}
+
+
+def is_quota_error(exc):
+    return isinstance(exc, HttpError) and exc.resp.status in QUOTA_STATUSES
+
+
+class QuotaRetry:
+    """
+    Retries calls failing with quota errors, sleeping a random time up to an
+    exponentially growing limit (full jitter) between attempts
+    """
+
+    def __init__(
+        self,
+        max_retries: int = None,
+        base: float = None,
+        maximum: float = None,
+        sleep=time.sleep,
+    ):
+        self.max_retries = (
+            settings.SHEETS_MAX_RETRIES if max_retries is None else max_retries
+        )
+        self.base = settings.SHEETS_BACKOFF_BASE if base is None else base
+        self.maximum = settings.SHEETS_BACKOFF_MAX if maximum is None else maximum
+        self.sleep = sleep
+
+        self.retries = 0
+        self.exhausted = 0
+        self._lock = threading.Lock()
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.maximum, self.base * 2**attempt))
+
+    def call(self, func):
+        attempt = 0
+
+        while True:
+            try:
+                return func()
+            except HttpError as exc:
+                if not is_quota_error(exc):
+                    raise
+                if attempt >= self.max_retries:
+                    with self._lock:
+                        self.exhausted += 1
+                    raise
+
+            delay = self.delay(attempt)
+            with self._lock:
+                self.retries += 1
+
+            logger.warning(
+                f"Quota exceeded, retry {attempt + 1}/{self.max_retries} "
+                f"in {delay:.2f}s"
+            )
+            self.sleep(delay)
+            attempt += 1
+
+    def stats(self):
+        with self._lock:
+            return {"retries": self.retries, "exhausted": self.exhausted}
@@ -1,11 +1,16 @@
 import logging
+import threading
 
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
 from issue_tracker_bot import settings
 from issue_tracker_bot.services.context import AppContext
 from issue_tracker_bot.services.gcloud.auth import get_credentials
+from issue_tracker_bot.services.gcloud.retry import QuotaRetry
+from issue_tracker_bot.services.gcloud.write_batcher import SheetsWriteBatcher
 from issue_tracker_bot.services.message_processing import RecordBuilder
 
 TRACKING_SHEET_ID = settings.TRACKING_SHEET_ID
@@ -15,32 +20,105 @@ FOLDER_ID = settings.FOLDER_ID
 
 app_context = AppContext()
 
+_clients = {}
+_clients_lock = threading.Lock()
+
 
 class SheetNotFound(RuntimeError):
     ...
 
 
+def get_client(name, version):
+    """
+    Discovery clients shared by all services, built on first use from the
+    discovery documents bundled with googleapiclient (no discovery request)
+    """
+    with _clients_lock:
+        client = _clients.get((name, version))
+
+        if client is None:
+            client = build(
+                name,
+                version,
+                credentials=get_credentials(),
+                cache_discovery=False,
+                static_discovery=True,
+            )
+            _clients[(name, version)] = client
+
+    return client
+
+
 class GCloudService:
     _instance = None
 
-    drive_service = None
-    sheet_service = None
     spreadsheet_id = None
+    write_batcher = None
+
+    # httplib2 connections are not thread safe, every thread executing
+    # requests (see AsyncGCloudService) gets its own authorized connection
+    _local = threading.local()
+
+    # Shared by all services, requests of every service count to one quota
+    quota_retry = QuotaRetry()
 
-    @classmethod
     def __new__(cls, *args, **kwargs):
         if not cls._instance:
-            cls._instance = super().__new__(*args, **kwargs)
+            cls._instance = super().__new__(cls)
         return cls._instance
 
-    def __init__(self):
-        self.credentials = get_credentials()
-        self.drive_service = build(
-            "drive", "v3", credentials=self.credentials, cache_discovery=False
-        )
-        self.sheet_service = build(
-            "sheets", "v4", credentials=self.credentials, cache_discovery=False
+    def __init__(self, credentials=None, drive_service=None, sheet_service=None):
+        """
+        Nothing is loaded here, credentials and the shared clients are only
+        built on first use unless given, e.g. the in-memory clients of
+        gcloud.fake.FakeGoogleBackend
+        """
+        self._credentials = credentials
+        self._drive_service = drive_service
+        self._sheet_service = sheet_service
+        # Pages known to a batcher belong to the previous clients
+        self.write_batcher = None
+
+    @property
+    def credentials(self):
+        if self._credentials is None:
+            self._credentials = get_credentials()
+        return self._credentials
+
+    @property
+    def drive_service(self):
+        if self._drive_service is None:
+            self._drive_service = get_client("drive", "v3")
+        return self._drive_service
+
+    @property
+    def sheet_service(self):
+        if self._sheet_service is None:
+            self._sheet_service = get_client("sheets", "v4")
+        return self._sheet_service
+
+    def _http(self):
+        http = getattr(self._local, "http", None)
+
+        if http is None:
+            http = AuthorizedHttp(self.credentials, http=httplib2.Http())
+            self._local.http = http
+
+        return http
+
+    def _execute(self, request):
+        return self.quota_retry.call(lambda: request.execute(http=self._http()))
+
+    def get_file_version(self, file_id):
+        """
+        Drive metadata changing with every edit of the file
+        """
+        response = self._execute(
+            self.drive_service.files().get(
+                fileId=file_id, fields="modifiedTime,version"
+            )
         )
+        return response.get("modifiedTime"), response.get("version")
 
     def list_sheet_files(self):
         if not self.credentials:
@@ -51,14 +129,12 @@ class GCloudService:
         page_token = None
 
         while True:
-            response = (
-                self.drive_service.files()
-                .list(
+            response = self._execute(
+                self.drive_service.files().list(
                     q=f'"{FOLDER_ID}" in parents',
                     pageToken=page_token,
                     spaces="drive",
                 )
-                .execute()
             )
             logging.info(f"Files found: {response.get('files', [])}")
 
@@ -93,10 +169,8 @@ class GCloudService:
         sheets = self.sheet_service.spreadsheets()
 
         try:
-            result = (
-                sheets.values()
-                .get(spreadsheetId=spreadsheet_id, range=range_)
-                .execute()
+            result = self._execute(
+                sheets.values().get(spreadsheetId=spreadsheet_id, range=range_)
             )
         except HttpError as exc:
             if "Unable to parse range" in str(exc):
@@ -109,13 +183,10 @@ class GCloudService:
         sheets = self.sheet_service.spreadsheets()
 
         try:
-            result = (
-                sheets.values()
-                .batchGet(spreadsheetId=spreadsheet_id, ranges=ranges)
-                .execute()
+            result = self._execute(
+                sheets.values().batchGet(spreadsheetId=spreadsheet_id, ranges=ranges)
             )
         except HttpError as exc:
-            breakpoint()
             if "Unable to parse range" in str(exc):
                 return None
             raise exc
@@ -136,9 +207,8 @@ class GCloudService:
         sheets = self.sheet_service.spreadsheets()
 
         try:
-            (
-                sheets.values()
-                .append(
+            self._execute(
+                sheets.values().append(
                     spreadsheetId=spreadsheet_id,
                     range=range_,
                     body={
@@ -148,21 +218,20 @@ class GCloudService:
                     valueInputOption="USER_ENTERED",
                     insertDataOption="INSERT_ROWS",
                 )
-                .execute()
             )
         except HttpError as exc:
             raise RuntimeError(f"Request to sheets.values was not successful: {exc}")
 
     def delete_spreadsheet_file(self, spreadsheet_id):
-        return self.drive_service.files().delete(fileId=spreadsheet_id).execute()
+        return self._execute(self.drive_service.files().delete(fileId=spreadsheet_id))
 
     def reset_page(self, spreadsheet_id, sheet_name):
         sheets = self.sheet_service.spreadsheets()
         range_all = f"{sheet_name}!A1:Z"
-        return (
-            sheets.values()
-            .clear(spreadsheetId=spreadsheet_id, range=range_all, body={})
-            .execute()
+        return self._execute(
+            sheets.values().clear(
+                spreadsheetId=spreadsheet_id, range=range_all, body={}
+            )
         )
 
     def delete_page(self, spreadsheet_id, sheet_id):
@@ -171,15 +240,18 @@ class GCloudService:
         requests_body = {"requests": [{"deleteSheet": {"sheetId": sheet_id}}]}
 
         try:
-            sheets.batchUpdate(
-                spreadsheetId=spreadsheet_id, body=requests_body
-            ).execute()
+            self._execute(
+                sheets.batchUpdate(spreadsheetId=spreadsheet_id, body=requests_body)
+            )
         except HttpError as exc:
             raise RuntimeError(
                 f"Request to sheets.batchUpdate was not successful: {exc}"
             )
 
     def create_page(self, spreadsheet_id, page_name):
+        self.create_pages(spreadsheet_id, [page_name])
+
+    def create_pages(self, spreadsheet_id, page_names):
         sheets = self.sheet_service.spreadsheets()
 
         requests_body = {
@@ -191,23 +263,22 @@ class GCloudService:
                         }
                     }
                 }
+                for page_name in page_names
             ]
         }
 
         try:
-            sheets.batchUpdate(
-                spreadsheetId=spreadsheet_id, body=requests_body
-            ).execute()
+            self._execute(
+                sheets.batchUpdate(spreadsheetId=spreadsheet_id, body=requests_body)
+            )
         except HttpError as exc:
             raise RuntimeError(
                 f"Request to sheets.batchUpdate was not successful: {exc}"
             )
 
     def list_all_sheets(self, spreadsheet_id):
-        sheet_metadata = (
-            self.sheet_service.spreadsheets()
-            .get(spreadsheetId=spreadsheet_id)
-            .execute()
+        sheet_metadata = self._execute(
+            self.sheet_service.spreadsheets().get(spreadsheetId=spreadsheet_id)
         )
         sheets = sheet_metadata.get("sheets", "")
         return [
@@ -222,60 +293,124 @@ class GCloudService:
 class ReportTracker(GCloudService):
     spreadsheet_id = TRACKING_SHEET_ID
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Titles of the tracker pages, listed once on the first direct write
+        self.known_pages = None
+
+    def get_write_batcher(self):
+        if self.write_batcher is None:
+            # Same columns as the direct append_record path
+            self.write_batcher = SheetsWriteBatcher(self, columns="A:E")
+        return self.write_batcher
+
     def commit_record(self, device, action, author, message) -> str:
         builder = RecordBuilder()
         builder.build(device, action, author, message)
 
-        current_range_state = self.load_range(self.spreadsheet_id, builder.page)
-
-        if not current_range_state:
-            self.create_page(self.spreadsheet_id, builder.page)
-            current_range_state = self.load_range(self.spreadsheet_id, builder.page)
-
-        try:
-            last_record_num = len(current_range_state["values"]) + 1
-        except KeyError:
-            last_record_num = 1
-
-        target_range = f"'{builder.page}'!A{last_record_num}:E{last_record_num}"
+        if settings.SHEETS_WRITE_WINDOW > 0:
+            self.get_write_batcher().append(
+                self.spreadsheet_id, builder.page, [builder.record]
+            )
+            answer = (
+                f"Record was queued with message '{message}' "
+                f"on page '{builder.page}'"
+            )
+            logging.info(answer)
+            return answer
 
         try:
-            self.patch_sheet(self.spreadsheet_id, target_range, builder.record)
+            self.append_record(builder.page, builder.record)
         except Exception as exc:
+            # The page may have been removed meanwhile, list pages again next time
+            self.known_pages = None
             logging.exception("")
             return f"Error: {exc}"
 
-        self.manage_problem_in_cache(builder.action, builder.device, builder.record)
         answer = f"Record was created with message '{message}' on page '{builder.page}'"
         logging.info(answer)
         return answer
 
+    def ensure_page(self, page_name):
+        if self.known_pages is None:
+            self.known_pages = {
+                sheet["title"] for sheet in self.list_all_sheets(self.spreadsheet_id)
+            }
+
+        if page_name not in self.known_pages:
+            self.create_page(self.spreadsheet_id, page_name)
+            self.known_pages.add(page_name)
+
+    def append_record(self, page_name, record):
+        """
+        Sheets appends after the last row of the page itself, so a write is a
+        single request once the page is known to exist
+        """
+        self.ensure_page(page_name)
+        self.patch_sheet(self.spreadsheet_id, f"'{page_name}'!A:E", record)
+
 
 class ContextLoader(GCloudService):
     spreadsheet_id = CONTEXT_SHEET_ID
 
+    PROBLEMS_RANGE = "problems!A1:B1000"
+    SOLUTIONS_RANGE = "solutions!A1:B1000"
+    DEVICES_RANGE = "devices!A1:D1000"
+
+    @staticmethod
+    def parse_devices(values):
+        return [(d[0], f"{d[1]}{d[2]}", f"{int(d[3]):02d}") for d in values]
+
+    def load_version(self):
+        return self.get_file_version(CONTEXT_SHEET_ID)
+
+    def load_context(self):
+        """
+        Fetches problems, solutions and devices in a single batchGet,
+        header rows removed
+        """
+        ranges = [self.PROBLEMS_RANGE, self.SOLUTIONS_RANGE, self.DEVICES_RANGE]
+        result = self.load_many_ranges(CONTEXT_SHEET_ID, ranges)
+        if result is None:
+            raise SheetNotFound(f"Unable to load context ranges: {ranges}")
+
+        problems, solutions, devices = [
+            vr.get("values", [])[1:] for vr in result["valueRanges"]
+        ]
+
+        return {
+            "problems": problems,
+            "solutions": solutions,
+            "devices": self.parse_devices(devices),
+        }
+
     def load_problems_kinds(self):
-        values = self.load_range(CONTEXT_SHEET_ID, "problems!A1:B1000")["values"]
+        values = self.load_range(CONTEXT_SHEET_ID, self.PROBLEMS_RANGE)["values"]
         values.pop(0)  # remove header
         return values
 
     def load_solutions_kinds(self):
-        values = self.load_range(CONTEXT_SHEET_ID, "solutions!A1:B1000")["values"]
+        values = self.load_range(CONTEXT_SHEET_ID, self.SOLUTIONS_RANGE)["values"]
         values.pop(0)  # remove header
         return values
 
     def load_devices(self):
-        values = self.load_range(CONTEXT_SHEET_ID, "devices!A1:D1000")["values"]
+        values = self.load_range(CONTEXT_SHEET_ID, self.DEVICES_RANGE)["values"]
         values.pop(0)  # remove header
 
-        devices = [(d[0], f"{d[1]}{d[2]}", f"{int(d[3]):02d}") for d in values]
-
-        return devices
+        return self.parse_devices(values)
 
 
 class Snapshotter(GCloudService):
     spreadsheet_id = SNAPSHOTS_SHEET_ID
 
+    def get_write_batcher(self):
+        if self.write_batcher is None:
+            self.write_batcher = SheetsWriteBatcher(
+                self, max_rows=settings.EXPORT_BATCH_SIZE
+            )
+        return self.write_batcher
+
     def reset_or_create_sheet_by_name(self, sheet_name):
         try:
             self.reset_page(self.spreadsheet_id, sheet_name)
@@ -288,6 +423,37 @@ class Snapshotter(GCloudService):
         self.reset_or_create_sheet_by_name(sheet_name)
         self.patch_sheet_list(self.spreadsheet_id, f"{sheet_name}!A1:Z", data)
 
+    def export_records_in_batches(self, sheet_name: str, header: list, batches):
+        """
+        Appends every batch of rows after the header, `batches` may be
+        a generator so the whole export never has to be held in memory
+        """
+        self.reset_or_create_sheet_by_name(sheet_name)
+
+        self.get_write_batcher().append(self.spreadsheet_id, sheet_name, [header])
+
+        return self.append_records_in_batches(sheet_name, batches)
+
+    def append_records_in_batches(self, sheet_name: str, batches):
+        """
+        Appends every batch of rows after the rows already on the page
+        """
+        batcher = self.get_write_batcher()
+
+        count = 0
+        try:
+            for batch in batches:
+                batcher.append(self.spreadsheet_id, sheet_name, batch)
+                count += len(batch)
+
+            batcher.flush(self.spreadsheet_id)
+        except Exception:
+            # The next export resets the page, rows of this one must not leak
+            batcher.discard(self.spreadsheet_id, sheet_name)
+            raise
+
+        return count
+
 
 if __name__ == "__main__":
     from pprint import pprint
@@ -0,0 +1,182 @@
+import logging
+import threading
+import weakref
+from collections import defaultdict
+
+from issue_tracker_bot import settings
+
+logger = logging.getLogger(__name__)
+
+# Every batcher created in the process, flushed by `close_all` on shutdown
+_batchers = weakref.WeakSet()
+
+
+class SheetsWriteBatcher:
+    """
+    Collects rows appended to spreadsheet pages and writes the pending rows
+    of every page with a single values().append. A flush happens `window`
+    seconds after the first pending row, or as soon as `max_rows` rows are
+    pending for a spreadsheet.
+
+    Sheets inserts appended rows after the last row of the page itself, so
+    several processes can write the same pages. Missing pages are created on
+    the first flush, page titles are listed once and cached.
+    """
+
+    def __init__(self, service, window=None, max_rows=None, columns="A:Z"):
+        self.service = service
+        self.window = settings.SHEETS_WRITE_WINDOW if window is None else window
+        self.max_rows = max_rows or settings.SHEETS_WRITE_MAX_ROWS
+        # Range the existing rows of a page are looked up in
+        self.columns = columns
+
+        # spreadsheet_id -> page -> rows, pages keep the order of first append
+        self._pending = defaultdict(dict)
+        self._known_pages = {}
+        self._timer = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+        self.flushes = 0
+        self.rows_written = 0
+        self.failures = 0
+
+        _batchers.add(self)
+
+    def append(self, spreadsheet_id, page, rows):
+        with self._lock:
+            self._pending[spreadsheet_id].setdefault(page, []).extend(rows)
+            pending = sum(len(r) for r in self._pending[spreadsheet_id].values())
+
+            flush_now = pending >= self.max_rows or self.window <= 0
+            if not flush_now and self._timer is None:
+                self._timer = threading.Timer(self.window, self._flush_on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if flush_now:
+            self.flush(spreadsheet_id)
+
+    def discard(self, spreadsheet_id, page):
+        """
+        Drops the pending rows of a page
+        """
+        with self._lock:
+            self._pending.get(spreadsheet_id, {}).pop(page, None)
+            if not self._pending.get(spreadsheet_id):
+                self._pending.pop(spreadsheet_id, None)
+
+    def flush(self, spreadsheet_id=None):
+        with self._flush_lock:
+            with self._lock:
+                if spreadsheet_id is None:
+                    spreadsheet_ids = list(self._pending)
+                else:
+                    spreadsheet_ids = [spreadsheet_id]
+
+                batches = {
+                    sid: self._pending.pop(sid)
+                    for sid in spreadsheet_ids
+                    if sid in self._pending
+                }
+
+                if not self._pending and self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+
+            for sid, pages in batches.items():
+                try:
+                    self._write(sid, pages)
+                except Exception:
+                    self._requeue(sid, pages)
+                    raise
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": sum(
+                    len(rows)
+                    for pages in self._pending.values()
+                    for rows in pages.values()
+                ),
+                "flushes": self.flushes,
+                "rows_written": self.rows_written,
+                "failures": self.failures,
+                **self.service.quota_retry.stats(),
+            }
+
+    def _flush_on_timer(self):
+        with self._lock:
+            self._timer = None
+
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Scheduled sheets write failed, rows kept pending")
+
+    def _write(self, spreadsheet_id, pages):
+        """
+        Appends the rows of every page, pages written before a failure are
+        removed from `pages` so only the rest is requeued
+        """
+        self._ensure_pages(spreadsheet_id, list(pages))
+
+        for page in list(pages):
+            rows = pages[page]
+            self.service.patch_sheet_list(
+                spreadsheet_id, f"'{page}'!{self.columns}", rows
+            )
+            del pages[page]
+
+            with self._lock:
+                self.rows_written += len(rows)
+
+        with self._lock:
+            self.flushes += 1
+
+    def _requeue(self, spreadsheet_id, pages):
+        with self._lock:
+            self.failures += 1
+            pending = self._pending[spreadsheet_id]
+
+            for page, rows in pages.items():
+                pending[page] = rows + pending.get(page, [])
+
+            # The pages may have been removed meanwhile, list them again
+            self._known_pages.pop(spreadsheet_id, None)
+
+    def _ensure_pages(self, spreadsheet_id, pages):
+        known = self._known_pages.get(spreadsheet_id)
+        if known is None:
+            known = {
+                sheet["title"] for sheet in self.service.list_all_sheets(spreadsheet_id)
+            }
+
+        missing = [p for p in pages if p not in known]
+        if missing:
+            self.service.create_pages(spreadsheet_id, missing)
+
+        with self._lock:
+            self._known_pages[spreadsheet_id] = known | set(missing)
+
+
+def close_all():
+    """
+    Writes the pending rows of every batcher, rows of a batcher failing to
+    write are logged as lost
+    """
+    for batcher in list(_batchers):
+        try:
+            batcher.close()
+        except Exception:
+            logger.exception(
+                f"{batcher.stats()['pending']} pending sheets rows lost on close"
+            )
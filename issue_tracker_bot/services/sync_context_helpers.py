@@ -1,59 +1,118 @@
+import hashlib
+import json
+import logging
+from collections import namedtuple
+
 from issue_tracker_bot.repository import commons
-from issue_tracker_bot.repository import database
+from issue_tracker_bot.repository import migrations
 from issue_tracker_bot.repository import operations as rops
 from issue_tracker_bot.services import ContextLoader
+from issue_tracker_bot.services.telegram.app_context_helpers import load_device_catalog
+from issue_tracker_bot.services.telegram.app_context_helpers import (
+    load_predefined_messages_catalog,
+)
 
 gcloud = ContextLoader()
 
+logger = logging.getLogger(__name__)
 
-def sync_devices_with_gdoc():
-    gdoc_devices = {gd[0]: gd for gd in gcloud.load_devices()}
-    existing_devices = {ed.id: ed for ed in rops.get_devices()}
-    existing_ids = set(existing_devices.keys())
-    gdoc_ids = set()
+SyncMarker = namedtuple("SyncMarker", ["version", "digest"])
 
-    to_update = []
-    to_create = []
+# What the database was last synced from, in this process
+last_sync = SyncMarker(None, None)
 
-    for did, g_device in gdoc_devices.items():
-        if did in existing_devices:
-            to_update.append({"id": did, "group": g_device[1], "name": g_device[2]})
-        else:
-            to_create.append({"id": did, "group": g_device[1], "name": g_device[2]})
-        gdoc_ids.add(did)
 
-    to_delete = list(existing_ids - gdoc_ids)
+def context_digest(context):
+    payload = json.dumps(context, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
 
-    rops.update_devices_in_batch(to_update)
-    rops.create_devices_in_batch(to_create)
-    rops.delete_devices_in_batch(to_delete)
 
+def sync_context_with_gdoc(force=False) -> bool:
+    """
+    Syncs devices and predefined messages from the context sheet, returns
+    False when the sync was skipped because the sheet did not change since
+    the last sync. The Drive version is checked first, the sheet contents
+    are only compared when the version moved.
+    """
+    global last_sync
 
-def sync_predefined_messages_with_gdoc():
-    rops.delete_predefined_messages_in_batch(
-        [em.id for em in rops.get_predefined_messages()]
-    )
+    version = gcloud.load_version()
+    if not force and version == last_sync.version:
+        logger.info(f"Context sheet version {version} already synced")
+        return False
+
+    context = gcloud.load_context()
+    digest = context_digest(context)
+
+    if not force and digest == last_sync.digest:
+        logger.info(f"Context sheet version {version} has no content changes")
+        last_sync = SyncMarker(version, digest)
+        return False
+
+    sync_devices_with_gdoc(context["devices"])
+    sync_predefined_messages_with_gdoc(context["problems"], context["solutions"])
+
+    last_sync = SyncMarker(version, digest)
+    return True
+
+
+def sync_devices_with_gdoc(devices=None, dry_run=False):
+    if devices is None:
+        devices = gcloud.load_devices()
+
+    gdoc_devices = {
+        gd[0]: {"id": gd[0], "group": gd[1], "name": gd[2]} for gd in devices
+    }
+
+    result = rops.sync_devices(list(gdoc_devices.values()), dry_run=dry_run)
+    logger.info(f"Devices synced (dry run: {dry_run}): {result}")
 
-    def get_objects_for_processing(kind, getter):
+    if not dry_run:
+        load_device_catalog()
+
+    return result
+
+
+def sync_predefined_messages_with_gdoc(problems=None, solutions=None):
+    if problems is None:
+        problems = gcloud.load_problems_kinds()
+    if solutions is None:
+        solutions = gcloud.load_solutions_kinds()
+
+    def get_objects_for_processing(kind, values):
         _to_create = []
-        _gdoc_messages = {f"{kind.value}-{md[0]}": md for md in getter()}
+        _gdoc_messages = {f"{kind.value}-{md[0]}": md for md in values}
 
         for mid, g_message in _gdoc_messages.items():
             _to_create.append({"id": mid, "text": g_message[1], "kind": kind.value})
 
         return _to_create
 
-    to_create_p = get_objects_for_processing(
-        commons.ReportKinds.problem, gcloud.load_problems_kinds
-    )
-    to_create_s = get_objects_for_processing(
-        commons.ReportKinds.solution, gcloud.load_solutions_kinds
+    problem_messages = get_objects_for_processing(commons.ReportKinds.problem, problems)
+    solution_messages = get_objects_for_processing(
+        commons.ReportKinds.solution, solutions
     )
 
-    rops.create_predefined_messages_in_batch(to_create_p + to_create_s)
+    result = rops.sync_predefined_messages(problem_messages + solution_messages)
+    logger.info(f"Predefined messages synced: {result}")
+
+    load_predefined_messages_catalog()
 
 
 if __name__ == "__main__":
-    database.Base.metadata.create_all(bind=database.engine)
-    sync_devices_with_gdoc()
-    sync_predefined_messages_with_gdoc()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Syncs the context sheet")
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="only report how many devices would be created, updated or deleted",
+    )
+    args = parser.parse_args()
+
+    migrations.upgrade_schema()
+
+    if args.dry_run:
+        print(sync_devices_with_gdoc(dry_run=True))
+    else:
+        sync_context_with_gdoc(force=True)
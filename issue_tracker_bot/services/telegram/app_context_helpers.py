@@ -1,6 +1,9 @@
 from collections import defaultdict
 
-from issue_tracker_bot.repository import database
+from issue_tracker_bot import settings
+from issue_tracker_bot.repository import async_operations as AOPS
+from issue_tracker_bot.repository import migrations
+from issue_tracker_bot.repository import models_pyd as mp
 from issue_tracker_bot.repository import operations as ROPS
 from issue_tracker_bot.services.context import AppContext
 
@@ -8,10 +11,67 @@ app_context = AppContext()
 
 
 def enrich_app_context():
-    database.Base.metadata.create_all(bind=database.engine)
+    migrations.upgrade_schema()
+    ROPS.ensure_device_states()
 
     app_context.set_solutions_kinds(load_solutions_list())
     app_context.set_problems_kinds(load_problems_list())
+    load_device_catalog()
+    load_predefined_messages_catalog()
+
+
+def load_device_catalog():
+    app_context.set_devices(
+        [mp.Device.model_validate(d) for d in ROPS.get_devices()],
+        ROPS.get_reported_device_ids(),
+    )
+
+
+async def get_device_catalog():
+    catalog = app_context.devices
+
+    if catalog is None or catalog.is_stale(settings.DEVICE_CATALOG_TTL):
+        app_context.set_devices(
+            [mp.Device.model_validate(d) for d in await AOPS.get_devices()],
+            await AOPS.get_reported_device_ids(),
+        )
+
+    return app_context.devices
+
+
+async def get_device(obj_id):
+    """
+    Serves the device from the catalog, a device missing there
+    (created after the last catalog load) is looked up in the database
+    """
+    catalog = await get_device_catalog()
+    device = catalog.get_device(obj_id)
+
+    if device is None:
+        device = await AOPS.get_device(obj_id=obj_id)
+
+    return device
+
+
+def to_predefined_message_models(messages):
+    return [mp.PredefinedMessage(id=m.id, text=m.text, kind=m.kind) for m in messages]
+
+
+def load_predefined_messages_catalog():
+    app_context.set_predefined_messages(
+        to_predefined_message_models(ROPS.get_predefined_messages())
+    )
+
+
+async def get_predefined_messages_catalog():
+    catalog = app_context.predefined_messages
+
+    if catalog is None or catalog.is_stale(settings.PREDEFINED_MESSAGES_TTL):
+        app_context.set_predefined_messages(
+            to_predefined_message_models(await AOPS.get_predefined_messages())
+        )
+
+    return app_context.predefined_messages
 
 
 def load_devices_list():
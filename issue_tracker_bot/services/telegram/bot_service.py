@@ -3,6 +3,7 @@ import logging
 from telegram import Update
 from telegram.ext import ContextTypes
 
+from issue_tracker_bot.services.gcloud.async_service import run_blocking
 from issue_tracker_bot.services.telegram import helpers as H
 
 logger = logging.getLogger(__name__)
@@ -69,6 +70,10 @@ async def handle_button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         )
         return
 
+    if cmd == H.MenuCommandStates.STATUS_PAGE_SELECTED.value:
+        await H.process_status_page_selected_button(msg, query=query)
+        return
+
     raise Exception(f"Unexpected command: '{cmd}'")
 
 
@@ -119,23 +124,59 @@ async def handle_sync_context_request(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
     try:
-        H.sync_context()
+        synced = await run_blocking(H.sync_context, force="force" in context.args)
     except Exception:
         logger.exception("")
         await update.message.reply_text(f"Error during handling request 'sync_context'")
     else:
-        await update.message.reply_text(f"Контекст успішно синхронізовано")
+        if synced:
+            await update.message.reply_text(f"Контекст успішно синхронізовано")
+        else:
+            await update.message.reply_text(f"Контекст не змінився")
 
 
 async def handle_export_reports_request(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
     try:
-        H.export_reports()
+        count = await run_blocking(H.export_reports, full="full" in context.args)
     except Exception:
         logger.exception("")
         await update.message.reply_text(
             f"Error during handling request 'export_reports'"
         )
     else:
-        await update.message.reply_text(f"Дані успішно експортовано")
+        await update.message.reply_text(
+            f"Дані успішно експортовано, нових записів: {count}"
+        )
+
+
+async def handle_export_file_request(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> None:
+    if not await H.is_admin(update.message.from_user):
+        await update.message.reply_text(f"Команда доступна лише адміністраторам")
+        return
+
+    # /export_file [csv|jsonl|parquet] [compression]
+    format_name = context.args[0] if context.args else "csv"
+    compression = context.args[1] if len(context.args) > 1 else None
+
+    try:
+        path = await run_blocking(H.export_records_file, format_name, compression)
+    except ValueError as exc:
+        await update.message.reply_text(str(exc))
+        return
+    except Exception:
+        logger.exception("")
+        await update.message.reply_text(f"Error during handling request 'export_file'")
+        return
+
+    try:
+        with open(path, "rb") as document:
+            await update.message.reply_document(document=document, filename=path.name)
+    except Exception:
+        logger.exception("")
+        await update.message.reply_text(f"Error during handling request 'export_file'")
+    finally:
+        H.remove_records_file(path)
@@ -1,34 +1,36 @@
 import datetime
 import logging
+import shutil
+import tempfile
 from collections import defaultdict
 from collections import namedtuple
+from pathlib import Path
 
 from telegram import InlineKeyboardButton
 from telegram import InlineKeyboardMarkup
 
 from issue_tracker_bot import settings
+from issue_tracker_bot.repository import async_operations as aops
 from issue_tracker_bot.repository import commons
-from issue_tracker_bot.repository import database
 from issue_tracker_bot.repository import models_pyd as mp
-from issue_tracker_bot.repository import operations as rops
+from issue_tracker_bot.repository.pagination import InvalidCursor
+from issue_tracker_bot.repository.queries import choice_to_str
 from issue_tracker_bot.services import Actions
 from issue_tracker_bot.services import MenuCommandStates
 from issue_tracker_bot.services.context import AppContext
+from issue_tracker_bot.services.conversation_state import create_state_store
 from issue_tracker_bot.services.data_export import export_reports_to_gdoc
-from issue_tracker_bot.services.sync_context_helpers import sync_devices_with_gdoc
-from issue_tracker_bot.services.sync_context_helpers import (
-    sync_predefined_messages_with_gdoc,
-)
+from issue_tracker_bot.services.file_export import DEFAULT_COMPRESSIONS
+from issue_tracker_bot.services.file_export import default_file_name
+from issue_tracker_bot.services.file_export import export_records_to_file
+from issue_tracker_bot.services.sync_context_helpers import sync_context_with_gdoc
 from issue_tracker_bot.services.telegram import app_context_helpers
 
-# Fresh way to enrich context
-app_context_helpers.enrich_app_context()
-
 app_context = AppContext()
 
 logger = logging.getLogger(__name__)
 
-initiated = {}
+conversations = create_state_store()
 processed = defaultdict(list)
 
 DEVICES_IN_ROW = 4
@@ -36,6 +38,9 @@ UNGROUPED_DEVICES_LIMIT = 4
 OPTIONS_IN_ROW = 2
 MESSAGE_SEPARATOR = "|"
 MAX_OPTION_BYTES_LEN = 41
+CHECK_MARK = "✅"
+STATUS_OLDER_PAGE = "⬅️ Старіші"
+STATUS_NEWER_PAGE = "Новіші ➡️"
 
 DEFAULT_HELP_MESSAGE = (
     "Команда /start починає спілкування з ботом.\n"
@@ -74,16 +79,6 @@ def get_grouped_devices(devices):
     return result
 
 
-def get_grouped_reported_devices(devices):
-    result = defaultdict(list)
-
-    for device in devices:
-        if device.records:
-            result[device.group].append(device)
-
-    return result
-
-
 def build_device_list_keyboard(devices_groups, action, group=None):
     keyboard = []
     cmd = MenuCommandStates.DEVICE_SELECTED_FOR_ACTION.value
@@ -133,18 +128,13 @@ def build_group_list_keyboard(devices_groups, action):
     return InlineKeyboardMarkup(keyboard)
 
 
-def build_predefined_options_keyboard(device_id, action, selected=None):
+async def build_predefined_options_keyboard(device_id, action, selected=None):
     selected = selected or []
     keyboard = []
     cmd = MenuCommandStates.OPTION_SELECTED_FOR_ACTION.value
 
-    # fmt: off
-    options = (
-        rops.get_predefined_problems()
-        if action == Actions.PROBLEM.value else
-        rops.get_predefined_solutions()
-    )
-    # fmt: on
+    catalog = await app_context_helpers.get_predefined_messages_catalog()
+    layout = catalog.get_layout(ACTION_TO_MESSAGE_KIND_MAP[action], OPTIONS_IN_ROW)
 
     final_options = [
         CUSTOM_ACTION_OPTION,
@@ -155,7 +145,9 @@ def build_predefined_options_keyboard(device_id, action, selected=None):
         keyboard.append(
             [
                 InlineKeyboardButton(
-                    f"✅{option.text}" if option.id in selected else option.text,
+                    f"{CHECK_MARK}{option.text}"
+                    if option.id in selected
+                    else option.text,
                     callback_data=(
                         f"{cmd}{MESSAGE_SEPARATOR}"
                         f"{option.id}{MESSAGE_SEPARATOR}"
@@ -167,14 +159,46 @@ def build_predefined_options_keyboard(device_id, action, selected=None):
             ]
         )
 
-    while options:
-        batch, options = (options[:OPTIONS_IN_ROW], options[OPTIONS_IN_ROW:])
+    for batch in layout:
         update_keyboard_with_collection(batch)
 
     update_keyboard_with_collection(final_options)
     return InlineKeyboardMarkup(keyboard)
 
 
+def toggle_option_in_keyboard(reply_markup, option_id, selected):
+    """
+    Flips the check mark on the buttons of the tapped option only,
+    every other button of the current keyboard is reused as is
+    """
+    keyboard = []
+
+    for row in reply_markup.inline_keyboard:
+        new_row = []
+
+        for button in row:
+            parts = (button.callback_data or "").split(MESSAGE_SEPARATOR)
+
+            if len(parts) < 2 or parts[1] != option_id:
+                new_row.append(button)
+                continue
+
+            text = button.text
+            if text.startswith(CHECK_MARK):
+                text = text[len(CHECK_MARK) :]
+
+            new_row.append(
+                InlineKeyboardButton(
+                    f"{CHECK_MARK}{text}" if selected else text,
+                    callback_data=button.callback_data,
+                )
+            )
+
+        keyboard.append(new_row)
+
+    return InlineKeyboardMarkup(keyboard)
+
+
 async def make_response(text, reply_markup, query=None, update=None):
     kwargs = {"text": text}
 
@@ -213,7 +237,9 @@ async def process_initial_action_selected_button(
     action = msg.strip().lower()
 
     if action == Actions.SOLUTION.value:
-        grouped_devices = get_grouped_devices(rops.get_devices_with_open_problems())
+        grouped_devices = get_grouped_devices(
+            await aops.get_devices_with_open_problems()
+        )
 
         if not grouped_devices:
             await make_response(
@@ -236,7 +262,8 @@ async def process_initial_action_selected_button(
         return
 
     if action == Actions.PROBLEM.value:
-        grouped_devices = get_grouped_devices(rops.get_devices())
+        catalog = await app_context_helpers.get_device_catalog()
+        grouped_devices = catalog.get_grouped_devices()
 
         resource_message, reply_markup = prepare_group_or_device_list(
             grouped_devices, action, group
@@ -250,7 +277,8 @@ async def process_initial_action_selected_button(
         return
 
     if action in Actions.STATUS.value:
-        grouped_devices = get_grouped_reported_devices(rops.get_devices())
+        catalog = await app_context_helpers.get_device_catalog()
+        grouped_devices = catalog.get_grouped_reported_devices()
 
         resource_message, reply_markup = prepare_group_or_device_list(
             grouped_devices, action, group
@@ -264,7 +292,7 @@ async def process_initial_action_selected_button(
         return
 
     if action == Actions.OPEN_PROBLEMS.value:
-        devices = rops.get_devices_with_open_problems()
+        devices = await aops.get_devices_with_open_problems()
 
         result = f"\nВсього відкрито проблем {len(devices)}:\n"
         result += "\n".join(
@@ -285,9 +313,43 @@ async def process_initial_action_selected_button(
     raise Exception(f"Unexpected initial action: '{msg}'")
 
 
-async def process_status_action_selected(device_id, query):
-    device = rops.get_device(device_id)
-    records = device.records
+def build_status_pages_keyboard(device_id, page):
+    cmd = MenuCommandStates.STATUS_PAGE_SELECTED.value
+    buttons = []
+
+    if page.next_cursor:
+        buttons.append(
+            InlineKeyboardButton(
+                STATUS_OLDER_PAGE,
+                callback_data=MESSAGE_SEPARATOR.join(
+                    [cmd, device_id, page.next_cursor]
+                ),
+            )
+        )
+
+    if page.prev_cursor:
+        buttons.append(
+            InlineKeyboardButton(
+                STATUS_NEWER_PAGE,
+                callback_data=MESSAGE_SEPARATOR.join(
+                    [cmd, device_id, page.prev_cursor]
+                ),
+            )
+        )
+
+    return InlineKeyboardMarkup([buttons]) if buttons else None
+
+
+async def process_status_action_selected(device_id, query, cursor=None):
+    page = await aops.get_records_page(
+        cursor=cursor, limit=settings.REPORTS_LIMIT, device_id=device_id
+    )
+    records = page.items
+
+    if records:
+        device = records[0].device
+    else:
+        device = await app_context_helpers.get_device(device_id)
 
     resp = f'Статус для пристрою "{build_device_full_name(device)}":'
 
@@ -302,7 +364,21 @@ async def process_status_action_selected(device_id, query):
             ]
         )
 
-    await query.edit_message_text(text=resp)
+    await make_response(
+        text=resp,
+        reply_markup=build_status_pages_keyboard(device_id, page),
+        query=query,
+    )
+
+
+async def process_status_page_selected_button(msg, query):
+    device_id, cursor = msg.split(MESSAGE_SEPARATOR, 1)
+
+    try:
+        await process_status_action_selected(device_id, query, cursor=cursor)
+    except InvalidCursor:
+        # Buttons sent before cursors were used carry page numbers
+        await process_status_action_selected(device_id, query)
 
 
 async def process_device_for_action_selected_button(msg, query):
@@ -314,14 +390,19 @@ async def process_device_for_action_selected_button(msg, query):
         await process_status_action_selected(device_id, query)
         return
 
-    initiated[user_id] = {
-        "action": action,
-        "device": device_id,
-        "time": datetime.datetime.now().strftime(settings.REPORT_DT_FORMAT),
-        "messages": [],
-    }
+    await conversations.set(
+        user_id,
+        {
+            "action": action,
+            "device": device_id,
+            "time": datetime.datetime.now().strftime(settings.REPORT_DT_FORMAT),
+            "messages": [],
+        },
+    )
 
-    reply_markup = build_predefined_options_keyboard(device_id, action, selected=[])
+    reply_markup = await build_predefined_options_keyboard(
+        device_id, action, selected=[]
+    )
     await query.edit_message_text(
         text=f"Оберіть повідомлення із списку", reply_markup=reply_markup
     )
@@ -343,27 +424,27 @@ async def make_text_to_record(txt, update):
     user_id = str(tg_user.id) if tg_user.id else None
     author_str = tg_user.username or tg_user.full_name
 
-    user = rops.get_or_create_user(
+    user = await aops.get_or_create_user(
         mp.UserCreate(id=user_id, name=author_str, role=commons.Roles.reporter)
     )
 
-    if not initiated.get(user_id):
+    record_cached = await conversations.pop(user_id)
+
+    if not record_cached:
         await update.get_bot().send_message(
             chat_id=update.message.chat_id, text=DEFAULT_HELP_MESSAGE
         )
         return
 
-    record_cached = initiated.pop(user_id)
-
     device_id, action, author = (
         record_cached["device"],
         record_cached["action"],
         user.name,
     )
 
-    device = rops.get_device(obj_id=device_id)
+    device = await app_context_helpers.get_device(device_id)
 
-    record = rops.create_record(
+    record = await aops.create_record(
         mp.RecordCreate(
             reporter_id=user_id,
             device_id=device.id,
@@ -371,6 +452,7 @@ async def make_text_to_record(txt, update):
             text=txt,
         )
     )
+    app_context.devices.mark_reported(device.id)
 
     await bot.delete_message(chat_id, message_id)
     await bot.send_message(
@@ -387,18 +469,20 @@ async def make_button_to_record(message_id, query, update):
     user_id = str(tg_user.id) if tg_user.id else None
     author_str = tg_user.username or tg_user.full_name
 
-    user = rops.get_or_create_user(
+    user = await aops.get_or_create_user(
         mp.UserCreate(id=user_id, name=author_str, role=commons.Roles.reporter)
     )
 
+    record = await conversations.get(user_id)
+
     # Check if not initiated then quit
-    if user_id not in initiated or not initiated[user_id]["messages"]:
+    if not record or not record["messages"]:
         await query.edit_message_text(text=DEFAULT_HELP_MESSAGE)
         return
 
     # Writing record
 
-    record = initiated.pop(user_id)
+    await conversations.pop(user_id)
 
     device_id, action, messages = (
         record["device"],
@@ -406,15 +490,16 @@ async def make_button_to_record(message_id, query, update):
         record["messages"],
     )
 
-    device = rops.get_device(obj_id=device_id)
+    device = await app_context_helpers.get_device(device_id)
 
-    db_messages = {m.id: m for m in rops.get_predefined_messages() if m.id in messages}
-    messages = {mid: db_messages[mid] for mid in messages}
+    catalog = await app_context_helpers.get_predefined_messages_catalog()
+    messages = {mid: catalog.get_message(mid) for mid in messages}
+    messages = {mid: m for mid, m in messages.items() if m is not None}
 
     kind = ACTION_TO_MESSAGE_KIND_MAP[action]
     text = " +\n".join(m.text for m in messages.values())
 
-    rops.create_record(
+    await aops.create_record(
         mp.RecordCreate(
             reporter_id=user_id,
             device_id=device.id,
@@ -422,6 +507,7 @@ async def make_button_to_record(message_id, query, update):
             text=text,
         )
     )
+    app_context.devices.mark_reported(device.id)
 
     # Responding to user
     result_text = (
@@ -438,22 +524,30 @@ async def handle_multiselect_for_action(query, update, message_id, device_id, ac
     tg_user = query.from_user
     user_id = str(tg_user.id) if tg_user.id else None
 
+    def toggle_message(state):
+        # Adding messages to user's messages
+        if message_id not in state["messages"]:
+            state["messages"].append(message_id)
+        else:
+            state["messages"].remove(message_id)
+
+    record = await conversations.update(user_id, toggle_message)
+
     # Check if not initiated then quit
-    if user_id not in initiated:
+    if not record:
         await query.edit_message_text(text=DEFAULT_HELP_MESSAGE)
         return
 
-    # Adding messages to user's messages
-    record = initiated[user_id]
+    current_markup = query.message.reply_markup if query.message else None
 
-    if message_id not in record["messages"]:
-        record["messages"].append(message_id)
+    if current_markup:
+        reply_markup = toggle_option_in_keyboard(
+            current_markup, message_id, message_id in record["messages"]
+        )
     else:
-        record["messages"].remove(message_id)
-
-    reply_markup = build_predefined_options_keyboard(
-        device_id, action, selected=record["messages"]
-    )
+        reply_markup = await build_predefined_options_keyboard(
+            device_id, action, selected=record["messages"]
+        )
     await query.edit_message_text(
         text=f"Оберіть повідомлення із списку", reply_markup=reply_markup
     )
@@ -463,7 +557,7 @@ async def process_option_for_action_selected_button(msg, query, update):
     option, action, device_id = msg.split(MESSAGE_SEPARATOR)
     action = action.strip().lower()
 
-    device = rops.get_device(obj_id=device_id)
+    device = await app_context_helpers.get_device(device_id)
 
     if option == str(DONE_ACTION_OPTION.id):
         await make_button_to_record(option, query, update)
@@ -477,12 +571,36 @@ async def process_option_for_action_selected_button(msg, query, update):
     await handle_multiselect_for_action(query, update, option, device_id, action)
 
 
-def sync_context():
-    database.Base.metadata.create_all(bind=database.engine)
-    sync_devices_with_gdoc()
-    sync_predefined_messages_with_gdoc()
+def sync_context(force=False):
+    return sync_context_with_gdoc(force=force)
+
+
+def export_reports(full=False):
+    return export_reports_to_gdoc(full=full)
+
+
+async def is_admin(tg_user):
+    user = await aops.get_user(obj_id=str(tg_user.id))
+    return user is not None and choice_to_str(user.role) == commons.Roles.admin.value
+
+
+def export_records_file(format_name="csv", compression=None):
+    """
+    Exports all records to a file in a new temporary directory, remove it
+    with `remove_records_file` once sent
+    """
+    compression = compression or DEFAULT_COMPRESSIONS.get(format_name)
+    # Raises ValueError on unknown formats and compressions
+    name = default_file_name(format_name, compression)
+
+    path = Path(tempfile.mkdtemp()) / name
+    try:
+        export_records_to_file(path, format_name, compression)
+    except Exception:
+        remove_records_file(path)
+        raise
+    return path
 
 
-def export_reports():
-    database.Base.metadata.create_all(bind=database.engine)
-    export_reports_to_gdoc()
+def remove_records_file(path):
+    shutil.rmtree(path.parent, ignore_errors=True)
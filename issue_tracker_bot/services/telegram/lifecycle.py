@@ -0,0 +1,119 @@
+import asyncio
+import logging
+
+from telegram import Update
+from telegram.ext import Application
+
+from issue_tracker_bot import settings
+from issue_tracker_bot.repository import async_database
+from issue_tracker_bot.repository import database
+from issue_tracker_bot.repository import replica
+
+logger = logging.getLogger(__name__)
+
+
+class ApplicationNotRunning(RuntimeError):
+    ...
+
+
+async def process_update_in_session_scope(application: Application, update: Update):
+    """
+    Every repository call made while handling one update shares one session,
+    its commits make the user's next reads go to the primary
+    """
+    user = update.effective_user
+
+    with replica.writer_scope(user.id if user else None):
+        async with async_database.session_scope():
+            with database.session_scope():
+                await application.process_update(update)
+
+
+class PerRequestLifecycle:
+    """
+    Initializes and shuts the application down around every single update.
+    Every update pays for a full bot bootstrap and a fresh HTTP client pool.
+    """
+
+    def __init__(self, application: Application):
+        self.application = application
+
+    async def start(self):
+        ...
+
+    async def stop(self):
+        ...
+
+    async def process_update(self, update: Update):
+        async with self.application:
+            await process_update_in_session_scope(self.application, update)
+
+
+class WarmLifecycle:
+    """
+    Keeps one initialized application (and its HTTP connection pool) for the
+    whole process lifetime. On stop it refuses new updates and waits for the
+    in-flight ones to finish before shutting the application down.
+    """
+
+    def __init__(self, application: Application, drain_timeout: float = None):
+        self.application = application
+        if drain_timeout is None:
+            drain_timeout = settings.TG_SHUTDOWN_DRAIN_TIMEOUT
+
+        self.drain_timeout = drain_timeout
+        self.in_flight = 0
+        self._accepting = False
+        self._idle = None
+
+    async def start(self):
+        self._idle = asyncio.Event()
+        self._idle.set()
+        await self.application.initialize()
+        self._accepting = True
+
+    async def stop(self):
+        self._accepting = False
+
+        if self._idle is not None and self.in_flight:
+            logger.info(f"Draining {self.in_flight} in-flight updates")
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout=self.drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(
+                    f"{self.in_flight} updates still in flight "
+                    f"after {self.drain_timeout}s, shutting down anyway"
+                )
+
+        await self.application.shutdown()
+
+    async def process_update(self, update: Update):
+        if not self._accepting:
+            raise ApplicationNotRunning("Application is not accepting updates")
+
+        self.in_flight += 1
+        self._idle.clear()
+
+        try:
+            await process_update_in_session_scope(self.application, update)
+        finally:
+            self.in_flight -= 1
+            if not self.in_flight:
+                self._idle.set()
+
+
+LIFECYCLES = {
+    "per_request": PerRequestLifecycle,
+    "lifespan": WarmLifecycle,
+}
+
+
+def create_lifecycle(application: Application, mode: str = None):
+    mode = mode or settings.TG_APP_LIFECYCLE
+
+    try:
+        lifecycle_cls = LIFECYCLES[mode]
+    except KeyError:
+        raise RuntimeError(f"Unexpected application lifecycle: '{mode}'")
+
+    return lifecycle_cls(application)
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import time
+from collections import namedtuple
+
+from telegram import Update
+
+from issue_tracker_bot import settings
+
+logger = logging.getLogger(__name__)
+
+QueuedUpdate = namedtuple("QueuedUpdate", ["update", "enqueued_at"])
+
+
+class UpdateQueueFull(RuntimeError):
+    ...
+
+
+class UpdateQueueClosed(RuntimeError):
+    ...
+
+
+def get_update_chat_key(update: Update):
+    if update.effective_chat:
+        return update.effective_chat.id
+    if update.effective_user:
+        return update.effective_user.id
+    return update.update_id
+
+
+class UpdateQueue:
+    """
+    Bounded in-memory queue that lets the webhook acknowledge updates at once.
+
+    Updates are sharded by chat over a fixed pool of workers, each with its
+    own queue, so updates of one chat are always processed in arrival order
+    while different chats are processed concurrently.
+
+    At most `maxsize` updates wait in all the queues together, and at most
+    `maxsize // workers` in one queue, so chats sharing a busy worker can't
+    take the room of the others.
+    """
+
+    def __init__(self, lifecycle, workers: int = None, maxsize: int = None):
+        self.lifecycle = lifecycle
+        self.workers = workers or settings.UPDATE_QUEUE_WORKERS
+        self.maxsize = maxsize or settings.UPDATE_QUEUE_MAXSIZE
+        self.shard_maxsize = max(1, self.maxsize // self.workers)
+
+        self._queues = []
+        self._tasks = []
+        self._accepting = False
+
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_last = 0.0
+
+    async def start(self):
+        self._queues = [
+            asyncio.Queue(maxsize=self.shard_maxsize) for _ in range(self.workers)
+        ]
+        self._tasks = [asyncio.ensure_future(self._work(q)) for q in self._queues]
+        self._accepting = True
+
+    async def stop(self, timeout: float = None):
+        self._accepting = False
+        timeout = settings.TG_SHUTDOWN_DRAIN_TIMEOUT if timeout is None else timeout
+
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(q.join() for q in self._queues)), timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"{self.depth} queued updates dropped after {timeout}s of draining"
+            )
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def put(self, update: Update):
+        if not self._accepting:
+            raise UpdateQueueClosed("Update queue is not accepting updates")
+
+        if self.depth >= self.maxsize:
+            self.rejected += 1
+            raise UpdateQueueFull(f"Update queue is full ({self.maxsize})")
+
+        queue = self._queues[hash(get_update_chat_key(update)) % self.workers]
+
+        try:
+            queue.put_nowait(QueuedUpdate(update, time.monotonic()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise UpdateQueueFull(f"Update queue shard is full ({self.shard_maxsize})")
+
+    @property
+    def depth(self):
+        return sum(q.qsize() for q in self._queues)
+
+    def stats(self):
+        return {
+            "depth": self.depth,
+            "capacity": self.maxsize,
+            "shard_capacity": self.shard_maxsize,
+            "workers": self.workers,
+            "shards_depth": [q.qsize() for q in self._queues],
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "wait_avg": self.wait_total / self.processed if self.processed else 0.0,
+            "wait_max": self.wait_max,
+            "wait_last": self.wait_last,
+        }
+
+    async def _work(self, queue: asyncio.Queue):
+        while True:
+            item = await queue.get()
+
+            wait = time.monotonic() - item.enqueued_at
+            self.wait_last = wait
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+            try:
+                await self.lifecycle.process_update(item.update)
+            except Exception:
+                self.failed += 1
+                logger.exception(f"Failed to process update {item.update.update_id}")
+            finally:
+                self.processed += 1
+                queue.task_done()
@@ -0,0 +1,185 @@
+"""
+Imports the history kept in the DEV_<device> pages of the tracking
+spreadsheet into the records table.
+
+    python -m issue_tracker_bot.services.tracker_import --dry-run
+
+Pages are read a few at a time with one batchGet, their rows are inserted
+in chunks by operations.create_records_in_batch. Rows already in the
+database (same device, reporter, second and text) are skipped, so the
+import can be run again.
+"""
+import logging
+from collections import namedtuple
+from datetime import datetime
+
+from issue_tracker_bot import settings
+from issue_tracker_bot.repository import commons
+from issue_tracker_bot.repository import migrations
+from issue_tracker_bot.repository import models_pyd as mp
+from issue_tracker_bot.repository import operations as rops
+from issue_tracker_bot.services import Actions
+from issue_tracker_bot.services.gcloud.service import ReportTracker
+
+logger = logging.getLogger(__name__)
+
+ImportResult = namedtuple(
+    "ImportResult", ["pages", "imported", "duplicates", "skipped"]
+)
+
+DEVICE_PAGE_PREFIX = "DEV_"
+PAGES_PER_REQUEST = 20
+# Authors the bot never saw get a user with an id derived from their name
+IMPORTED_USER_PREFIX = "sheet:"
+
+# Tracker rows hold the action chosen in the bot, older ones the kind
+ACTION_TO_KIND = {
+    Actions.PROBLEM.value: commons.ReportKinds.problem.value,
+    Actions.SOLUTION.value: commons.ReportKinds.solution.value,
+    **{kind.value: kind.value for kind in commons.ReportKinds},
+}
+
+
+def parse_row(row):
+    """
+    Returns (created_at, author, kind, text) of a tracker row, laid out as
+    RecordBuilder.record, None for blank or malformed rows
+    """
+    # Sheets leaves trailing empty cells out
+    _, date, author, action, text = (list(row) + [""] * 5)[:5]
+
+    try:
+        created_at = datetime.strptime(date.strip(), settings.REPORT_DT_FORMAT)
+    except ValueError:
+        return None
+
+    kind = ACTION_TO_KIND.get(action.strip().lower())
+    if kind is None or not author.strip():
+        return None
+
+    return created_at, author.strip(), kind, text.strip()
+
+
+def load_user_ids():
+    user_ids = {}
+    cursor = None
+
+    while True:
+        page = rops.get_users_page(cursor=cursor)
+        user_ids.update((user.name, user.id) for user in page.items)
+        cursor = page.next_cursor
+        if cursor is None:
+            return user_ids
+
+
+def get_user_id(author, user_ids, dry_run):
+    if author not in user_ids:
+        user_id = f"{IMPORTED_USER_PREFIX}{author}"
+        if not dry_run:
+            rops.get_or_create_user(
+                mp.UserCreate(id=user_id, name=author, role=commons.Roles.reporter)
+            )
+        user_ids[author] = user_id
+
+    return user_ids[author]
+
+
+def load_device_pages(tracker):
+    titles = [
+        sheet["title"] for sheet in tracker.list_all_sheets(tracker.spreadsheet_id)
+    ]
+    return [title for title in titles if title.startswith(DEVICE_PAGE_PREFIX)]
+
+
+def import_tracker_sheets(
+    tracker=None,
+    dry_run: bool = False,
+    chunk_size: int = None,
+    pages_per_request: int = PAGES_PER_REQUEST,
+) -> ImportResult:
+    tracker = tracker or ReportTracker()
+    chunk_size = chunk_size or rops.SYNC_CHUNK_SIZE
+
+    device_ids = {device.id for device in rops.get_devices()}
+    user_ids = load_user_ids()
+    pages = load_device_pages(tracker)
+
+    pending = []
+    imported = duplicates = skipped = 0
+
+    def flush():
+        nonlocal imported
+        if pending and not dry_run:
+            rops.create_records_in_batch(pending)
+        imported += len(pending)
+        pending.clear()
+
+    for start in range(0, len(pages), pages_per_request):
+        names = pages[start : start + pages_per_request]
+        result = tracker.load_many_ranges(
+            tracker.spreadsheet_id, [f"'{name}'!A:E" for name in names]
+        )
+
+        for name, value_range in zip(names, result["valueRanges"]):
+            rows = value_range.get("values", [])
+            device_id = name[len(DEVICE_PAGE_PREFIX) :]
+
+            if device_id not in device_ids:
+                logger.warning(f"Skipped {len(rows)} rows of unknown device '{name}'")
+                skipped += len(rows)
+                continue
+
+            # Sheet dates have no fractions of a second
+            contents = rops.get_record_contents_for_device(device_id)
+            existing = {
+                (created_at.replace(microsecond=0), reporter_id, text)
+                for created_at, reporter_id, text in contents
+            }
+
+            for row in rows:
+                parsed = parse_row(row)
+                if parsed is None:
+                    skipped += 1
+                    continue
+
+                created_at, author, kind, text = parsed
+                reporter_id = get_user_id(author, user_ids, dry_run)
+
+                if (created_at, reporter_id, text) in existing:
+                    duplicates += 1
+                    continue
+                existing.add((created_at, reporter_id, text))
+
+                pending.append(
+                    mp.RecordCreate(
+                        reporter_id=reporter_id,
+                        device_id=device_id,
+                        text=text,
+                        kind=kind,
+                        created_at=created_at,
+                    )
+                )
+                if len(pending) >= chunk_size:
+                    flush()
+
+    flush()
+
+    result = ImportResult(len(pages), imported, duplicates, skipped)
+    logger.info(f"Tracker import{' (dry run)' if dry_run else ''}: {result}")
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Imports DEV_<device> tracker pages into records"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="only report what would be imported"
+    )
+    parser.add_argument("--chunk-size", type=int)
+    args = parser.parse_args()
+
+    migrations.upgrade_schema()
+    print(import_tracker_sheets(dry_run=args.dry_run, chunk_size=args.chunk_size))
@@ -12,9 +12,37 @@ TELEGRAM_TOKEN = os.environ["TELEGRAM_TOKEN"]
 WEBHOOK_URL = os.environ["WEBHOOK_URL"]
 DATABASE_URL = os.environ["DATABASE_URL" if ENV != "test" else "DATABASE_TEST_URL"]
 
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+# Connections held longer than this many seconds are reported as leak suspects
+DB_LEAK_THRESHOLD = int(os.environ.get("DB_LEAK_THRESHOLD", 60))
+
+# Optional read replica the get_* operations read from
+DATABASE_REPLICA_URL = os.environ.get(
+    "DATABASE_REPLICA_URL" if ENV != "test" else "DATABASE_TEST_REPLICA_URL"
+)
+# Reads of a user who committed less than this many seconds ago go to the primary
+DB_REPLICA_STICKY_SECONDS = float(os.environ.get("DB_REPLICA_STICKY_SECONDS", 5))
+# After a failed replica read the primary serves reads for this many seconds
+DB_REPLICA_RETRY_SECONDS = float(os.environ.get("DB_REPLICA_RETRY_SECONDS", 30))
+
 TG_READ_TIMEOUT = 30
 TG_WRITE_TIMEOUT = 30
 
+# "lifespan" keeps one initialized application for the process lifetime,
+# "per_request" initializes and shuts it down around every update
+TG_APP_LIFECYCLE = os.environ.get("TG_APP_LIFECYCLE", "lifespan")
+TG_SHUTDOWN_DRAIN_TIMEOUT = float(os.environ.get("TG_SHUTDOWN_DRAIN_TIMEOUT", 25))
+
+# "inline" processes an update before answering the webhook,
+# "queue" acknowledges it at once and processes it in a worker pool
+WEBHOOK_INGESTION = os.environ.get("WEBHOOK_INGESTION", "inline")
+UPDATE_QUEUE_WORKERS = int(os.environ.get("UPDATE_QUEUE_WORKERS", 8))
+UPDATE_QUEUE_MAXSIZE = int(os.environ.get("UPDATE_QUEUE_MAXSIZE", 1000))
+UPDATE_QUEUE_RETRY_AFTER = int(os.environ.get("UPDATE_QUEUE_RETRY_AFTER", 5))
+
 BASE_URL = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}"
 
 os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
@@ -40,8 +68,34 @@ TRACKING_SHEET_ID = os.environ["TRACKING_SHEET_ID"]
 CONTEXT_SHEET_ID = os.environ["CONTEXT_SHEET_ID"]
 SNAPSHOTS_SHEET_ID = os.environ["SNAPSHOTS_SHEET_ID"]
 
+# Threads executing blocking Sheets/Drive requests for the async handlers
+GCLOUD_MAX_WORKERS = int(os.environ.get("GCLOUD_MAX_WORKERS", 4))
+
+# Appended rows are coalesced for this many seconds into one append per page
+# and spreadsheet, or less when SHEETS_WRITE_MAX_ROWS are pending, 0 disables it
+SHEETS_WRITE_WINDOW = float(os.environ.get("SHEETS_WRITE_WINDOW", 2))
+SHEETS_WRITE_MAX_ROWS = int(os.environ.get("SHEETS_WRITE_MAX_ROWS", 500))
+# Quota (429) errors are retried with jittered exponential backoff
+SHEETS_MAX_RETRIES = int(os.environ.get("SHEETS_MAX_RETRIES", 5))
+SHEETS_BACKOFF_BASE = float(os.environ.get("SHEETS_BACKOFF_BASE", 1))
+SHEETS_BACKOFF_MAX = float(os.environ.get("SHEETS_BACKOFF_MAX", 32))
+
 REPORTS_LIMIT = 10
 
+# Records read from the database and appended to the snapshot sheet at once
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))
+
+# Seconds before the in-memory device catalog is reloaded from the database,
+# bounds how long other workers serve devices changed by a sync
+DEVICE_CATALOG_TTL = int(os.environ.get("DEVICE_CATALOG_TTL", 300))
+PREDEFINED_MESSAGES_TTL = int(os.environ.get("PREDEFINED_MESSAGES_TTL", 300))
+
+# "memory" keeps multi-step report flows in the worker process,
+# "sql" keeps them in the database so any worker can continue a flow
+CONVERSATION_STATE_BACKEND = os.environ.get("CONVERSATION_STATE_BACKEND", "memory")
+CONVERSATION_STATE_TTL = int(os.environ.get("CONVERSATION_STATE_TTL", 3600))
+CONVERSATION_STATE_MAXSIZE = int(os.environ.get("CONVERSATION_STATE_MAXSIZE", 10000))
+
 
 def configure_logging():
     logging.basicConfig(
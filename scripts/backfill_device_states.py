@@ -0,0 +1,7 @@
+from issue_tracker_bot.repository import migrations
+from issue_tracker_bot.repository import operations as rops
+
+
+if __name__ == "__main__":
+    migrations.upgrade_schema()
+    rops.rebuild_device_states()
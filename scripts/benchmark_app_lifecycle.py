@@ -0,0 +1,154 @@
+"""
+Compares per-update latency of the "per_request" and "lifespan" application
+lifecycles against a fake Telegram Bot API with simulated network latency.
+
+    python -m scripts.benchmark_app_lifecycle --updates 200 --rtt 0.02 --handshake 0.15
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Optional
+from typing import Tuple
+
+from telegram import Update
+from telegram.ext import Application
+from telegram.ext import CommandHandler
+from telegram.request import BaseRequest
+from telegram.request import RequestData
+
+from issue_tracker_bot.services.telegram.lifecycle import create_lifecycle
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+CHAT = {"id": 100, "type": "private"}
+
+
+class FakeTelegramRequest(BaseRequest):
+    """
+    Answers every Bot API call locally. The first call after `initialize`
+    pays an extra handshake delay, like a fresh HTTP connection pool would.
+    """
+
+    def __init__(self, rtt: float, handshake: float):
+        self.rtt = rtt
+        self.handshake = handshake
+        self._connected = False
+        self.calls = 0
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def initialize(self) -> None:
+        self._connected = False
+
+    async def shutdown(self) -> None:
+        self._connected = False
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: RequestData = None,
+        read_timeout=None,
+        write_timeout=None,
+        connect_timeout=None,
+        pool_timeout=None,
+    ) -> Tuple[int, bytes]:
+        delay = self.rtt
+        if not self._connected:
+            delay += self.handshake
+            self._connected = True
+
+        await asyncio.sleep(delay)
+        self.calls += 1
+
+        endpoint = url.rsplit("/", 1)[-1]
+        if endpoint == "getMe":
+            result = BOT_USER
+        else:
+            result = {"message_id": self.calls, "date": 0, "chat": CHAT, "text": "ok"}
+
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+async def handle_help(update, context):
+    await update.message.reply_text("help")
+
+
+def build_application(rtt, handshake):
+    application = (
+        Application.builder()
+        .token("0:bench")
+        .request(FakeTelegramRequest(rtt, handshake))
+        .get_updates_request(FakeTelegramRequest(rtt, handshake))
+        .build()
+    )
+    application.add_handler(CommandHandler("help", handle_help))
+    return application
+
+
+def build_update(application, update_id):
+    data = {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": CHAT,
+            "from": {"id": 100, "is_bot": False, "first_name": "user"},
+            "text": "/help",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 5}],
+        },
+    }
+    return Update.de_json(data, application.bot)
+
+
+async def measure(mode, updates, rtt, handshake):
+    application = build_application(rtt, handshake)
+    lifecycle = create_lifecycle(application, mode)
+    timings = []
+
+    await lifecycle.start()
+    try:
+        for i in range(updates):
+            update = build_update(application, i)
+            started = time.perf_counter()
+            await lifecycle.process_update(update)
+            timings.append(time.perf_counter() - started)
+    finally:
+        await lifecycle.stop()
+
+    return timings
+
+
+def report(mode, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(
+        f"{mode:>12}: "
+        f"mean {statistics.mean(timings) * 1000:8.2f} ms, "
+        f"p50 {statistics.median(timings) * 1000:8.2f} ms, "
+        f"p95 {p95 * 1000:8.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--updates", type=int, default=100)
+    parser.add_argument("--rtt", type=float, default=0.02)
+    parser.add_argument("--handshake", type=float, default=0.15)
+    args = parser.parse_args()
+
+    print(
+        f"{args.updates} updates, rtt {args.rtt * 1000:.0f} ms, "
+        f"handshake {args.handshake * 1000:.0f} ms"
+    )
+
+    for mode in ("per_request", "lifespan"):
+        timings = asyncio.run(measure(mode, args.updates, args.rtt, args.handshake))
+        report(mode, timings)
+
+
+if __name__ == "__main__":
+    main()
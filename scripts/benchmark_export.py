@@ -0,0 +1,129 @@
+"""
+Seeds a scratch database with synthetic records and times converting all of
+them to export rows.
+
+    python -m scripts.benchmark_export sqlite:////tmp/bench.db --records 100000
+
+The database is dropped and recreated, never point it at real data. Paths:
+
+- record_export_model: ORM records validated one at a time into RecordExport
+- orm_records: ORM records with their reporter and device joined, converted
+  one at a time (the export before plain rows)
+- plain_rows: data_export.RecordBatches, plain rows with reporter and device
+  columns formatted once per distinct user or device
+"""
+import argparse
+import statistics
+import time
+
+from sqlalchemy import create_engine
+
+from issue_tracker_bot import settings
+from issue_tracker_bot.repository import database
+from issue_tracker_bot.repository import models_pyd as mp
+from issue_tracker_bot.repository import operations as rops
+from issue_tracker_bot.repository.queries import choice_to_str
+from issue_tracker_bot.services.data_export import EXPORT_HEADER
+from issue_tracker_bot.services.data_export import RecordBatches
+from scripts.benchmark_queries import seed
+
+
+def orm_record_pages(batch_size):
+    cursor = None
+
+    while True:
+        page = rops.get_records_page(
+            cursor=cursor, limit=batch_size, newest_first=False
+        )
+        yield page.items
+
+        cursor = page.next_cursor
+        if cursor is None:
+            return
+
+
+def record_to_row(record):
+    reporter = record.reporter
+    device = record.device
+
+    return [
+        record.id,
+        record.text,
+        choice_to_str(record.kind),
+        record.created_at.strftime(settings.REPORT_DT_FORMAT),
+        str(reporter.name or reporter.id) if reporter else None,
+        f"{device.id} :: {device.group}-{device.name}" if device else None,
+    ]
+
+
+def record_export_model(batch_size):
+    # RecordExport lazy loads the records of nested users and devices
+    with database.session_scope():
+        for records in orm_record_pages(batch_size):
+            dumps = [mp.RecordExport.model_validate(r).model_dump() for r in records]
+            yield [[dump[column] for column in EXPORT_HEADER] for dump in dumps]
+
+
+def orm_records(batch_size):
+    for records in orm_record_pages(batch_size):
+        yield [record_to_row(r) for r in records]
+
+
+def plain_rows(batch_size):
+    return RecordBatches(batch_size=batch_size)
+
+
+BENCHMARKS = {
+    "record_export_model": record_export_model,
+    "orm_records": orm_records,
+    "plain_rows": plain_rows,
+}
+
+
+def measure(batches_factory, batch_size, repeat):
+    timings = []
+    rows = 0
+
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = sum(len(batch) for batch in batches_factory(batch_size))
+        timings.append(time.perf_counter() - started)
+
+    return rows, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("database_url")
+    parser.add_argument("--records", type=int, default=100000)
+    parser.add_argument("--devices", type=int, default=500)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=settings.EXPORT_BATCH_SIZE)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-seed", action="store_true")
+    parser.add_argument("--only", nargs="*", choices=list(BENCHMARKS))
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    # Repository operations run against the benchmark database
+    database.SessionLocal.configure(bind=engine)
+
+    if not args.skip_seed:
+        started = time.perf_counter()
+        seed(engine, args.records, args.devices, args.users)
+        print(
+            f"Seeded {args.records} records for {args.devices} devices "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+
+    for name in args.only or list(BENCHMARKS):
+        rows, timings = measure(BENCHMARKS[name], args.batch_size, args.repeat)
+        median = statistics.median(timings)
+        print(
+            f"{name:>20}: {rows:7d} rows, median {median:7.2f} s, "
+            f"min {min(timings):7.2f} s, {rows / median:9.0f} rows/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
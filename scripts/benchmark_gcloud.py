@@ -0,0 +1,129 @@
+"""
+Times context loads, snapshot exports and tracker writes against the
+in-memory Sheets/Drive fake, no Google account needed.
+
+    python -m scripts.benchmark_gcloud --latency 0.08 --quota-error-rate 0.02 \
+        --records 100000
+
+Latency is added to every request, quota errors are retried the same way
+they are against the real APIs.
+"""
+import argparse
+import logging
+import time
+
+from issue_tracker_bot import settings
+from issue_tracker_bot.services.gcloud.fake import FakeGoogleBackend
+from issue_tracker_bot.services.gcloud.retry import QuotaRetry
+from issue_tracker_bot.services.gcloud.service import ContextLoader
+from issue_tracker_bot.services.gcloud.service import GCloudService
+from issue_tracker_bot.services.gcloud.service import ReportTracker
+from issue_tracker_bot.services.gcloud.service import Snapshotter
+
+
+def context_pages(devices):
+    return {
+        "problems": [["id", "text"]] + [[str(i), f"problem {i}"] for i in range(50)],
+        "solutions": [["id", "text"]] + [[str(i), f"solution {i}"] for i in range(50)],
+        "devices": [["id", "group", "subgroup", "name"]]
+        + [[f"d{i}", f"g{i % 20}", "x", str(i % 99)] for i in range(devices)],
+    }
+
+
+def bench_context_separate(backend, args):
+    loader = ContextLoader(**backend.service_kwargs())
+    loader.load_problems_kinds()
+    loader.load_solutions_kinds()
+    loader.load_devices()
+
+
+def bench_context_batch(backend, args):
+    ContextLoader(**backend.service_kwargs()).load_context()
+
+
+def bench_export(backend, args):
+    snapshotter = Snapshotter(**backend.service_kwargs())
+    batch_size = settings.EXPORT_BATCH_SIZE
+    batches = (
+        [
+            [i, "synthetic", "problem", "01-01-2024 00:00:00", "user", "d1 :: g-1"]
+            for i in range(start, min(start + batch_size, args.records))
+        ]
+        for start in range(0, args.records, batch_size)
+    )
+    snapshotter.export_records_in_batches(
+        "benchmark", ["id", "text", "kind", "created_at", "reporter", "device"], batches
+    )
+
+
+def bench_tracker(backend, args):
+    tracker = ReportTracker(**backend.service_kwargs())
+    for i in range(args.reports):
+        tracker.commit_record(f"{i % args.report_devices}", "problem", "user", "text")
+    tracker.get_write_batcher().close()
+
+
+def bench_tracker_direct(backend, args):
+    tracker = ReportTracker(**backend.service_kwargs())
+    window = settings.SHEETS_WRITE_WINDOW
+    settings.SHEETS_WRITE_WINDOW = 0
+    try:
+        for i in range(args.reports):
+            tracker.commit_record(
+                f"{i % args.report_devices}", "problem", "user", "text"
+            )
+    finally:
+        settings.SHEETS_WRITE_WINDOW = window
+
+
+BENCHMARKS = {
+    "context_separate_gets": bench_context_separate,
+    "context_batch_get": bench_context_batch,
+    "export_snapshot": bench_export,
+    "tracker_commit_batched": bench_tracker,
+    "tracker_commit_direct": bench_tracker_direct,
+}
+
+
+def create_backend(args):
+    backend = FakeGoogleBackend(
+        latency=args.latency, quota_error_rate=args.quota_error_rate, seed=0
+    )
+    backend.add_spreadsheet(settings.CONTEXT_SHEET_ID, context_pages(args.devices))
+    backend.add_spreadsheet(settings.SNAPSHOTS_SHEET_ID)
+    backend.add_spreadsheet(settings.TRACKING_SHEET_ID)
+    return backend
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--quota-error-rate", type=float, default=0.0)
+    parser.add_argument("--backoff-base", type=float, default=0.05)
+    parser.add_argument("--devices", type=int, default=500)
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--reports", type=int, default=200)
+    parser.add_argument("--report-devices", type=int, default=20)
+    parser.add_argument("--only", nargs="*", choices=list(BENCHMARKS))
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    for name in args.only or BENCHMARKS:
+        backend = create_backend(args)
+        GCloudService.quota_retry = QuotaRetry(base=args.backoff_base)
+
+        started = time.perf_counter()
+        BENCHMARKS[name](backend, args)
+        elapsed = time.perf_counter() - started
+
+        print(
+            f"{name:>24}: {elapsed * 1000:9.1f} ms, "
+            f"{sum(backend.requests.values()):5d} requests, "
+            f"{GCloudService.quota_retry.retries:3d} retries, "
+            f"{dict(backend.requests)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Breaks the cold start of the bot down into import and warmup costs.
+
+    python -m scripts.report_startup_time --top 15
+
+Imports are measured with `python -X importtime` in a fresh interpreter
+importing the FastAPI app, warmup steps are timed in this process.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)$")
+APP_MODULE = "issue_tracker_bot.main"
+PROJECT_PACKAGE = "issue_tracker_bot"
+
+
+def measure_imports(module):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=os.environ.copy(),
+    )
+    if result.returncode:
+        raise RuntimeError(f"Importing '{module}' failed:\n{result.stderr[-2000:]}")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, name = match.groups()
+            modules.append((name, int(self_us), int(cumulative_us)))
+
+    return modules
+
+
+def report_imports(modules, top):
+    total = sum(self_us for _, self_us, _ in modules)
+    print(f"Importing {APP_MODULE}: {total / 1000:.1f} ms, {len(modules)} modules\n")
+
+    project = [m for m in modules if m[0].startswith(PROJECT_PACKAGE)]
+    print(f"Project modules (self / cumulative ms):")
+    for name, self_us, cumulative_us in sorted(project, key=lambda m: -m[2])[:top]:
+        print(f"  {name:<60} {self_us / 1000:8.1f} {cumulative_us / 1000:9.1f}")
+
+    # Third party cost is attributed to the top level package of each module
+    packages = defaultdict(int)
+    for name, self_us, _ in modules:
+        package = name.split(".")[0]
+        if package != PROJECT_PACKAGE:
+            packages[package] += self_us
+
+    print(f"\nPackages (self ms, summed over their modules):")
+    for package, self_us in sorted(packages.items(), key=lambda p: -p[1])[:top]:
+        print(f"  {package:<60} {self_us / 1000:8.1f}")
+
+
+def timed(name, func):
+    started = time.perf_counter()
+    try:
+        func()
+    except Exception as exc:
+        print(f"  {name:<60} failed: {exc}")
+        return
+    print(f"  {name:<60} {(time.perf_counter() - started) * 1000:8.1f}")
+
+
+def report_warmup():
+    from google.auth.credentials import AnonymousCredentials
+    from googleapiclient.discovery import build
+
+    from issue_tracker_bot import settings
+    from issue_tracker_bot.services.gcloud.auth import get_credentials
+    from issue_tracker_bot.services.telegram import app_context_helpers
+    from issue_tracker_bot.services.telegram import bot_app_initializer
+
+    print(f"\nWarmup steps (ms):")
+
+    def build_clients():
+        # Same discovery documents as gcloud.service.get_client, without
+        # requiring the service account file
+        credentials = AnonymousCredentials()
+        for name, version in (("drive", "v3"), ("sheets", "v4")):
+            build(
+                name,
+                version,
+                credentials=credentials,
+                cache_discovery=False,
+                static_discovery=True,
+            )
+
+    timed("build drive and sheets clients", build_clients)
+
+    if settings.CREDENTIALS_PATH.exists():
+        timed("load service account credentials", get_credentials)
+
+    timed("enrich app context (database)", app_context_helpers.enrich_app_context)
+    timed("create telegram application", bot_app_initializer.create_application)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--skip-warmup", action="store_true")
+    args = parser.parse_args()
+
+    report_imports(measure_imports(APP_MODULE), args.top)
+
+    if not args.skip_warmup:
+        report_warmup()
+
+
+if __name__ == "__main__":
+    main()
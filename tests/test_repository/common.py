@@ -1,8 +1,10 @@
+import asyncio
 import os
 from unittest import TestCase
 
 from sqlalchemy.orm import close_all_sessions
 
+from issue_tracker_bot.repository import async_database
 from issue_tracker_bot.repository import database
 
 
@@ -28,3 +30,14 @@ def cleanup_table(db, model):
         db.rollback()
     else:
         return num_rows_deleted
+
+
+def run(coro):
+    async def wrapper():
+        try:
+            return await coro
+        finally:
+            # Pooled connections are bound to the loop that created them
+            await async_database.engine.dispose()
+
+    return asyncio.run(wrapper())
@@ -0,0 +1,60 @@
+from issue_tracker_bot.repository import async_operations as AOPS
+from issue_tracker_bot.repository import models_db
+from issue_tracker_bot.repository import operations as ROPS
+from tests.test_repository.common import cleanup_table
+from tests.test_repository.common import DBTestCase
+from tests.test_repository.common import run
+from tests.test_repository.factories import DeviceFactory
+from tests.test_repository.factories import ProblemRecordFactory
+from tests.test_repository.factories import ReporterFactory
+
+
+class AsyncOperationsTest(DBTestCase):
+    def tearDown(self):
+        # Ensure tests isolation in this class
+        cleanup_table(models_db.Device)
+
+    def test_get_device_matches_sync_operations(self):
+        device = run(AOPS.create_device(DeviceFactory()))
+
+        result = run(AOPS.get_device(obj_id=device.id))
+
+        self.assertEqual(result.id, ROPS.get_device(obj_id=device.id).id)
+        self.assertEqual(result.name, device.name)
+
+    def test_get_or_create_user_returns_existing_user(self):
+        target = ReporterFactory()
+
+        created = run(AOPS.get_or_create_user(target))
+        existing = run(AOPS.get_or_create_user(target))
+
+        self.assertEqual(created.id, existing.id)
+
+    def test_get_records_for_device_loads_reporter(self):
+        user = ROPS.create_user(ReporterFactory())
+        device = ROPS.create_device(DeviceFactory())
+        ROPS.create_record(
+            ProblemRecordFactory(reporter_id=user.id, device_id=device.id)
+        )
+
+        records = run(AOPS.get_records_for_device(device.id))
+
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0].reporter.name, user.name)
+
+    def test_get_records_for_device_pages(self):
+        user = ROPS.create_user(ReporterFactory())
+        device = ROPS.create_device(DeviceFactory())
+        created = [
+            ROPS.create_record(
+                ProblemRecordFactory(reporter_id=user.id, device_id=device.id)
+            )
+            for _ in range(5)
+        ]
+
+        newest = run(AOPS.get_records_for_device(device.id, limit=2))
+        older = run(AOPS.get_records_for_device(device.id, limit=2, offset=4))
+
+        self.assertEqual([r.id for r in newest], [created[4].id, created[3].id])
+        self.assertEqual([r.id for r in older], [created[0].id])
+        self.assertEqual(older[0].device.name, device.name)
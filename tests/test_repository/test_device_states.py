@@ -0,0 +1,91 @@
+from datetime import datetime
+
+from issue_tracker_bot.repository import models_db
+from issue_tracker_bot.repository import models_pyd
+from issue_tracker_bot.repository import operations as ROPS
+from tests.test_repository.common import cleanup_table
+from tests.test_repository.common import DBTestCase
+from tests.test_repository.factories import DeviceFactory
+from tests.test_repository.factories import ProblemRecordFactory
+from tests.test_repository.factories import ReporterFactory
+from tests.test_repository.factories import SolutionRecordFactory
+
+
+class DeviceStateTest(DBTestCase):
+    def setUp(self):
+        self.user = ROPS.create_user(ReporterFactory())
+
+    def tearDown(self):
+        # Ensure tests isolation in this class
+        cleanup_table(models_db.DeviceState)
+        cleanup_table(models_db.Record)
+        cleanup_table(models_db.Device)
+
+    def create_record(self, factory, device):
+        return ROPS.create_record(
+            factory(reporter_id=self.user.id, device_id=device.id)
+        )
+
+    def test_create_record_moves_device_state(self):
+        device = ROPS.create_device(DeviceFactory())
+
+        problem = self.create_record(ProblemRecordFactory, device)
+        self.assertEqual(
+            [d.records[-1].id for d in ROPS.get_devices_with_open_problems()],
+            [problem.id],
+        )
+
+        self.create_record(SolutionRecordFactory, device)
+        self.assertEqual(ROPS.get_devices_with_open_problems(), [])
+
+    def test_rebuild_device_states_from_records(self):
+        device_with_problem = ROPS.create_device(DeviceFactory())
+        device_with_solution = ROPS.create_device(DeviceFactory())
+        self.create_record(SolutionRecordFactory, device_with_problem)
+        last_problem = self.create_record(ProblemRecordFactory, device_with_problem)
+        self.create_record(ProblemRecordFactory, device_with_solution)
+        self.create_record(SolutionRecordFactory, device_with_solution)
+
+        cleanup_table(models_db.DeviceState)
+        self.assertTrue(ROPS.get_device_states_missing())
+        self.assertEqual(ROPS.get_devices_with_open_problems(), [])
+
+        ROPS.ensure_device_states()
+
+        self.assertFalse(ROPS.get_device_states_missing())
+        result = ROPS.get_devices_with_open_problems()
+        self.assertEqual([d.id for d in result], [device_with_problem.id])
+        self.assertEqual(result[0].records[-1].id, last_problem.id)
+
+    def test_records_created_in_batch_move_device_states_once(self):
+        device = ROPS.create_device(DeviceFactory())
+        other_device = ROPS.create_device(DeviceFactory())
+        rows = [
+            (device, ProblemRecordFactory, datetime(2024, 1, 2)),
+            (device, SolutionRecordFactory, datetime(2024, 1, 1)),
+            (other_device, SolutionRecordFactory, datetime(2024, 1, 1)),
+            (other_device, ProblemRecordFactory, None),
+        ]
+
+        ids = ROPS.create_records_in_batch(
+            [
+                models_pyd.RecordCreate(
+                    **factory(reporter_id=self.user.id, device_id=d.id),
+                    created_at=created_at,
+                )
+                for d, factory, created_at in rows
+            ]
+        )
+
+        self.assertEqual(len(set(ids)), 4)
+        self.assertEqual(
+            [r.id for r in ROPS.get_records_for_device(device.id)],
+            [ids[0], ids[1]],
+        )
+        # The newest record wins, whatever its position in the batch
+        result = ROPS.get_devices_with_open_problems()
+        self.assertEqual(
+            {(d.id, d.records[-1].id) for d in result},
+            {(device.id, ids[0]), (other_device.id, ids[3])},
+        )
+        self.assertEqual(ROPS.create_records_in_batch([]), [])
@@ -1,7 +1,10 @@
 from pydantic_core._pydantic_core import ValidationError
 
+from issue_tracker_bot.repository import models_db
 from issue_tracker_bot.repository import models_pyd
+from issue_tracker_bot.repository import operations as ROPS
 from issue_tracker_bot.repository.operations import create_device
+from tests.test_repository.common import cleanup_table
 from tests.test_repository.common import DBTestCase
 from tests.test_repository.factories import DeviceFactory
 
@@ -21,3 +24,34 @@ class DeviceModelTest(DBTestCase):
         self.assertIn("name\n", str(err.exception))
         self.assertIn("group\n", str(err.exception))
         self.assertNotIn("created_at\n", str(err.exception))
+
+
+class DeviceSyncTest(DBTestCase):
+    def tearDown(self):
+        # Ensure tests isolation in this class
+        cleanup_table(models_db.Device)
+
+    def test_sync_devices_upserts_changes_only(self):
+        kept, renamed, removed = [DeviceFactory() for _ in range(3)]
+        ROPS.create_devices_in_batch([kept, renamed, removed])
+        added = DeviceFactory()
+        target = [kept, dict(renamed, name="renamed"), added]
+
+        dry_run = ROPS.sync_devices(target, dry_run=True)
+        self.assertEqual(len(ROPS.get_devices()), 3)
+
+        result = ROPS.sync_devices(target)
+
+        self.assertEqual(result, dry_run)
+        self.assertEqual(result, ROPS.SyncResult(1, 1, 1, 1))
+        self.assertEqual(
+            {(d.id, d.name) for d in ROPS.get_devices()},
+            {
+                (kept["id"], kept["name"]),
+                (renamed["id"], "renamed"),
+                (added["id"], added["name"]),
+            },
+        )
+        self.assertEqual(
+            ROPS.sync_devices(target), ROPS.SyncResult(0, 0, 0, len(target))
+        )
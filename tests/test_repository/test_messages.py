@@ -84,3 +84,42 @@ class PredefinedMessageModelTest(DBTestCase):
         result = ROPS.get_predefined_solutions()
         self.assertEqual(len(result), 1)
         self.assertEqual(result[0].kind.value, commons.ReportKinds.solution.value)
+
+    def test_sync_predefined_messages_writes_only_changes(self):
+        kept, changed, removed = [
+            PredefinedMessageFactory(kind=commons.ReportKinds.problem.value)
+            for _ in range(3)
+        ]
+        ROPS.create_predefined_messages_in_batch([kept, changed, removed])
+        added = PredefinedMessageFactory(kind=commons.ReportKinds.solution.value)
+
+        result = ROPS.sync_predefined_messages(
+            [kept, dict(changed, text="changed"), added]
+        )
+
+        self.assertEqual(result, ROPS.SyncResult(1, 1, 1, 1))
+        self.assertEqual(
+            {(m.id, m.text) for m in ROPS.get_predefined_messages()},
+            {
+                (kept["id"], kept["text"]),
+                (changed["id"], "changed"),
+                (added["id"], added["text"]),
+            },
+        )
+
+    def test_sync_predefined_messages_swaps_texts(self):
+        first, second = [
+            PredefinedMessageFactory(kind=commons.ReportKinds.problem.value)
+            for _ in range(2)
+        ]
+        ROPS.create_predefined_messages_in_batch([first, second])
+
+        result = ROPS.sync_predefined_messages(
+            [dict(first, text=second["text"]), dict(second, text=first["text"])]
+        )
+
+        self.assertEqual(result, ROPS.SyncResult(0, 2, 0, 0))
+        self.assertEqual(
+            {(m.id, m.text) for m in ROPS.get_predefined_messages()},
+            {(first["id"], second["text"]), (second["id"], first["text"])},
+        )
@@ -0,0 +1,128 @@
+from unittest import TestCase
+
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine
+from sqlalchemy import inspect
+from sqlalchemy import text
+
+from issue_tracker_bot.repository import database
+from issue_tracker_bot.repository import migrations
+
+HEAD = "0005"
+
+# Tables Base.metadata.create_all made on sqlite before migrations existed
+BASELINE_SCHEMA = [
+    """
+    CREATE TABLE users (
+        id VARCHAR NOT NULL,
+        name VARCHAR NOT NULL,
+        role VARCHAR(255) NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (name)
+    )
+    """,
+    "CREATE INDEX ix_users_id ON users (id)",
+    """
+    CREATE TABLE devices (
+        id VARCHAR NOT NULL,
+        name VARCHAR NOT NULL,
+        "group" VARCHAR NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE INDEX ix_devices_id ON devices (id)",
+    """
+    CREATE TABLE predefined_messages (
+        id VARCHAR NOT NULL,
+        text VARCHAR NOT NULL,
+        kind VARCHAR(255) NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (text)
+    )
+    """,
+    "CREATE INDEX ix_predefined_messages_id ON predefined_messages (id)",
+    """
+    CREATE TABLE records (
+        id INTEGER NOT NULL,
+        text VARCHAR,
+        kind VARCHAR(255),
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        reporter_id VARCHAR NOT NULL,
+        device_id VARCHAR NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(reporter_id) REFERENCES users (id)
+            ON DELETE CASCADE ON UPDATE CASCADE,
+        FOREIGN KEY(device_id) REFERENCES devices (id)
+            ON DELETE CASCADE ON UPDATE CASCADE
+    )
+    """,
+    "CREATE INDEX ix_records_device_id ON records (device_id)",
+    "CREATE INDEX ix_records_id ON records (id)",
+    "CREATE INDEX ix_records_created_at ON records (created_at)",
+    "CREATE INDEX ix_records_reporter_id ON records (reporter_id)",
+]
+
+
+class MigrationsTest(TestCase):
+    def setUp(self):
+        # Scratch in-memory database, the test database is created by the models
+        self.engine = create_engine("sqlite://")
+
+    def upgrade(self, connection, revision="head"):
+        command.upgrade(migrations.alembic_config(connection), revision)
+
+    def revision(self):
+        with self.engine.connect() as connection:
+            return MigrationContext.configure(connection).get_current_revision()
+
+    def schema_diff(self):
+        with self.engine.connect() as connection:
+            return compare_metadata(
+                MigrationContext.configure(connection), database.Base.metadata
+            )
+
+    def test_migrated_schema_matches_models(self):
+        with self.engine.connect() as connection:
+            self.upgrade(connection)
+
+        self.assertEqual(self.schema_diff(), [])
+
+    def test_composite_index_added_on_top_of_initial_schema(self):
+        with self.engine.connect() as connection:
+            self.upgrade(connection, "0001")
+            before = {i["name"] for i in inspect(connection).get_indexes("records")}
+            connection.commit()
+            self.upgrade(connection, "0002")
+            after = {i["name"] for i in inspect(connection).get_indexes("records")}
+
+        self.assertEqual(after - before, {"ix_records_device_id_created_at"})
+
+    def test_upgrade_schema_from_empty_database(self):
+        migrations.upgrade_schema(self.engine)
+
+        self.assertEqual(self.revision(), HEAD)
+
+    def test_upgrade_schema_of_database_created_before_migrations(self):
+        with self.engine.connect() as connection:
+            for statement in BASELINE_SCHEMA:
+                connection.execute(text(statement))
+            connection.commit()
+
+        migrations.upgrade_schema(self.engine)
+        # Migrated databases are left as they are
+        migrations.upgrade_schema(self.engine)
+
+        self.assertEqual(self.revision(), HEAD)
+        self.assertEqual(self.schema_diff(), [])
+
+    def test_upgrade_schema_of_database_created_from_current_models(self):
+        database.Base.metadata.create_all(bind=self.engine)
+
+        migrations.upgrade_schema(self.engine)
+
+        self.assertEqual(self.revision(), HEAD)
+        self.assertEqual(self.schema_diff(), [])
@@ -0,0 +1,117 @@
+from datetime import datetime
+from datetime import timedelta
+from unittest import TestCase
+
+from issue_tracker_bot.repository import async_operations as AOPS
+from issue_tracker_bot.repository import models_db
+from issue_tracker_bot.repository import operations as ROPS
+from issue_tracker_bot.repository import pagination
+from tests.test_repository.common import cleanup_table
+from tests.test_repository.common import DBTestCase
+from tests.test_repository.common import run
+from tests.test_repository.factories import DeviceFactory
+from tests.test_repository.factories import ProblemRecordFactory
+from tests.test_repository.factories import ReporterFactory
+
+
+class CursorTest(TestCase):
+    def test_cursor_round_trip(self):
+        values = (datetime(2024, 5, 17, 10, 3, 59, 123456), 42, "пристрій|1")
+
+        cursor = pagination.encode_cursor(pagination.NEXT, values)
+
+        self.assertEqual(pagination.decode_cursor(cursor), (pagination.NEXT, values))
+        self.assertNotIn("|", cursor)
+
+    def test_record_cursor_fits_callback_data(self):
+        cursor = pagination.encode_cursor(
+            pagination.PREV, (datetime(2099, 12, 31, 23, 59, 59, 999999), 10**9)
+        )
+
+        self.assertLessEqual(len(cursor), 24)
+
+    def test_invalid_cursors_rejected(self):
+        for cursor in ["", "2", "n", "x.i1", "n.q1", "n.tzz!", "n.s%%"]:
+            with self.assertRaises(pagination.InvalidCursor, msg=cursor):
+                pagination.decode_cursor(cursor)
+
+
+class CursorPaginationTest(DBTestCase):
+    def setUp(self):
+        self.user = ROPS.create_user(ReporterFactory())
+        self.device = ROPS.create_device(DeviceFactory())
+        self.other_device = ROPS.create_device(DeviceFactory())
+        self.records = [
+            ROPS.create_record(
+                ProblemRecordFactory(
+                    reporter_id=self.user.id,
+                    device_id=self.device.id if i % 4 else self.other_device.id,
+                    created_at=datetime(2024, 1, 1) + timedelta(seconds=i // 2),
+                )
+            )
+            for i in range(12)
+        ]
+
+    def tearDown(self):
+        # Ensure tests isolation in this class
+        cleanup_table(models_db.DeviceState)
+        cleanup_table(models_db.Record)
+        cleanup_table(models_db.Device)
+        cleanup_table(models_db.User)
+
+    def walk(self, get_page, cursor=None, backwards=False):
+        pages = []
+        while True:
+            page = get_page(cursor)
+            pages.append([r.id for r in page.items])
+            cursor = page.prev_cursor if backwards else page.next_cursor
+            if cursor is None:
+                return pages, page
+
+    def test_device_records_walked_both_ways(self):
+        def get_page(cursor):
+            return ROPS.get_records_page(
+                cursor=cursor, limit=3, device_id=self.device.id
+            )
+
+        pages, last = self.walk(get_page)
+        # Records sharing created_at are ordered by id
+        expected = [
+            r.id for r in reversed(self.records) if r.device_id == self.device.id
+        ]
+
+        self.assertEqual(sum(pages, []), expected)
+        self.assertEqual([len(p) for p in pages], [3, 3, 3])
+
+        back, first = self.walk(get_page, last.prev_cursor, backwards=True)
+
+        self.assertEqual(back, pages[-2::-1])
+        self.assertIsNone(first.prev_cursor)
+
+    def test_oldest_first_pages_continue_after_cursor(self):
+        first = ROPS.get_records_page(limit=5, newest_first=False)
+        second = ROPS.get_records_page(
+            cursor=first.next_cursor, limit=5, newest_first=False
+        )
+
+        self.assertEqual(
+            [r.id for r in first.items + second.items],
+            [r.id for r in self.records[:10]],
+        )
+        self.assertIsNotNone(second.prev_cursor)
+
+    def test_users_paged_by_id(self):
+        for _ in range(4):
+            ROPS.create_user(ReporterFactory())
+
+        pages, _ = self.walk(lambda cursor: ROPS.get_users_page(cursor, limit=2))
+
+        self.assertEqual(sum(pages, []), sorted(u.id for u in ROPS.get_users()))
+
+    def test_async_page_matches_sync(self):
+        page = run(AOPS.get_records_page(limit=4, device_id=self.device.id))
+        sync_page = ROPS.get_records_page(limit=4, device_id=self.device.id)
+
+        self.assertEqual([r.id for r in page.items], [r.id for r in sync_page.items])
+        self.assertEqual(page.next_cursor, sync_page.next_cursor)
+        self.assertEqual(page.items[0].device.name, self.device.name)
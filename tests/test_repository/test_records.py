@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from pydantic_core._pydantic_core import ValidationError
 from sqlalchemy.exc import IntegrityError
 
@@ -6,8 +8,10 @@ from issue_tracker_bot.repository import models_pyd
 from issue_tracker_bot.repository.operations import create_device
 from issue_tracker_bot.repository.operations import create_record
 from issue_tracker_bot.repository.operations import create_user
+from issue_tracker_bot.repository.operations import get_records_page
 from tests.test_repository.common import DBTestCase
 from tests.test_repository.factories import DeviceFactory
+from tests.test_repository.factories import ProblemRecordFactory
 from tests.test_repository.factories import ReporterFactory
 
 
@@ -53,3 +57,28 @@ class RecordModelTest(DBTestCase):
         self.assertIn("reporter_id\n", str(err.exception))
         self.assertIn("device_id\n", str(err.exception))
         self.assertNotIn("created_at\n", str(err.exception))
+
+    def test_records_walked_in_keyset_pages(self):
+        device_id = create_device(models_pyd.DeviceCreate(**DeviceFactory())).id
+        user_id = create_user(models_pyd.UserCreate(**ReporterFactory())).id
+        # Records sharing created_at are told apart by id
+        created_at = datetime(2024, 1, 1)
+        created = [
+            create_record(
+                ProblemRecordFactory(
+                    reporter_id=user_id, device_id=device_id, created_at=created_at
+                )
+            ).id
+            for _ in range(5)
+        ]
+
+        walked = []
+        cursor = None
+        while True:
+            page = get_records_page(cursor=cursor, limit=2, newest_first=False)
+            walked += [(r.id, r.device.id) for r in page.items if r.id in created]
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+
+        self.assertEqual(walked, [(record_id, device_id) for record_id in created])
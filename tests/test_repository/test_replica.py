@@ -0,0 +1,154 @@
+import os
+import tempfile
+import threading
+from unittest import mock
+from unittest import TestCase
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from issue_tracker_bot.repository import async_database
+from issue_tracker_bot.repository import async_operations as AOPS
+from issue_tracker_bot.repository import database
+from issue_tracker_bot.repository import models_db
+from issue_tracker_bot.repository import operations as ROPS
+from issue_tracker_bot.repository import replica
+from tests.test_repository.common import cleanup_table
+from tests.test_repository.common import DBTestCase
+from tests.test_repository.common import run
+from tests.test_repository.factories import DeviceFactory
+
+
+def replica_sessions(url):
+    """
+    Sync and async session factories of a replica at `url`
+    """
+    engine = create_engine(url, poolclass=NullPool)
+    async_engine = create_async_engine(
+        async_database.to_async_url(url), poolclass=NullPool
+    )
+    return (
+        engine,
+        sessionmaker(autoflush=False, bind=engine),
+        async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False),
+    )
+
+
+class ReplicaRoutingTest(DBTestCase):
+    """
+    The replica is a second, empty database, like a replica lagging behind
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.replica_url = f"sqlite:///{os.path.join(cls.tmp_dir.name, 'replica.db')}"
+
+        engine, cls.sessions, cls.async_sessions = replica_sessions(cls.replica_url)
+        database.Base.metadata.create_all(bind=engine)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.router = replica.ReplicaRouter(sticky_seconds=60, retry_seconds=60)
+        self.use_replica(self.sessions, self.async_sessions)
+
+        with replica.writer_scope("writer"):
+            self.device = ROPS.create_device(DeviceFactory())
+
+    def use_replica(self, sessions, async_sessions):
+        for patcher in [
+            mock.patch.object(replica, "router", self.router),
+            mock.patch.object(database, "ReplicaSessionLocal", sessions),
+            mock.patch.object(
+                async_database, "AsyncReplicaSessionLocal", async_sessions
+            ),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        # Ensure tests isolation in this class
+        cleanup_table(models_db.Device)
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(ROPS.get_devices(), [])
+        self.assertEqual(run(AOPS.get_devices()), [])
+
+        with database.session_scope():
+            self.assertIsNone(ROPS.get_device(self.device.id))
+
+    def test_writer_reads_own_writes(self):
+        with replica.writer_scope("writer"):
+            self.assertEqual([d.id for d in ROPS.get_devices()], [self.device.id])
+
+        async def create_and_read():
+            with replica.writer_scope("async writer"):
+                device = await AOPS.create_device(DeviceFactory())
+                return device, await AOPS.get_device(device.id)
+
+        device, read_back = run(create_and_read())
+
+        self.assertEqual(read_back.id, device.id)
+        self.assertEqual(ROPS.get_devices(), [])
+
+    def test_reads_in_scope_follow_primary_session(self):
+        with database.session_scope():
+            ROPS.create_device(DeviceFactory())
+
+            self.assertEqual(len(ROPS.get_devices()), 2)
+
+    def test_primary_reads(self):
+        with replica.primary_reads():
+            self.assertEqual([d.id for d in ROPS.get_devices()], [self.device.id])
+
+    def test_replica_down_falls_back_to_primary(self):
+        broken_url = f"sqlite:///{os.path.join(self.tmp_dir.name, 'no', 'r.db')}"
+        self.use_replica(*replica_sessions(broken_url)[1:])
+
+        with database.session_scope():
+            self.assertEqual([d.id for d in ROPS.get_devices()], [self.device.id])
+
+        self.assertEqual(self.router.fallbacks, 1)
+        self.assertTrue(self.router.is_down())
+        # Later reads skip the replica until the retry delay passes
+        self.assertEqual(len(run(AOPS.get_devices())), 1)
+        self.assertEqual(self.router.fallbacks, 1)
+
+    def test_async_replica_down_falls_back_to_primary(self):
+        broken_url = f"sqlite:///{os.path.join(self.tmp_dir.name, 'no', 'r.db')}"
+        self.use_replica(*replica_sessions(broken_url)[1:])
+
+        async def read_in_scope():
+            async with async_database.session_scope():
+                return await AOPS.get_devices()
+
+        self.assertEqual([d.id for d in run(read_in_scope())], [self.device.id])
+        self.assertEqual(self.router.fallbacks, 1)
+
+
+class ReplicaRouterTest(TestCase):
+    def test_writes_tracked_from_many_threads(self):
+        router = replica.ReplicaRouter(sticky_seconds=60, retry_seconds=60)
+        writers_per_thread = replica.MAX_TRACKED_WRITERS
+
+        def write(thread):
+            for i in range(writers_per_thread):
+                router.mark_written((thread, i))
+                router.stats()
+
+        threads = [threading.Thread(target=write, args=(t,)) for t in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(router.stats()["sticky_writers"], 4 * writers_per_thread)
+        self.assertTrue(router.is_sticky((3, writers_per_thread - 1)))
@@ -0,0 +1,42 @@
+from issue_tracker_bot.repository import database
+from issue_tracker_bot.repository import models_db
+from issue_tracker_bot.repository import operations as ROPS
+from tests.test_repository.common import cleanup_table
+from tests.test_repository.common import DBTestCase
+from tests.test_repository.factories import DeviceFactory
+
+
+@database.inject_db_session
+def get_session(db):
+    return db
+
+
+class SessionScopeTest(DBTestCase):
+    def tearDown(self):
+        # Ensure tests isolation in this class
+        cleanup_table(models_db.Device)
+
+    def test_operations_share_session_inside_scope(self):
+        with database.session_scope() as uow:
+            self.assertIs(get_session(), get_session())
+            self.assertIs(get_session(), uow.session)
+
+    def test_operations_use_own_session_outside_scope(self):
+        self.assertIsNot(get_session(), get_session())
+
+    def test_connections_returned_after_operations(self):
+        checked_out = database.pool_metrics.snapshot()["checked_out"]
+
+        device = ROPS.create_device(DeviceFactory())
+        ROPS.get_device(obj_id=device.id)
+
+        self.assertEqual(database.pool_metrics.snapshot()["checked_out"], checked_out)
+
+    def test_connection_returned_when_scope_exits(self):
+        checked_out = database.pool_metrics.snapshot()["checked_out"]
+
+        with database.session_scope():
+            device = ROPS.create_device(DeviceFactory())
+            self.assertEqual(ROPS.get_device(obj_id=device.id).id, device.id)
+
+        self.assertEqual(database.pool_metrics.snapshot()["checked_out"], checked_out)
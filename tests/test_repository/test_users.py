@@ -2,12 +2,18 @@ import random
 from datetime import datetime
 
 from pydantic_core._pydantic_core import ValidationError
+from sqlalchemy.exc import IntegrityError
 
 from issue_tracker_bot.repository import commons
+from issue_tracker_bot.repository import database
 from issue_tracker_bot.repository import models_pyd
+from issue_tracker_bot.repository.operations import create_device
 from issue_tracker_bot.repository.operations import create_user
+from issue_tracker_bot.repository.operations import get_or_create_user
 from issue_tracker_bot.repository.operations import get_user
 from tests.test_repository.common import DBTestCase
+from tests.test_repository.factories import DeviceFactory
+from tests.test_repository.factories import ReporterFactory
 
 
 class UserModelTest(DBTestCase):
@@ -31,3 +37,23 @@ class UserModelTest(DBTestCase):
         self.assertIn("name\n", str(err.exception))
         self.assertIn("role\n", str(err.exception))
         self.assertNotIn("created_at\n", str(err.exception))
+
+    def test_get_or_create_user_returns_existing_user(self):
+        target = ReporterFactory()
+
+        created = get_or_create_user(target)
+        existing = get_or_create_user(target)
+
+        self.assertEqual(created.id, existing.id)
+
+    def test_unique_violation_told_from_other_integrity_errors(self):
+        device = DeviceFactory()
+        create_device(device)
+
+        with self.assertRaises(IntegrityError) as duplicate:
+            create_device(device)
+        with self.assertRaises(IntegrityError) as missing_name:
+            create_device({**DeviceFactory(), "name": None})
+
+        self.assertTrue(database.is_unique_violation(duplicate.exception))
+        self.assertFalse(database.is_unique_violation(missing_name.exception))
@@ -0,0 +1,47 @@
+import asyncio
+import threading
+import time
+from unittest import TestCase
+
+from issue_tracker_bot.services.gcloud.async_service import AsyncGCloudService
+from issue_tracker_bot.services.gcloud.async_service import shutdown_executor
+
+
+class BlockingService:
+    def __init__(self, delay):
+        self.delay = delay
+        self.threads = set()
+
+    def load_range(self, spreadsheet_id, range_):
+        self.threads.add(threading.get_ident())
+        time.sleep(self.delay)
+        return {"range": range_, "values": [[spreadsheet_id]]}
+
+
+class AsyncGCloudServiceTest(TestCase):
+    def tearDown(self):
+        shutdown_executor()
+
+    def test_blocking_request_does_not_block_event_loop(self):
+        service = BlockingService(delay=0.2)
+        client = AsyncGCloudService(service)
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.01)
+
+        async def scenario():
+            result, _ = await asyncio.gather(
+                client.load_range("sheet", "devices!A1:D"), ticker()
+            )
+            return result
+
+        started = time.perf_counter()
+        result = asyncio.run(scenario())
+
+        self.assertEqual(result["values"], [["sheet"]])
+        self.assertNotIn(threading.get_ident(), service.threads)
+        # The ticker finished while the request was still in flight
+        self.assertLess(ticks[-1] - started, 0.15)
@@ -0,0 +1,81 @@
+from unittest import TestCase
+
+from issue_tracker_bot.repository import models_pyd
+from issue_tracker_bot.services.context import AppContext
+from issue_tracker_bot.services.context import DeviceCatalog
+from issue_tracker_bot.services.context import PredefinedMessagesCatalog
+from tests.test_repository.factories import DeviceFactory
+from tests.test_repository.factories import PredefinedMessageFactory
+
+
+def make_devices(groups, per_group):
+    return [
+        models_pyd.Device(**DeviceFactory(group=group, name=f"{i:02d}"), created_at=0)
+        for group in groups
+        for i in range(per_group)
+    ]
+
+
+class DeviceCatalogTest(TestCase):
+    def test_devices_indexed_by_id_and_group(self):
+        devices = make_devices(["a", "b"], 3)
+        catalog = DeviceCatalog(devices)
+
+        self.assertEqual(len(catalog), 6)
+        self.assertIs(catalog.get_device(devices[4].id), devices[4])
+        self.assertIsNone(catalog.get_device("missing"))
+        self.assertEqual(catalog.get_grouped_devices()["a"], devices[:3])
+        self.assertEqual(catalog.get_grouped_devices()["b"], devices[3:])
+
+    def test_grouped_reported_devices(self):
+        devices = make_devices(["a", "b"], 2)
+        catalog = DeviceCatalog(devices, reported_ids=[devices[1].id])
+
+        self.assertEqual(
+            dict(catalog.get_grouped_reported_devices()), {"a": [devices[1]]}
+        )
+
+        catalog.mark_reported(devices[2].id)
+
+        self.assertEqual(catalog.get_grouped_reported_devices()["b"], [devices[2]])
+
+    def test_set_devices_replaces_catalog_with_new_version(self):
+        app_context = AppContext()
+        app_context.set_devices(make_devices(["a"], 1))
+        previous = app_context.devices
+
+        app_context.set_devices(make_devices(["b"], 2))
+
+        self.assertIsNot(app_context.devices, previous)
+        self.assertEqual(app_context.devices.version, previous.version + 1)
+        self.assertEqual(len(previous), 1)
+        self.assertEqual(len(app_context.devices), 2)
+
+
+class PredefinedMessagesCatalogTest(TestCase):
+    def test_layout_rows_per_kind(self):
+        messages = [
+            models_pyd.PredefinedMessage(**PredefinedMessageFactory(kind=kind))
+            for kind in ["problem"] * 5 + ["solution"] * 2
+        ]
+        catalog = PredefinedMessagesCatalog(messages)
+
+        layout = catalog.get_layout("problem", 2)
+
+        self.assertEqual([len(row) for row in layout], [2, 2, 1])
+        self.assertEqual([m for row in layout for m in row], messages[:5])
+        self.assertIs(catalog.get_layout("problem", 2), layout)
+        self.assertEqual(len(catalog.get_layout("solution", 2)), 1)
+        self.assertEqual(catalog.get_layout("unknown", 2), ())
+
+    def test_set_predefined_messages_replaces_catalog_with_new_version(self):
+        app_context = AppContext()
+        app_context.set_predefined_messages([])
+        previous = app_context.predefined_messages
+
+        app_context.set_predefined_messages(
+            [models_pyd.PredefinedMessage(**PredefinedMessageFactory())]
+        )
+
+        self.assertEqual(app_context.predefined_messages.version, previous.version + 1)
+        self.assertEqual(len(app_context.predefined_messages), 1)
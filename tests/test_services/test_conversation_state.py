@@ -0,0 +1,186 @@
+import asyncio
+import json
+from datetime import datetime
+from datetime import timedelta
+from unittest import TestCase
+
+from issue_tracker_bot.repository import async_database
+from issue_tracker_bot.repository import models_db
+from issue_tracker_bot.repository import operations as ROPS
+from issue_tracker_bot.services import conversation_state
+from issue_tracker_bot.services.conversation_state import ConversationStateConflict
+from issue_tracker_bot.services.conversation_state import InMemoryStateStore
+from issue_tracker_bot.services.conversation_state import SQLStateStore
+from tests.test_repository.common import cleanup_table
+from tests.test_repository.common import DBTestCase
+from tests.test_repository.common import run
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class InMemoryStateStoreTest(TestCase):
+    def test_state_expires_after_ttl(self):
+        clock = FakeClock(0)
+        store = InMemoryStateStore(ttl=10, maxsize=10, clock=clock)
+        asyncio.run(store.set("u1", {"messages": []}))
+
+        clock.now = 9
+        self.assertEqual(asyncio.run(store.get("u1")), {"messages": []})
+
+        clock.now = 10
+        self.assertIsNone(asyncio.run(store.get("u1")))
+        self.assertEqual(len(store), 0)
+
+    def test_least_recently_used_state_evicted(self):
+        store = InMemoryStateStore(ttl=10, maxsize=2, clock=FakeClock(0))
+
+        async def scenario():
+            await store.set("u1", {"n": 1})
+            await store.set("u2", {"n": 2})
+            await store.get("u1")
+            await store.set("u3", {"n": 3})
+
+        asyncio.run(scenario())
+
+        self.assertEqual(len(store), 2)
+        self.assertIsNone(asyncio.run(store.get("u2")))
+        self.assertEqual(asyncio.run(store.get("u1")), {"n": 1})
+
+    def test_state_changes_require_set(self):
+        store = InMemoryStateStore(ttl=10, maxsize=10)
+
+        async def scenario():
+            await store.set("u1", {"messages": []})
+            state = await store.get("u1")
+            state["messages"].append("m1")
+            unchanged = await store.get("u1")
+            await store.set("u1", state)
+            return unchanged, await store.pop("u1"), await store.get("u1")
+
+        unchanged, popped, missing = asyncio.run(scenario())
+
+        self.assertEqual(unchanged, {"messages": []})
+        self.assertEqual(popped, {"messages": ["m1"]})
+        self.assertIsNone(missing)
+
+    def test_update_changes_existing_state(self):
+        store = InMemoryStateStore(ttl=10, maxsize=10)
+
+        async def scenario():
+            missing = await store.update("u1", lambda s: s["messages"].append("m1"))
+            await store.set("u1", {"messages": []})
+            updated = await store.update("u1", lambda s: s["messages"].append("m1"))
+            return missing, updated, await store.get("u1")
+
+        missing, updated, stored = asyncio.run(scenario())
+
+        self.assertIsNone(missing)
+        self.assertEqual(updated, {"messages": ["m1"]})
+        self.assertEqual(stored, {"messages": ["m1"]})
+
+
+class SQLStateStoreTest(DBTestCase):
+    def tearDown(self):
+        # Ensure tests isolation in this class
+        cleanup_table(models_db.ConversationState)
+
+    def test_state_shared_through_database(self):
+        clock = FakeClock(datetime(2024, 1, 1))
+
+        run(SQLStateStore(ttl=60, clock=clock).set("u1", {"messages": ["m1"]}))
+
+        other_worker_store = SQLStateStore(ttl=60, clock=clock)
+        self.assertEqual(run(other_worker_store.get("u1")), {"messages": ["m1"]})
+        self.assertEqual(run(other_worker_store.pop("u1")), {"messages": ["m1"]})
+        self.assertIsNone(run(other_worker_store.get("u1")))
+
+    def test_expired_state_ignored_and_purged(self):
+        clock = FakeClock(datetime(2024, 1, 1))
+        store = SQLStateStore(ttl=60, purge_every=1, clock=clock)
+        run(store.set("u1", {"messages": []}))
+
+        clock.now += timedelta(seconds=61)
+        self.assertIsNone(run(store.get("u1")))
+        self.assertIsNone(run(store.pop("u1")))
+
+        run(store.set("u2", {"messages": []}))
+        clock.now += timedelta(seconds=61)
+        run(store.set("u3", {"messages": []}))
+
+        self.assertIsNone(run(store.get("u2")))
+        self.assertEqual(run(store.get("u3")), {"messages": []})
+
+    def test_concurrent_updates_not_lost(self):
+        clock = FakeClock(datetime(2024, 1, 1))
+        store = SQLStateStore(ttl=60, clock=clock)
+        run(store.set("u1", {"messages": []}))
+        calls = []
+
+        def add_m1(state):
+            calls.append(list(state["messages"]))
+            if len(calls) == 1:
+                # Another worker changes the state after it has been read
+                ROPS.save_conversation_state(
+                    "u1",
+                    json.dumps({"messages": ["m2"]}),
+                    clock.now + timedelta(seconds=60),
+                )
+            state["messages"].append("m1")
+
+        updated = run(store.update("u1", add_m1))
+
+        self.assertEqual(calls, [[], ["m2"]])
+        self.assertEqual(updated, {"messages": ["m2", "m1"]})
+        self.assertEqual(run(store.get("u1")), updated)
+        self.assertIsNone(run(store.update("u2", add_m1)))
+
+    def test_concurrent_updates_in_session_scopes(self):
+        clock = FakeClock(datetime(2024, 1, 1))
+        store = SQLStateStore(ttl=60, clock=clock)
+        run(store.set("u1", {"messages": []}))
+
+        async def add(message_id):
+            # Every Telegram update is handled in a session scope
+            async with async_database.session_scope():
+                await store.get("u1")
+                return await store.update(
+                    "u1", lambda s: s["messages"].append(message_id)
+                )
+
+        async def scenario():
+            return await asyncio.gather(add("m1"), add("m2"))
+
+        results = run(scenario())
+
+        self.assertEqual(sorted(run(store.get("u1"))["messages"]), ["m1", "m2"])
+        self.assertEqual(sorted(len(r["messages"]) for r in results), [1, 2])
+
+    def test_update_gives_up_on_state_changing_every_attempt(self):
+        clock = FakeClock(datetime(2024, 1, 1))
+        store = SQLStateStore(ttl=60, clock=clock)
+        run(store.set("u1", {"messages": []}))
+        calls = []
+
+        def add_m1(state):
+            calls.append(1)
+            ROPS.save_conversation_state(
+                "u1",
+                json.dumps({"messages": [f"other-{len(calls)}"]}),
+                clock.now + timedelta(seconds=60),
+            )
+            state["messages"].append("m1")
+
+        async def update_in_scope():
+            async with async_database.session_scope():
+                return await store.update("u1", add_m1)
+
+        with self.assertRaises(ConversationStateConflict):
+            run(update_in_scope())
+
+        self.assertEqual(len(calls), conversation_state.MAX_UPDATE_ATTEMPTS)
@@ -0,0 +1,175 @@
+from datetime import datetime
+from datetime import timedelta
+from unittest import mock
+
+from issue_tracker_bot import settings
+from issue_tracker_bot.repository import database
+from issue_tracker_bot.repository import models_db
+from issue_tracker_bot.repository import models_pyd as mp
+from issue_tracker_bot.repository import operations as ROPS
+from issue_tracker_bot.services import data_export
+from issue_tracker_bot.services.gcloud.fake import FakeGoogleBackend
+from issue_tracker_bot.services.gcloud.service import Snapshotter
+from tests.test_repository.common import cleanup_table
+from tests.test_repository.common import DBTestCase
+from tests.test_repository.factories import DeviceFactory
+from tests.test_repository.factories import ProblemRecordFactory
+from tests.test_repository.factories import ReporterFactory
+
+
+class IncrementalExportTest(DBTestCase):
+    def setUp(self):
+        self.backend = FakeGoogleBackend()
+        self.backend.add_spreadsheet(settings.SNAPSHOTS_SHEET_ID)
+        # Re-initializes the snapshotter singleton used by data_export
+        Snapshotter(**self.backend.service_kwargs())
+
+        self.user = ROPS.create_user(ReporterFactory())
+        self.device = ROPS.create_device(DeviceFactory())
+        self.sheet_name = str(datetime.now().date())
+        self.created_at = datetime(2024, 1, 1)
+
+    def tearDown(self):
+        # Ensure tests isolation in this class
+        cleanup_table(models_db.ExportWatermark)
+        cleanup_table(models_db.DeviceState)
+        cleanup_table(models_db.Record)
+
+    def create_records(self, count):
+        records = []
+
+        for _ in range(count):
+            self.created_at += timedelta(seconds=1)
+            records.append(
+                ROPS.create_record(
+                    ProblemRecordFactory(
+                        reporter_id=self.user.id,
+                        device_id=self.device.id,
+                        created_at=self.created_at,
+                    )
+                )
+            )
+
+        return records
+
+    def exported_ids(self):
+        rows = self.backend.read_page(settings.SNAPSHOTS_SHEET_ID, self.sheet_name)
+        self.assertEqual(rows[0], data_export.EXPORT_HEADER)
+        return [int(r[0]) for r in rows[1:]]
+
+    def test_only_new_records_appended_after_first_export(self):
+        first = self.create_records(3)
+        self.assertEqual(data_export.export_reports_to_gdoc(), 3)
+
+        second = self.create_records(2)
+        self.assertEqual(data_export.export_reports_to_gdoc(), 2)
+        self.assertEqual(data_export.export_reports_to_gdoc(), 0)
+
+        self.assertEqual(self.exported_ids(), [r.id for r in first + second])
+        self.assertEqual(self.backend.requests["values.clear"], 1)
+
+    def test_backdated_records_appended(self):
+        first = self.create_records(2)
+        data_export.export_reports_to_gdoc()
+
+        # e.g. history brought in by the tracker import
+        self.created_at = datetime(2020, 1, 1)
+        backdated = self.create_records(1)
+
+        self.assertEqual(data_export.export_reports_to_gdoc(), 1)
+        self.assertEqual(self.exported_ids(), [r.id for r in first + backdated])
+
+    def test_full_export_rebuilds_sheet(self):
+        records = self.create_records(2)
+        data_export.export_reports_to_gdoc()
+
+        self.assertEqual(data_export.export_reports_to_gdoc(full=True), 2)
+
+        self.assertEqual(self.exported_ids(), [r.id for r in records])
+        watermark = ROPS.get_export_watermark(
+            data_export.export_target(self.sheet_name)
+        )
+        self.assertEqual(watermark.last_record_id, records[-1].id)
+
+    def test_failed_rebuild_drops_watermark(self):
+        first = self.create_records(2)
+        data_export.export_reports_to_gdoc()
+        second = self.create_records(1)
+
+        with mock.patch.object(
+            data_export.gc,
+            "export_records_in_batches",
+            side_effect=RuntimeError("quota exceeded"),
+        ):
+            with self.assertRaises(RuntimeError):
+                data_export.export_reports_to_gdoc(full=True)
+
+        target = data_export.export_target(self.sheet_name)
+        self.assertIsNone(ROPS.get_export_watermark(target))
+        # The next run rebuilds instead of appending after the old watermark
+        self.assertEqual(data_export.export_reports_to_gdoc(), 3)
+        self.assertEqual(self.exported_ids(), [r.id for r in first + second])
+
+    def test_rebuild_without_records_drops_watermark(self):
+        self.create_records(2)
+        data_export.export_reports_to_gdoc()
+        cleanup_table(models_db.DeviceState)
+        cleanup_table(models_db.Record)
+
+        self.assertEqual(data_export.export_reports_to_gdoc(full=True), 0)
+
+        target = data_export.export_target(self.sheet_name)
+        self.assertIsNone(ROPS.get_export_watermark(target))
+
+
+# RecordExport dumps these columns besides reporter_id and device_id
+HEADER = data_export.EXPORT_HEADER
+
+
+class RecordRowFormatterTest(DBTestCase):
+    def setUp(self):
+        users = [ROPS.create_user(ReporterFactory()) for _ in range(2)]
+        devices = [ROPS.create_device(DeviceFactory()) for _ in range(2)]
+        self.records = [
+            ROPS.create_record(
+                ProblemRecordFactory(
+                    reporter_id=users[i % 2].id,
+                    device_id=devices[i // 3].id,
+                    created_at=datetime(2024, 1, 1, 10, i // 2),
+                )
+            )
+            for i in range(5)
+        ]
+
+    def tearDown(self):
+        # Ensure tests isolation in this class
+        cleanup_table(models_db.DeviceState)
+        cleanup_table(models_db.Record)
+        cleanup_table(models_db.Device)
+        cleanup_table(models_db.User)
+
+    def test_rows_match_record_export_model(self):
+        # RecordExport lazy loads the records of nested users and devices
+        with database.session_scope():
+            expected = [
+                [mp.RecordExport.model_validate(r).model_dump()[c] for c in HEADER]
+                for r in ROPS.get_records_page(newest_first=False).items
+            ]
+
+        formatter = data_export.RecordRowFormatter()
+        with mock.patch.object(
+            ROPS, "get_user_names", wraps=ROPS.get_user_names
+        ) as get_user_names:
+            batches = list(data_export.RecordBatches(batch_size=3, formatter=formatter))
+
+        self.assertEqual(sum(batches, []), expected)
+        # Both users are formatted while converting the first batch
+        self.assertEqual(get_user_names.call_count, 1)
+        self.assertEqual(len(formatter.devices), 2)
+
+    def test_datetimes_kept_without_date_format(self):
+        rows = data_export.RecordRowFormatter(None)(
+            ROPS.get_record_export_rows_page(limit=1).items
+        )
+
+        self.assertEqual(rows[0][3], self.records[0].created_at)
@@ -0,0 +1,97 @@
+from unittest import TestCase
+
+from googleapiclient.errors import HttpError
+
+from issue_tracker_bot import settings
+from issue_tracker_bot.services.gcloud.fake import FakeGoogleBackend
+from issue_tracker_bot.services.gcloud.retry import QuotaRetry
+from issue_tracker_bot.services.gcloud.service import ContextLoader
+from issue_tracker_bot.services.gcloud.service import GCloudService
+from issue_tracker_bot.services.gcloud.service import ReportTracker
+from issue_tracker_bot.services.gcloud.service import Snapshotter
+
+CONTEXT_PAGES = {
+    "problems": [["id", "text"], ["1", "No power"]],
+    "solutions": [["id", "text"], ["1", "Replaced fuse"]],
+    "devices": [["id", "group", "subgroup", "name"], ["d1", "A", "B", "3"]],
+}
+
+
+class FakeGoogleBackendTest(TestCase):
+    def setUp(self):
+        self.backend = FakeGoogleBackend()
+        self.backend.add_spreadsheet(settings.CONTEXT_SHEET_ID, CONTEXT_PAGES)
+        self.backend.add_spreadsheet(settings.SNAPSHOTS_SHEET_ID)
+
+    def test_context_loaded_in_one_request(self):
+        loader = ContextLoader(**self.backend.service_kwargs())
+
+        context = loader.load_context()
+
+        self.assertEqual(context["devices"], [("d1", "AB", "03")])
+        self.assertEqual(context["problems"], [["1", "No power"]])
+        self.assertEqual(loader.load_devices(), context["devices"])
+        self.assertEqual(self.backend.requests, {"values.batchGet": 1, "values.get": 1})
+
+    def test_version_moves_with_writes(self):
+        loader = ContextLoader(**self.backend.service_kwargs())
+        version = loader.load_version()
+
+        loader.patch_sheet_list(settings.CONTEXT_SHEET_ID, "devices!A1:D", [["d2"]])
+
+        self.assertNotEqual(loader.load_version(), version)
+        self.assertEqual(
+            self.backend.read_page(settings.CONTEXT_SHEET_ID, "devices")[-1], ["d2"]
+        )
+
+    def test_export_creates_page_and_writes_batches(self):
+        snapshotter = Snapshotter(**self.backend.service_kwargs())
+        batches = [[[i, f"text-{i}"] for i in range(j, j + 3)] for j in (0, 3)]
+
+        count = snapshotter.export_records_in_batches("day", ["id", "text"], batches)
+
+        rows = self.backend.read_page(settings.SNAPSHOTS_SHEET_ID, "day")
+        self.assertEqual(count, 6)
+        self.assertEqual(rows[0], ["id", "text"])
+        self.assertEqual(rows[-1], ["5", "text-5"])
+        self.assertEqual(len(rows), 7)
+
+    def test_tracker_record_appended_in_one_request(self):
+        self.backend.add_spreadsheet(settings.TRACKING_SHEET_ID, {"DEV_1": []})
+        tracker = ReportTracker(**self.backend.service_kwargs())
+
+        tracker.append_record("DEV_1", ["", "01-01-2024", "user", "problem", "a"])
+        tracker.append_record("DEV_2", ["", "01-01-2024", "user", "problem", "b"])
+        tracker.append_record("DEV_2", ["", "02-01-2024", "user", "solution", "c"])
+
+        self.assertEqual(
+            self.backend.requests,
+            {"spreadsheets.get": 1, "spreadsheets.batchUpdate": 1, "values.append": 3},
+        )
+        rows = self.backend.read_page(settings.TRACKING_SHEET_ID, "DEV_2")
+        self.assertEqual([row[-1] for row in rows], ["b", "c"])
+
+    def test_services_built_without_loading_clients(self):
+        # Credentials and discovery clients are only loaded on first use
+        loader = ContextLoader()
+
+        self.assertIsNone(loader._credentials)
+        self.assertIsNone(loader._sheet_service)
+
+    def test_quota_errors_injected(self):
+        backend = FakeGoogleBackend(quota_error_rate=1)
+        backend.add_spreadsheet(settings.CONTEXT_SHEET_ID, CONTEXT_PAGES)
+        loader = ContextLoader(**backend.service_kwargs())
+        quota_retry = GCloudService.quota_retry
+        GCloudService.quota_retry = QuotaRetry(max_retries=2, sleep=lambda _: None)
+
+        try:
+            with self.assertRaises(HttpError) as err:
+                loader.load_context()
+        finally:
+            retries = GCloudService.quota_retry.stats()["retries"]
+            GCloudService.quota_retry = quota_retry
+
+        self.assertEqual(err.exception.resp.status, 429)
+        self.assertEqual(backend.quota_errors, 3)
+        self.assertEqual(retries, 2)
@@ -0,0 +1,114 @@
+import csv
+import gzip
+import json
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+from issue_tracker_bot.repository import models_db
+from issue_tracker_bot.repository import operations as ROPS
+from issue_tracker_bot.services import file_export
+from tests.test_repository.common import cleanup_table
+from tests.test_repository.common import DBTestCase
+from tests.test_repository.factories import DeviceFactory
+from tests.test_repository.factories import ProblemRecordFactory
+from tests.test_repository.factories import ReporterFactory
+
+try:
+    from pyarrow import parquet
+except ImportError:
+    parquet = None
+
+
+class FileExportTest(DBTestCase):
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        user = ROPS.create_user(ReporterFactory())
+        device = ROPS.create_device(DeviceFactory())
+        self.records = [
+            ROPS.create_record(
+                ProblemRecordFactory(
+                    reporter_id=user.id,
+                    device_id=device.id,
+                    created_at=datetime(2024, 1, 1) + timedelta(seconds=i),
+                )
+            )
+            for i in range(5)
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        # Ensure tests isolation in this class
+        cleanup_table(models_db.DeviceState)
+        cleanup_table(models_db.Record)
+
+    def test_csv_written_in_batches_with_compression(self):
+        path = self.directory / "records.csv.gz"
+
+        count = file_export.export_records_to_file(
+            path, compression="gzip", batch_size=2
+        )
+
+        with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(count, 5)
+        self.assertEqual(rows[0], file_export.EXPORT_HEADER)
+        self.assertEqual([int(r[0]) for r in rows[1:]], [r.id for r in self.records])
+        self.assertEqual(rows[1][3], "2024-01-01T00:00:00")
+
+    def test_jsonl_rows_keyed_by_header(self):
+        path = self.directory / "records.jsonl"
+
+        file_export.export_records_to_file(path, batch_size=3)
+
+        lines = [json.loads(line) for line in path.read_text("utf-8").splitlines()]
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(list(lines[-1]), file_export.EXPORT_HEADER)
+        self.assertEqual(lines[-1]["id"], self.records[-1].id)
+        self.assertEqual(lines[-1]["kind"], "problem")
+
+    def test_unknown_compression_rejected_without_leftovers(self):
+        path = self.directory / "records.csv"
+
+        with self.assertRaises(ValueError):
+            file_export.export_records_to_file(path, compression="zstd")
+
+        self.assertFalse(path.exists())
+
+    def test_file_name_of_unknown_compression_rejected(self):
+        with self.assertRaises(ValueError):
+            file_export.default_file_name("csv", "zstd")
+        with self.assertRaises(ValueError):
+            file_export.default_file_name("xlsx")
+
+    def test_parquet_rejected_without_pyarrow(self):
+        path = self.directory / "records.parquet"
+
+        with mock.patch.object(
+            file_export.importlib.util, "find_spec", return_value=None
+        ):
+            with self.assertRaisesRegex(ValueError, "pyarrow"):
+                file_export.default_file_name("parquet", "snappy")
+            with self.assertRaisesRegex(ValueError, "pyarrow"):
+                file_export.export_records_to_file(path)
+
+        self.assertFalse(path.exists())
+
+    @unittest.skipIf(parquet is None, "pyarrow is not installed")
+    def test_parquet_row_group_per_batch(self):
+        path = self.directory / "records.parquet"
+
+        self.assertEqual(
+            file_export.default_file_name("parquet", "zstd")[-8:], ".parquet"
+        )
+        file_export.export_records_to_file(path, compression="snappy", batch_size=2)
+
+        parquet_file = parquet.ParquetFile(path)
+        self.assertEqual(parquet_file.metadata.num_row_groups, 3)
+        table = parquet_file.read()
+        self.assertEqual(table.column("id").to_pylist(), [r.id for r in self.records])
+        self.assertEqual(table.column("created_at")[0].as_py(), datetime(2024, 1, 1))
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+from issue_tracker_bot import settings
+from issue_tracker_bot.repository import models_db
+from issue_tracker_bot.repository import operations as ROPS
+from issue_tracker_bot.services import tracker_import
+from issue_tracker_bot.services.gcloud.fake import FakeGoogleBackend
+from issue_tracker_bot.services.gcloud.service import ReportTracker
+from tests.test_repository.common import cleanup_table
+from tests.test_repository.common import DBTestCase
+from tests.test_repository.factories import DeviceFactory
+from tests.test_repository.factories import ReporterFactory
+
+
+class TrackerImportTest(DBTestCase):
+    def setUp(self):
+        self.user = ROPS.create_user(ReporterFactory())
+        self.device = ROPS.create_device(DeviceFactory())
+
+        self.backend = FakeGoogleBackend()
+        self.backend.add_spreadsheet(
+            settings.TRACKING_SHEET_ID,
+            {
+                f"DEV_{self.device.id}": [
+                    ["", "01-02-2024 10:00:00", self.user.name, "проблема", "No power"],
+                    ["", "01-03-2024 09:30:00", "old admin", "рішення", "Fuse"],
+                    ["", "not a date", self.user.name, "проблема", "x"],
+                    ["", "01-04-2024 08:00:00", self.user.name, "проблема"],
+                ],
+                "DEV_unknown": [["", "01-02-2024 10:00:00", "a", "проблема", "b"]],
+                "notes": [["free text"]],
+            },
+        )
+        self.tracker = ReportTracker(**self.backend.service_kwargs())
+
+    def tearDown(self):
+        # Ensure tests isolation in this class
+        cleanup_table(models_db.DeviceState)
+        cleanup_table(models_db.Record)
+        cleanup_table(models_db.Device)
+        cleanup_table(models_db.User)
+
+    def test_device_pages_imported_once(self):
+        result = tracker_import.import_tracker_sheets(self.tracker, chunk_size=2)
+
+        self.assertEqual(result, tracker_import.ImportResult(2, 3, 0, 2))
+        records = ROPS.get_records_for_device(self.device.id)
+        self.assertEqual(
+            [(r.created_at, r.reporter.name, r.text) for r in records],
+            [
+                (datetime(2024, 1, 4, 8), self.user.name, ""),
+                (datetime(2024, 1, 3, 9, 30), "old admin", "Fuse"),
+                (datetime(2024, 1, 2, 10), self.user.name, "No power"),
+            ],
+        )
+        self.assertEqual(records[1].reporter.id, "sheet:old admin")
+        # The latest row is a problem reported without a description
+        self.assertEqual(
+            [d.id for d in ROPS.get_devices_with_open_problems()], [self.device.id]
+        )
+
+        again = tracker_import.import_tracker_sheets(self.tracker)
+
+        self.assertEqual(again, tracker_import.ImportResult(2, 0, 3, 2))
+        self.assertEqual(len(ROPS.get_records_for_device(self.device.id)), 3)
+
+    def test_dry_run_writes_nothing(self):
+        result = tracker_import.import_tracker_sheets(self.tracker, dry_run=True)
+
+        self.assertEqual(result.imported, 3)
+        self.assertEqual(ROPS.get_records_for_device(self.device.id), [])
+        self.assertIsNone(ROPS.get_user(name="old admin"))
@@ -0,0 +1,101 @@
+import asyncio
+from collections import defaultdict
+from types import SimpleNamespace
+from unittest import TestCase
+
+from issue_tracker_bot.services.telegram.update_queue import UpdateQueue
+from issue_tracker_bot.services.telegram.update_queue import UpdateQueueClosed
+from issue_tracker_bot.services.telegram.update_queue import UpdateQueueFull
+
+
+class RecordingLifecycle:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.processed = defaultdict(list)
+
+    async def process_update(self, update):
+        await asyncio.sleep(self.delay)
+        self.processed[update.effective_chat.id].append(update.update_id)
+
+
+def make_update(update_id, chat_id):
+    return SimpleNamespace(
+        update_id=update_id,
+        effective_chat=SimpleNamespace(id=chat_id),
+        effective_user=None,
+    )
+
+
+class UpdateQueueTest(TestCase):
+    def test_updates_of_one_chat_are_processed_in_order(self):
+        lifecycle = RecordingLifecycle(delay=0.001)
+
+        async def scenario():
+            queue = UpdateQueue(lifecycle, workers=4, maxsize=400)
+            await queue.start()
+            for i in range(100):
+                queue.put(make_update(i, chat_id=i % 5))
+            await queue.stop(timeout=10)
+            return queue
+
+        queue = asyncio.run(scenario())
+
+        self.assertEqual(queue.processed, 100)
+        for chat_id, update_ids in lifecycle.processed.items():
+            self.assertEqual(update_ids, sorted(update_ids))
+            self.assertEqual(len(update_ids), 20)
+
+    def test_full_queue_rejects_updates(self):
+        lifecycle = RecordingLifecycle(delay=1)
+
+        async def scenario():
+            queue = UpdateQueue(lifecycle, workers=1, maxsize=2)
+            await queue.start()
+            queue.put(make_update(1, chat_id=1))
+            # let the worker pick the first update up
+            await asyncio.sleep(0)
+            queue.put(make_update(2, chat_id=1))
+            queue.put(make_update(3, chat_id=1))
+
+            with self.assertRaises(UpdateQueueFull):
+                queue.put(make_update(4, chat_id=1))
+
+            await queue.stop(timeout=0)
+            return queue
+
+        queue = asyncio.run(scenario())
+
+        self.assertEqual(queue.rejected, 1)
+
+    def test_queue_bound_applies_across_shards(self):
+        async def scenario():
+            # maxsize below the number of workers, every shard holds one update
+            queue = UpdateQueue(RecordingLifecycle(), workers=4, maxsize=2)
+            await queue.start()
+            queue.put(make_update(1, chat_id=0))
+            queue.put(make_update(2, chat_id=1))
+
+            with self.assertRaises(UpdateQueueFull):
+                queue.put(make_update(3, chat_id=2))
+
+            stats = queue.stats()
+            await queue.stop(timeout=0)
+            return stats
+
+        stats = asyncio.run(scenario())
+
+        self.assertEqual(stats["depth"], 2)
+        self.assertEqual(stats["capacity"], 2)
+        self.assertEqual(stats["shard_capacity"], 1)
+        self.assertEqual(stats["rejected"], 1)
+
+    def test_stopped_queue_rejects_updates(self):
+        async def scenario():
+            queue = UpdateQueue(RecordingLifecycle(), workers=1, maxsize=1)
+            await queue.start()
+            await queue.stop()
+
+            with self.assertRaises(UpdateQueueClosed):
+                queue.put(make_update(1, chat_id=1))
+
+        asyncio.run(scenario())
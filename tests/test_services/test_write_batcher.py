@@ -0,0 +1,184 @@
+from unittest import TestCase
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from issue_tracker_bot.services.gcloud import write_batcher
+from issue_tracker_bot.services.gcloud.fake import FakeGoogleBackend
+from issue_tracker_bot.services.gcloud.retry import QuotaRetry
+from issue_tracker_bot.services.gcloud.service import GCloudService
+from issue_tracker_bot.services.gcloud.write_batcher import SheetsWriteBatcher
+
+
+def http_error(status):
+    return HttpError(httplib2.Response({"status": status}), b"{}")
+
+
+class RecordingService:
+    def __init__(self, pages):
+        self.pages = dict(pages)
+        self.calls = []
+        self.quota_retry = QuotaRetry(max_retries=0)
+
+    def list_all_sheets(self, spreadsheet_id):
+        self.calls.append("get")
+        return [{"title": t, "sheet_id": i} for i, t in enumerate(self.pages)]
+
+    def create_pages(self, spreadsheet_id, page_names):
+        self.calls.append("create")
+        for page_name in page_names:
+            self.pages[page_name] = 0
+
+    def patch_sheet_list(self, spreadsheet_id, range_, records):
+        self.calls.append(("append", range_, len(records)))
+        self.pages[range_.split("!")[0].strip("'")] += len(records)
+
+
+class SheetsWriteBatcherTest(TestCase):
+    def test_pending_rows_coalesced_per_spreadsheet(self):
+        service = RecordingService({"DEV_1": 3})
+        batcher = SheetsWriteBatcher(service, window=60, max_rows=100)
+
+        batcher.append("s", "DEV_1", [["a"]])
+        batcher.append("s", "DEV_2", [["b"]])
+        batcher.append("s", "DEV_1", [["c"]])
+        self.assertEqual(service.calls, [])
+
+        batcher.flush()
+        batcher.append("s", "DEV_2", [["d"]])
+        batcher.close()
+
+        self.assertEqual(
+            service.calls,
+            [
+                "get",
+                "create",
+                ("append", "'DEV_1'!A:Z", 2),
+                ("append", "'DEV_2'!A:Z", 1),
+                # Page titles are cached after the first flush
+                ("append", "'DEV_2'!A:Z", 1),
+            ],
+        )
+        self.assertEqual(service.pages, {"DEV_1": 5, "DEV_2": 2})
+        self.assertEqual(batcher.stats()["rows_written"], 4)
+
+    def test_flush_when_max_rows_pending(self):
+        service = RecordingService({"DEV_1": 0})
+        batcher = SheetsWriteBatcher(service, window=60, max_rows=2)
+
+        batcher.append("s", "DEV_1", [["a"]])
+        batcher.append("s", "DEV_1", [["b"]])
+
+        self.assertEqual(batcher.stats()["flushes"], 1)
+        self.assertEqual(batcher.stats()["pending"], 0)
+        batcher.close()
+
+    def test_failed_flush_keeps_rows_pending(self):
+        service = RecordingService({"DEV_1": 0})
+
+        def patch_sheet_list(spreadsheet_id, range_, records):
+            raise http_error(429)
+
+        service.patch_sheet_list = patch_sheet_list
+        batcher = SheetsWriteBatcher(service, window=60, max_rows=100)
+        batcher.append("s", "DEV_1", [["a"]])
+
+        with self.assertRaises(HttpError):
+            batcher.flush()
+
+        self.assertEqual(batcher.stats()["pending"], 1)
+        self.assertEqual(batcher.stats()["failures"], 1)
+
+    def test_only_unwritten_pages_requeued(self):
+        service = RecordingService({"DEV_1": 0, "DEV_2": 0})
+        append = service.patch_sheet_list
+
+        def patch_sheet_list(spreadsheet_id, range_, records):
+            if range_.startswith("'DEV_2'"):
+                raise http_error(429)
+            append(spreadsheet_id, range_, records)
+
+        service.patch_sheet_list = patch_sheet_list
+        batcher = SheetsWriteBatcher(service, window=60, max_rows=100)
+        batcher.append("s", "DEV_1", [["a"]])
+        batcher.append("s", "DEV_2", [["b"]])
+
+        with self.assertRaises(HttpError):
+            batcher.flush()
+
+        self.assertEqual(batcher.stats()["pending"], 1)
+        self.assertEqual(batcher.stats()["rows_written"], 1)
+
+    def test_batchers_of_two_workers_share_a_page(self):
+        backend = FakeGoogleBackend()
+        backend.add_spreadsheet("s")
+        service = GCloudService(**backend.service_kwargs())
+        worker_a = SheetsWriteBatcher(service, window=60)
+        worker_b = SheetsWriteBatcher(service, window=60)
+
+        worker_a.append("s", "snapshot", [[1], [2], [3]])
+        worker_a.flush()
+        worker_b.append("s", "snapshot", [[4], [5]])
+        worker_b.flush()
+        worker_a.append("s", "snapshot", [[6], [7]])
+        worker_a.flush()
+
+        self.assertEqual(
+            backend.read_page("s", "snapshot"), [[str(i)] for i in range(1, 8)]
+        )
+
+    def test_close_all_flushes_every_batcher(self):
+        service = RecordingService({"DEV_1": 0})
+        failing = RecordingService({"DEV_1": 0})
+
+        def patch_sheet_list(spreadsheet_id, range_, records):
+            raise http_error(500)
+
+        failing.patch_sheet_list = patch_sheet_list
+        batchers = [
+            SheetsWriteBatcher(failing, window=60, max_rows=100),
+            SheetsWriteBatcher(service, window=60, max_rows=100),
+        ]
+        for batcher in batchers:
+            batcher.append("s", "DEV_1", [["a"], ["b"]])
+
+        with self.assertLogs(write_batcher.logger, "ERROR"):
+            write_batcher.close_all()
+
+        # A batcher failing to write doesn't keep the others from flushing
+        self.assertEqual(service.pages, {"DEV_1": 2})
+        self.assertEqual(batchers[1].stats()["pending"], 0)
+        self.assertIsNone(batchers[1]._timer)
+
+
+class QuotaRetryTest(TestCase):
+    def test_quota_errors_retried_with_backoff(self):
+        delays = []
+        retry = QuotaRetry(max_retries=3, base=1, maximum=3, sleep=delays.append)
+        responses = [http_error(429), http_error(429), "ok"]
+
+        def call():
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        self.assertEqual(retry.call(call), "ok")
+        self.assertEqual(retry.stats(), {"retries": 2, "exhausted": 0})
+        self.assertTrue(0 <= delays[0] <= 1 and 0 <= delays[1] <= 2)
+
+    def test_other_errors_and_exhausted_retries_raised(self):
+        retry = QuotaRetry(max_retries=1, sleep=lambda _: None)
+
+        def fail(status):
+            def call():
+                raise http_error(status)
+
+            return call
+
+        with self.assertRaises(HttpError):
+            retry.call(fail(500))
+        with self.assertRaises(HttpError):
+            retry.call(fail(429))
+
+        self.assertEqual(retry.stats(), {"retries": 1, "exhausted": 1})